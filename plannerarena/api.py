@@ -0,0 +1,248 @@
+import io
+from collections.abc import Iterator
+from pathlib import Path
+import polars as pl
+import pyarrow as pa
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from plannerarena.database import load_database_cached, select_progress, widen_dtypes
+from plannerarena.scheduler import BACKGROUND, SCHEDULER
+from plannerarena.sketch import sketch_quantiles, sketch_stats
+from plannerarena.widgets import problem_parameter_filter, problem_parameter_groups
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+# maximum number of rows per Arrow record batch
+BATCH_SIZE = 65536
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _query_list(request: Request, name: str) -> list[str]:
+    return request.query_params.getlist(name)
+
+
+def _param_values(request: Request, parameters: list[str]) -> dict[str, str]:
+    """Experiment parameter values are passed as "param.<name>=<value>" query parameters"""
+    values = {
+        key.removeprefix("param."): value
+        for key, value in request.query_params.items()
+        if key.startswith("param.")
+    }
+    for param in values:
+        if param not in parameters:
+            raise BadRequest(f"unknown experiment parameter: {param}")
+    return values
+
+
+def _attributes(request: Request, available: list[str]) -> list[str]:
+    attributes = _query_list(request, "attribute") or available
+    for attribute in attributes:
+        if attribute not in available:
+            raise BadRequest(f"unknown attribute: {attribute}")
+    return attributes
+
+
+def _filter_runs(data: dict, request: Request) -> tuple[pl.DataFrame, str | list]:
+    runs = data["runs"]
+    param_values = _param_values(request, data["parameters"])
+    grouping = problem_parameter_groups(param_values)
+
+    predicate = pl.lit(True)
+    if experiments := _query_list(request, "experiment"):
+        predicate = predicate & pl.col("experiment").is_in(experiments)
+    if versions := _query_list(request, "version"):
+        predicate = predicate & pl.col("version").cast(pl.String).is_in(versions)
+    if planners := _query_list(request, "planner"):
+        predicate = predicate & pl.col("planner").cast(pl.String).is_in(planners)
+    runs = problem_parameter_filter(
+        runs.filter(predicate), param_values, data["parameter_index"]
+    )
+    return runs, grouping
+
+
+def select_runs(
+    data: dict, request: Request, attributes: list[str]
+) -> tuple[pl.DataFrame, str | list]:
+    """Select the runs matching the query parameters, using the same filters as the web app.
+
+    Returns the selected runs (with the given attributes) and the experiment parameter to group
+    by (if any)."""
+    runs, grouping = _filter_runs(data, request)
+    return (
+        runs.select(
+            "id",
+            "experimentid",
+            "experiment",
+            "version",
+            "planner",
+            *data["parameters"],
+            *attributes,
+        ),
+        grouping,
+    )
+
+
+# summary statistics returned for each attribute by `aggregate_runs`
+AGGREGATES = {
+    "mean": pl.Expr.mean,
+    "median": pl.Expr.median,
+    "std": pl.Expr.std,
+    "min": pl.Expr.min,
+    "max": pl.Expr.max,
+}
+
+
+def aggregate_runs(
+    runs: pl.DataFrame, attributes: list[str], grouping: str | list
+) -> pl.DataFrame:
+    """Summarize each attribute per experiment, version, and planner (and grouping parameter)"""
+    keys = ["experiment", "version", "planner"] + ([grouping] if grouping else [])
+    aggregates = [pl.len().alias("runs")]
+    for attribute in attributes:
+        values = pl.col(attribute).cast(pl.Float64)
+        aggregates.append(pl.col(attribute).null_count().alias(f"{attribute} missing"))
+        aggregates.extend(
+            fn(values).alias(f"{attribute} {name}") for name, fn in AGGREGATES.items()
+        )
+    return runs.group_by(keys).agg(aggregates).sort(keys)
+
+
+def aggregate_sketches(
+    data: dict, groups: pl.DataFrame, attributes: list[str], grouping: str | list
+) -> pl.DataFrame:
+    """Same as `aggregate_runs`, but computed from the sketches of a summarized database (see
+    `database.load_database`). All statistics are exact, except for the median."""
+    sketches = data["sketches"]
+    keys = ["experiment", "version", "planner"] + ([grouping] if grouping else [])
+    result = None
+    for attribute in attributes:
+        stats = sketch_stats(sketches, groups, attribute, keys).join(
+            sketch_quantiles(sketches, groups, attribute, keys, {"median": 0.5}),
+            on=keys,
+            how="left",
+        )
+        columns = [pl.col("nulls").alias(f"{attribute} missing")] + [
+            pl.col(name).alias(f"{attribute} {name}") for name in AGGREGATES
+        ]
+        if result is None:
+            result = stats.select(
+                *keys, (pl.col("count") + pl.col("nulls")).alias("runs"), *columns
+            )
+        else:
+            result = result.join(stats.select(*keys, *columns), on=keys, how="left")
+    if result is None:
+        result = groups.select(keys).unique()
+    return result.sort(keys)
+
+
+def _arrow_batches(table: pa.Table) -> Iterator[bytes]:
+    """Serialize a table as an Arrow IPC stream, one record batch at a time"""
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=BATCH_SIZE):
+            writer.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _respond(df: pl.DataFrame, request: Request, name: str) -> Response:
+    fmt = request.query_params.get("format", "arrow")
+    if fmt == "arrow":
+        # the data frame is converted here, while the endpoint holds its slot of the
+        # scheduler; only the (cheap) serialization of the batches is left to the stream
+        return StreamingResponse(
+            _arrow_batches(df.to_arrow()),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{name}.arrows"'},
+        )
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.write_parquet(buffer)
+        return Response(
+            buffer.getvalue(),
+            media_type=PARQUET_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{name}.parquet"'},
+        )
+    raise BadRequest(f"unknown format: {fmt}")
+
+
+def api_routes(database: str | Path, sketch: bool = False) -> list[Route]:
+    """Read-only routes that return the (filtered) tables of `database` in a columnar format.
+
+    All routes accept a "format" query parameter ("arrow" for an Arrow IPC stream, which is the
+    default, or "parquet"). The "runs" and "progress" routes can be filtered with (repeatable)
+    "experiment", "version", and "planner" query parameters and with "param.<name>=<value>"
+    for experiment parameters, where the value can also be "all (separate)". The "attribute"
+    query parameter selects the attributes to return. With "aggregate=1" the "runs" route
+    returns summary statistics per experiment, version, and planner instead of the runs. If
+    the database is summarized (`sketch`), only these statistics are available.
+    """
+
+    def handler(fn):
+        # sync endpoints are run in a thread pool by starlette
+        def endpoint(request: Request) -> Response:
+            client = request.client.host if request.client else None
+            with SCHEDULER.slot(client, BACKGROUND):
+                data = load_database_cached(database, sketch)
+                if data["runs"].is_empty():
+                    return JSONResponse({"error": "no database"}, status_code=404)
+                try:
+                    return fn(data, request)
+                except BadRequest as e:
+                    return JSONResponse({"error": str(e)}, status_code=400)
+
+        return endpoint
+
+    @handler
+    def experiments(data: dict, request: Request) -> Response:
+        return _respond(data["experiments"], request, "experiments")
+
+    @handler
+    def planner_configs(data: dict, request: Request) -> Response:
+        return _respond(data["planner_configs"], request, "planner_configs")
+
+    @handler
+    def runs(data: dict, request: Request) -> Response:
+        attributes = _attributes(request, data["attributes"])
+        aggregate = request.query_params.get("aggregate", "0") not in ("0", "false")
+        if data["sketches"] is not None:
+            if not aggregate:
+                raise BadRequest(
+                    "the database is summarized, only aggregate=1 is supported"
+                )
+            groups, grouping = _filter_runs(data, request)
+            df = aggregate_sketches(data, groups, attributes, grouping)
+        else:
+            df, grouping = select_runs(data, request, attributes)
+            if aggregate:
+                df = aggregate_runs(df, attributes, grouping)
+        return _respond(df, request, "runs")
+
+    @handler
+    def progress(data: dict, request: Request) -> Response:
+        if data["progress"].is_empty():
+            return JSONResponse({"error": "no progress data"}, status_code=404)
+        attributes = _attributes(request, data["progress"].columns[2:])
+        selected, _ = select_runs(data, request, [])
+        df = select_progress(data, selected.drop("experimentid")).select(
+            "runid",
+            "time",
+            *attributes,
+            pl.exclude("runid", "time", *data["progress"].columns),
+        )
+        # the progress table is stored with compact types, but returned as in the database
+        df = widen_dtypes(df, ["runid", "time", *attributes])
+        return _respond(df, request, "progress")
+
+    return [
+        Route("/experiments", experiments, methods=["GET"]),
+        Route("/planner_configs", planner_configs, methods=["GET"]),
+        Route("/runs", runs, methods=["GET"]),
+        Route("/progress", progress, methods=["GET"]),
+    ]
@@ -1,16 +1,37 @@
+import asyncio
+import contextlib
 import os
 import sys
+from collections.abc import Callable
 from shiny import App, Inputs, Outputs, Session, reactive, ui
 from shiny.types import FileInfo
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
 import faicons as fa
 from pathlib import Path
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
-from plannerarena.database import database_info_ui, database_info_server, load_database
+# the scheduler configures the size of polars' thread pool, so it is imported first
+from plannerarena.scheduler import BACKGROUND, SCHEDULER
+from plannerarena.database import (
+    database_info_ui,
+    database_info_server,
+    load_database,
+    load_database_cached,
+)
 from plannerarena.performance import performance_ui, performance_server
 from plannerarena.progress import progress_ui, progress_server
 from plannerarena.regression import regression_ui, regression_server
+from plannerarena.rankings import rankings_ui, rankings_server
+from plannerarena.interactive import PLOTLY_JS
+from plannerarena.api import api_routes
+from plannerarena.memory import DATASETS
+from plannerarena.profiling import admin_routes
+from plannerarena.reactivity import scheduled_calc
+from plannerarena.warmup import warm_up
 import pandas as pd
 
 pd.options.mode.copy_on_write = True
@@ -20,27 +41,49 @@ ASSET_DIR = Path(__file__).parent / "www"
 # default database and max upload size are configurable via env vars
 DATABASE = os.getenv("DATABASE", ASSET_DIR / "benchmark.db")
 MAX_DB_SIZE = int(os.getenv("MAX_DB_SIZE", "50000000"))
+# whether plots are drawn in the browser from aggregated data by default
+INTERACTIVE_PLOTS = os.getenv("INTERACTIVE_PLOTS", "0") == "1"
+# whether the default database is parsed and the default selections are computed at startup
+WARM_UP = os.getenv("WARM_UP", "0") == "1"
+# default databases larger than this many bytes are summarized instead of loaded into memory
+# (0 means never)
+SKETCH_DB_SIZE = int(os.getenv("SKETCH_DB_SIZE", "0"))
+SKETCH = (
+    SKETCH_DB_SIZE > 0
+    and Path(DATABASE).exists()
+    and Path(DATABASE).stat().st_size > SKETCH_DB_SIZE
+)
 
 app_ui = ui.page_navbar(
-    ui.head_content(ui.include_css(ASSET_DIR / "plannerarena.css")),
+    ui.head_content(
+        ui.include_css(ASSET_DIR / "plannerarena.css"),
+        ui.tags.meta(name="plannerarena-plotly", content=PLOTLY_JS),
+        ui.include_js(ASSET_DIR / "interactive.js"),
+    ),
     ui.nav_panel(
         "Overall performance",
-        performance_ui("performance"),
+        performance_ui("performance", interactive=INTERACTIVE_PLOTS),
         value="performance",
         icon=fa.icon_svg("chart-bar"),
     ),
     ui.nav_panel(
         "Progress",
-        progress_ui("progress"),
+        progress_ui("progress", interactive=INTERACTIVE_PLOTS),
         value="progress",
         icon=fa.icon_svg("chart-area"),
     ),
     ui.nav_panel(
         "Regression",
-        regression_ui("regression"),
+        regression_ui("regression", interactive=INTERACTIVE_PLOTS),
         value="regression",
         icon=fa.icon_svg("chart-bar"),
     ),
+    ui.nav_panel(
+        "Rankings",
+        rankings_ui("rankings"),
+        value="rankings",
+        icon=fa.icon_svg("ranking-star"),
+    ),
     ui.nav_panel(
         "Database info",
         database_info_ui("database_info"),
@@ -114,8 +157,8 @@ app_ui = ui.page_navbar(
 
 
 def app_server(input: Inputs, output: Outputs, session: Session):
-    @reactive.calc
-    def data():
+    @scheduled_calc(session.id, "load database")
+    def loaded() -> Callable[[], dict]:
         file: list[FileInfo] | None = input.database()
         if file is None or file[0]["size"] > MAX_DB_SIZE:
             if not Path(DATABASE).exists():
@@ -126,8 +169,18 @@ def app_server(input: Inputs, output: Outputs, session: Session):
                     duration=5,
                     type="warning",
                 )
-            return load_database(DATABASE)
-        return load_database(file[0]["datapath"])
+            return lambda: load_database_cached(DATABASE, SKETCH)
+        path = file[0]["datapath"]
+        return lambda: load_database(path)
+
+    @reactive.calc
+    def data():
+        if loaded().get("shared", False):
+            return loaded()
+        # uploaded databases are moved to disk when they are not used (see `memory.py`)
+        return DATASETS.register(session.id, loaded())
+
+    session.on_ended(lambda: DATASETS.discard(session.id))
 
     # after a new database is uploaded switch to the "performance" tab
     @reactive.effect
@@ -140,11 +193,52 @@ def app_server(input: Inputs, output: Outputs, session: Session):
     performance_server("performance", data)
     progress_server("progress", data)
     regression_server("regression", data)
+    rankings_server("rankings", data)
     database_info_server("database_info", data)
 
 
-# create the Shiny app. The shiny command line app looks for this variable
-app = App(app_ui, app_server, static_assets=ASSET_DIR)
+shiny_app = App(app_ui, app_server, static_assets=ASSET_DIR)
+
+
+async def server_status(request: Request) -> JSONResponse:
+    """Report the number of running and queued heavy computations and the memory used by
+    uploaded databases"""
+    return JSONResponse(SCHEDULER.status() | {"memory": DATASETS.status()})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    # mounted apps do not get lifespan events, so the Shiny app's own start-up and shutdown
+    # (e.g., the shutdown callbacks registered with it) runs here
+    async with shiny_app.starlette_app.router.lifespan_context(app):
+        warm_up_task = None
+        if WARM_UP:
+            # warm up in a worker thread that holds a slot of the scheduler, so that the
+            # server can accept connections right away
+            warm_up_task = asyncio.create_task(
+                SCHEDULER.run_in_thread(
+                    "warm-up", BACKGROUND, warm_up, DATABASE, SKETCH
+                )
+            )
+        yield
+        if warm_up_task is not None:
+            warm_up_task.cancel()
+
+
+# the read-only data API for the default database is served under /api next to the Shiny
+# app. The shiny command line app looks for this variable
+app = Starlette(
+    routes=[
+        Mount(
+            "/api",
+            routes=api_routes(DATABASE, SKETCH)
+            + [Route("/status", server_status, methods=["GET"])],
+        ),
+        Mount("/admin", routes=admin_routes()),
+        Mount("/", app=shiny_app),
+    ],
+    lifespan=lifespan,
+)
 
 
 def run():
@@ -1,9 +1,17 @@
+import hashlib
 import re
 import sqlite3
+from collections.abc import Callable, Collection, Hashable, Mapping
+from typing import Any
+import numpy as np
 import polars.selectors as cs
 import polars as pl
 from shiny import Inputs, Outputs, Session, module, reactive, render, ui, req
 from pathlib import Path
+from plannerarena.cache import LRUCache
+from plannerarena.sketch import build_sketches
+
+DATABASE_CACHE = LRUCache(maxsize=2)
 
 
 def get_table(conn: sqlite3.Connection, table: str) -> pl.DataFrame:
@@ -22,8 +30,175 @@ def _version_key(version_string):
     return tuple(int(p) if p.isdigit() else p for p in parts)
 
 
-def load_database(dbname: str | Path) -> dict:
-    """Read a Planner Arena database and return the parsed tables"""
+def canonical_parameter_value(value) -> str:
+    """Return the key of an experiment parameter value in the parameter index.
+
+    Equal numbers get the same key, however they are stored or written (e.g., 10000000,
+    10000000.0 and "1e7"). Integral values are written out exactly and other floats as the
+    shortest string that parses back to the same float, so distinct values never share a key.
+    """
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        number = value
+    else:
+        try:
+            return str(int(str(value).strip()))
+        except ValueError:
+            pass
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return str(value)
+    if number.is_integer():
+        return str(int(number))
+    return repr(number)
+
+
+def _numeric_sort_key(value: str):
+    try:
+        return (0, float(value), value)
+    except ValueError:
+        return (1, 0.0, value)
+
+
+def build_parameter_index(
+    experiments: pl.DataFrame, parameters: list[str]
+) -> dict[str, dict[str, frozenset[int]]]:
+    """Map each experiment parameter and each of its (canonical) values to the set of ids of
+    the experiments with that value.
+
+    Runs inherit their parameter values from their experiment, so a combination of parameter
+    selections is resolved by intersecting these sets and filtering the runs on their experiment
+    id. The values for each parameter are sorted numerically where possible."""
+    index = {}
+    for param in parameters:
+        values: dict[str, set[int]] = {}
+        for value, ids in (
+            experiments.select("id", param)
+            .drop_nulls(param)
+            .group_by(param)
+            .agg("id")
+            .iter_rows()
+        ):
+            values.setdefault(canonical_parameter_value(value), set()).update(ids)
+        index[param] = {
+            value: frozenset(values[value])
+            for value in sorted(values, key=_numeric_sort_key)
+        }
+    return index
+
+
+def build_parameter_labels(
+    experiments: pl.DataFrame, parameters: list[str]
+) -> dict[str, dict[str, str]]:
+    """Map each experiment parameter and each of its canonical values (the keys of the
+    parameter index) to the value as it is shown in plots and returned by the data API
+    """
+    return {
+        param: {
+            canonical_parameter_value(value): str(value)
+            for value in experiments[param].drop_nulls().unique(maintain_order=True)
+        }
+        for param in parameters
+    }
+
+
+def compact_dtypes(df: pl.DataFrame, keep: Collection[str] = ()) -> pl.DataFrame:
+    """Store numeric columns in the smallest type that represents all values exactly.
+
+    Integers are shrunk to the smallest integer type that covers their range, and floats are
+    stored as Float32 if converting them back to Float64 gives the same values. The columns in
+    `keep` (e.g., ids that are joined with other tables) keep their type. `widen_dtypes`
+    restores the types of the columns of an SQLite table."""
+    columns = []
+    for column in df.iter_columns():
+        if column.name in keep:
+            pass
+        elif column.dtype.is_integer():
+            column = column.shrink_dtype()
+        elif column.dtype == pl.Float64:
+            narrow = column.cast(pl.Float32)
+            if narrow.cast(pl.Float64).equals(column):
+                column = narrow
+        columns.append(column)
+    return pl.DataFrame(columns)
+
+
+def widen_dtypes(df: pl.DataFrame, columns: Collection[str]) -> pl.DataFrame:
+    """Undo `compact_dtypes` for the given columns of a table read from SQLite (where all
+    integers are Int64 and all floats are Float64)"""
+    return df.with_columns(
+        (
+            pl.col(c).cast(pl.Int64)
+            if df.schema[c].is_integer()
+            else pl.col(c).cast(pl.Float64)
+        )
+        for c in columns
+        if df.schema[c].is_integer() or df.schema[c] == pl.Float32
+    )
+
+
+def progress_offsets(progress: pl.DataFrame) -> pl.DataFrame:
+    """Return the first row ("offset") and number of rows ("length") of each run in the
+    progress table, which must be sorted by run id"""
+    return (
+        progress.select("runid")
+        .with_row_index("offset")
+        .group_by("runid", maintain_order=True)
+        .agg(pl.col("offset").first(), pl.len().alias("length"))
+    )
+
+
+def select_progress(data: dict, runs: pl.DataFrame) -> pl.DataFrame:
+    """Return the progress samples of the runs in `runs` with the other columns of `runs`
+    appended to every sample of the corresponding run.
+
+    The samples of each run are stored contiguously in the progress table, so instead of
+    joining the whole table with the runs, the per-run offsets are looked up and the (merged)
+    ranges of rows are sliced out."""
+    progress = data["progress"]
+    per_run = (
+        runs.join(data["progress_offsets"], left_on="id", right_on="runid")
+        .sort("offset")
+        .drop("id")
+    )
+    columns = per_run.drop("offset", "length")
+    if per_run.is_empty():
+        return progress.clear().hstack(columns)
+    start = per_run["offset"].to_numpy().astype(np.int64)
+    length = per_run["length"].to_numpy().astype(np.int64)
+    end = start + length
+    # merge ranges of runs that are adjacent in the progress table into a single slice
+    first = np.flatnonzero(np.r_[True, start[1:] != end[:-1]])
+    last = np.r_[first[1:] - 1, len(start) - 1]
+    samples = pl.concat(
+        [progress.slice(s, e - s) for s, e in zip(start[first], end[last])],
+        rechunk=False,
+    )
+    return samples.hstack(columns[np.repeat(np.arange(len(columns)), length)])
+
+
+def database_fingerprint(dbname: str | Path) -> str:
+    """Return a string that changes whenever the database file changes.
+
+    It is used as part of the key for results that are cached across sessions."""
+    path = Path(dbname).resolve()
+    stat = path.stat()
+    return hashlib.sha1(
+        f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+    ).hexdigest()
+
+
+def load_database(dbname: str | Path, sketch: bool = False) -> dict:
+    """Read a Planner Arena database and return the parsed tables.
+
+    With `sketch`, the runs are not loaded into memory, but summarized per experiment, planner,
+    and attribute with `sketch.build_sketches` ("sketches"). The "runs" table then contains
+    one row per experiment and planner (without attributes), which is enough to select the
+    summaries in the same way as runs, and there is no progress data."""
     if not Path(dbname).exists():
         return {
             "experiments": pl.DataFrame(),
@@ -34,6 +209,11 @@ def load_database(dbname: str | Path) -> dict:
             "runs": pl.DataFrame(),
             "attributes": [],
             "progress": pl.DataFrame(),
+            "progress_offsets": pl.DataFrame(),
+            "parameter_index": {},
+            "parameter_labels": {},
+            "sketches": None,
+            "fingerprint": "",
         }
     conn = sqlite3.connect(dbname)
     experiments = get_table(conn, "experiments").rename({"name": "experiment"})
@@ -58,8 +238,22 @@ def load_database(dbname: str | Path) -> dict:
         pl.col("name").cast(pl.Categorical),
     )
 
-    runs = get_table(conn, "runs")
-    attributes = runs.columns[3:]
+    if sketch:
+        attributes = [
+            row[1].replace("_", " ")
+            for row in conn.execute("PRAGMA table_info(runs)").fetchall()
+        ][3:]
+        sketches = build_sketches(dbname, attributes)
+        runs = (
+            sketches["stats"]
+            .select("experimentid", "plannerid")
+            .unique()
+            .sort("experimentid", "plannerid")
+        )
+    else:
+        sketches = None
+        runs = get_table(conn, "runs")
+        attributes = runs.columns[3:]
 
     exp_exclude_cols = [
         "totaltime",
@@ -81,25 +275,208 @@ def load_database(dbname: str | Path) -> dict:
         right_on="id",
     )
 
-    progress = get_table(conn, "progress")
+    # keep the samples of each run together, so that runs can be selected by slicing
+    progress = (
+        pl.DataFrame(schema={"runid": pl.Int64, "time": pl.Float64})
+        if sketch
+        else compact_dtypes(
+            get_table(conn, "progress").sort("runid", "time"), keep=["runid"]
+        )
+    )
+    parameters = experiments.columns[12:]
 
     return {
         "experiments": experiments,
         "problem_names": problem_names,
-        "parameters": experiments.columns[12:],
+        "parameters": parameters,
         "planner_configs": planner_configs,
         "enums": enums,
         "runs": runs,
         "attributes": attributes,
         "progress": progress,
+        "progress_offsets": progress_offsets(progress),
+        "parameter_index": build_parameter_index(experiments, parameters),
+        "parameter_labels": build_parameter_labels(experiments, parameters),
+        "sketches": sketches,
+        "fingerprint": database_fingerprint(dbname),
     }
 
 
+def load_database_cached(dbname: str | Path, sketch: bool = False) -> dict:
+    """Same as `load_database`, but the parsed tables are shared by all callers until the
+    database file changes.
+
+    This is meant for the default database, which would otherwise be parsed again for every
+    session. The returned tables must not be modified."""
+    if not Path(dbname).exists():
+        return load_database(dbname)
+    return DATABASE_CACHE.get(
+        (str(dbname), database_fingerprint(dbname), sketch),
+        lambda: load_database(dbname, sketch) | {"shared": True},
+    )
+
+
+def shared_cache_get(
+    cache: LRUCache, data: Mapping, key: Hashable, compute: Callable[[], Any]
+) -> Any:
+    """Return `cache.get(key, compute)` for a database loaded with `load_database_cached`,
+    and `compute()` for any other database.
+
+    The caches that are shared by all sessions only keep results for the shared default
+    database, so that the results for a database uploaded by a session do not outlive the
+    session or its memory budget (see `memory.py`)."""
+    if not data.get("shared", False):
+        return compute()
+    return cache.get(key, compute)
+
+
+# number of rows per page of the tables in the "Database info" tab
+PAGE_SIZE = 20
+# values of long text columns are truncated to this many characters in the tables; the full
+# values are only shown for the selected row
+PREVIEW_LENGTH = 60
+
+
+def search_rows(df: pl.DataFrame, text: str) -> pl.DataFrame:
+    """Select the rows of `df` with a value in any column that contains `text` (ignoring
+    case)"""
+    if not text:
+        return df
+    text = text.lower()
+    return df.filter(
+        pl.any_horizontal(
+            pl.all()
+            .cast(pl.String)
+            .str.to_lowercase()
+            .str.contains(text, literal=True)
+            .fill_null(False)
+        )
+    )
+
+
+def table_page(
+    df: pl.DataFrame, page: int, columns: list[str], long_text: list[str]
+) -> pl.DataFrame:
+    """Return the given columns of one page of `df`, with the values of the `long_text`
+    columns truncated to `PREVIEW_LENGTH` characters"""
+    return (
+        df.slice((page - 1) * PAGE_SIZE, PAGE_SIZE)
+        .select(columns)
+        .with_columns(
+            pl.when(pl.col(column).str.len_chars() > PREVIEW_LENGTH)
+            .then(pl.col(column).str.slice(0, PREVIEW_LENGTH) + "…")
+            .otherwise(pl.col(column))
+            for column in long_text
+            if column in columns
+        )
+    )
+
+
+@module.ui
+def paged_table_ui(select_columns: bool = False):
+    return ui.TagList(
+        ui.layout_columns(
+            # only search when the user is done typing (not for every keystroke)
+            ui.input_text(
+                "search",
+                "Search",
+                placeholder="Press enter to search",
+                update_on="blur",
+            ),
+            ui.output_ui("columns_ui") if select_columns else None,
+            ui.div(
+                ui.input_numeric("page", "Page", 1, min=1, step=1),
+                ui.output_text("page_count"),
+            ),
+        ),
+        ui.output_data_frame("table"),
+        ui.output_ui("details"),
+    )
+
+
+@module.server
+def paged_table_server(
+    input: Inputs,
+    output: Outputs,
+    session: Session,
+    data: reactive.Calc_[pl.DataFrame],
+    long_text: list[str],
+    select_columns: bool = False,
+):
+    """A table that is paginated, searched, and projected on the server, so that only the
+    visible page is sent to the browser. The full values of the `long_text` columns are sent
+    when a row is selected."""
+
+    @reactive.calc
+    def matches() -> pl.DataFrame:
+        return search_rows(data(), input.search())
+
+    @reactive.calc
+    def num_pages() -> int:
+        return max(1, -(-matches().height // PAGE_SIZE))
+
+    # go back to the first page whenever the search results change
+    @reactive.effect
+    def _():
+        ui.update_numeric("page", value=1, max=num_pages())
+
+    @reactive.calc
+    def page() -> int:
+        return min(max(1, input.page() or 1), num_pages())
+
+    @output
+    @render.ui
+    def columns_ui() -> ui.Tag:
+        columns = data().columns
+        return ui.input_selectize(
+            "columns", "Columns", choices=columns, selected=columns, multiple=True
+        )
+
+    @output
+    @render.text
+    def page_count() -> str:
+        return f"of {num_pages()} ({matches().height} rows)"
+
+    @output
+    @render.data_frame
+    def table():
+        req(not data().is_empty())
+        columns = data().columns
+        if select_columns:
+            selected = input.columns()
+            req(selected)
+            columns = [column for column in columns if column in selected]
+        return render.DataGrid(
+            table_page(matches(), page(), columns, long_text),
+            width="100%",
+            summary=False,
+            selection_mode="row",
+        )
+
+    @output
+    @render.ui
+    def details() -> ui.TagList:
+        rows = table.cell_selection()["rows"]
+        req(rows)
+        index = (page() - 1) * PAGE_SIZE + rows[0]
+        req(index < matches().height)
+        row = matches().row(index, named=True)
+        return ui.TagList(
+            *(
+                ui.TagList(ui.h5(column), ui.pre(row[column]))
+                for column in long_text
+                if row.get(column)
+            )
+        )
+
+
 @module.ui
 def database_info_ui():
     return ui.navset_tab(
-        ui.nav_panel("Benchmark setup", ui.output_data_frame("benchmark_info")),
-        ui.nav_panel("Planner Configuration", ui.output_data_frame("planner_configs")),
+        ui.nav_panel(
+            "Benchmark setup", paged_table_ui("benchmark_info", select_columns=True)
+        ),
+        ui.nav_panel("Planner Configuration", paged_table_ui("planner_configs")),
     )
 
 
@@ -107,14 +484,18 @@ def database_info_ui():
 def database_info_server(
     input: Inputs, output: Outputs, session: Session, data: reactive.Value
 ):
-    @output
-    @render.data_frame
-    def benchmark_info():
-        req(not data()["experiments"].is_empty())
-        return data()["experiments"].transpose(include_header=True)
+    @reactive.calc
+    def experiments() -> pl.DataFrame:
+        return data()["experiments"]
 
-    @output
-    @render.data_frame
-    def planner_configs():
-        req(not data()["planner_configs"].is_empty())
-        return data()["planner_configs"].select("planner", "settings").unique()
+    @reactive.calc
+    def planner_configs() -> pl.DataFrame:
+        configs = data()["planner_configs"]
+        if configs.is_empty():
+            return configs
+        return configs.select("planner", "settings").unique(maintain_order=True)
+
+    paged_table_server(
+        "benchmark_info", experiments, ["cpuinfo", "setup"], select_columns=True
+    )
+    paged_table_server("planner_configs", planner_configs, ["settings"])
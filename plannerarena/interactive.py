@@ -0,0 +1,377 @@
+import json
+import polars as pl
+from shiny import ui
+
+# Plotly.js is served with the other assets (so interactive plots also work offline and with a
+# strict content security policy), but it is only downloaded by the browser the first time an
+# interactive plot is drawn
+PLOTLY_JS = "plotly-2.35.2.min.js"
+
+# Plotly's default color sequence, needed where traces are colored explicitly
+PALETTE = [
+    "#636efa",
+    "#ef553b",
+    "#00cc96",
+    "#ab63fa",
+    "#ffa15a",
+    "#19d3f3",
+    "#ff6692",
+    "#b6e880",
+    "#ff97ff",
+    "#fecb52",
+]
+
+DEFAULT_LAYOUT = {
+    "height": 400,
+    "margin": {"l": 60, "r": 20, "t": 20, "b": 50},
+    "hovermode": "closest",
+    "template": "plotly_white",
+}
+
+
+def _str_cols(df: pl.DataFrame, columns: list[str]) -> pl.DataFrame:
+    """cast categorical/enum/numeric key columns to strings so they serialize as JSON"""
+    return df.with_columns(pl.col(c).cast(pl.String) for c in columns)
+
+
+def key_columns(*columns: str | None) -> list[str]:
+    """return the non-empty column names, e.g., to group by planner and an optional grouping"""
+    return [c for c in columns if c]
+
+
+def box_stats(
+    df: pl.DataFrame, value: str, by: list[str], outliers: bool = True
+) -> pl.DataFrame:
+    """Compute the five-number summary (with Tukey fences) and outliers for each group"""
+    df = df.select(*by, pl.col(value).cast(pl.Float64)).drop_nulls(value)
+    stats = df.group_by(by).agg(
+        pl.col(value).quantile(0.25, "linear").alias("q1"),
+        pl.col(value).median().alias("median"),
+        pl.col(value).quantile(0.75, "linear").alias("q3"),
+        pl.len().alias("n"),
+    )
+    stats = stats.with_columns(
+        (pl.col("q1") - 1.5 * (pl.col("q3") - pl.col("q1"))).alias("lo"),
+        (pl.col("q3") + 1.5 * (pl.col("q3") - pl.col("q1"))).alias("hi"),
+    )
+    inside = pl.col(value).is_between(pl.col("lo"), pl.col("hi"))
+    fences = (
+        df.join(stats.select(*by, "lo", "hi"), on=by)
+        .group_by(by)
+        .agg(
+            pl.col(value).filter(inside).min().alias("lowerfence"),
+            pl.col(value).filter(inside).max().alias("upperfence"),
+            pl.col(value).filter(~inside).alias("outliers"),
+        )
+    )
+    stats = stats.join(fences, on=by).drop("lo", "hi")
+    if not outliers:
+        stats = stats.with_columns(
+            pl.lit([], dtype=pl.List(pl.Float64)).alias("outliers")
+        )
+    # sort before the keys are cast to strings, so that numeric keys are in numeric order
+    return _str_cols(stats.sort(by), by)
+
+
+def ecdf_knots(df: pl.DataFrame, value: str, by: list[str]) -> pl.DataFrame:
+    """Compute the knots of the empirical cumulative distribution function for each group.
+
+    Only distinct values are kept, so the result is never larger than the input column.
+    """
+    return _str_cols(
+        df.select(*by, pl.col(value).cast(pl.Float64))
+        .drop_nulls(value)
+        .group_by(*by, value)
+        .agg(pl.len().alias("count"))
+        .sort(*by, value)
+        .with_columns(
+            (pl.col("count").cum_sum().over(by) / pl.col("count").sum().over(by)).alias(
+                "probability"
+            )
+        ),
+        by,
+    )
+
+
+def enum_counts(df: pl.DataFrame, enum: pl.DataFrame, by: list[str]) -> pl.DataFrame:
+    """Count the runs per enum value description for each group"""
+    return _str_cols(
+        df.join(enum, left_on="status", right_on="value")
+        .group_by(*by, "description")
+        .agg(pl.len().alias("count"))
+        .sort(*by, "description"),
+        [*by, "description"],
+    )
+
+
+def binned_counts(
+    df: pl.DataFrame, value: str, by: list[str], binwidth: float
+) -> pl.DataFrame:
+    """Count the non-missing values per bin of width `binwidth` for each group"""
+    return _str_cols(
+        df.drop_nulls(value)
+        .with_columns(((pl.col("time") / binwidth).floor() * binwidth).alias("bin"))
+        .group_by(*by, "bin")
+        .agg(pl.len().alias("count"))
+        .sort(*by, "bin"),
+        by,
+    )
+
+
+def binned_means(
+    df: pl.DataFrame, value: str, by: list[str], num_bins: int = 100
+) -> pl.DataFrame:
+    """Average the values over `num_bins` equal time bins for each group"""
+    df = df.drop_nulls(value)
+    if df.is_empty():
+        return pl.DataFrame()
+    binwidth = (df["time"].max() or 1.0) / num_bins
+    return _str_cols(
+        df.with_columns(
+            ((pl.col("time") / binwidth).floor() * binwidth + binwidth / 2).alias("bin")
+        )
+        .group_by(*by, "bin")
+        .agg(pl.col(value).mean())
+        .sort(*by, "bin"),
+        by,
+    )
+
+
+def mean_ci(df: pl.DataFrame, value: str, by: list[str]) -> pl.DataFrame:
+    """Compute the mean and a normal-approximation 95% confidence interval for each group"""
+    return _str_cols(
+        df.select(*by, pl.col(value).cast(pl.Float64))
+        .drop_nulls(value)
+        .group_by(by)
+        .agg(
+            pl.col(value).mean().alias("mean"),
+            (1.96 * pl.col(value).std() / pl.len().sqrt()).fill_null(0.0).alias("ci"),
+        )
+        .sort(by),
+        by,
+    )
+
+
+def _groups(df: pl.DataFrame, by: list[str]):
+    """iterate over (key tuple, sub-frame) pairs in sorted key order"""
+    if df.is_empty():
+        return []
+    if not by:
+        return [((), df)]
+    return df.partition_by(by, as_dict=True, maintain_order=True).items()
+
+
+def _name(key: tuple) -> str:
+    return ", ".join(str(k) for k in key)
+
+
+def boxplot_figure(
+    stats: pl.DataFrame, attr: str, x: str, group: str | None, ylogscale: bool
+) -> dict:
+    """Plotly figure for box statistics computed with `box_stats`.
+
+    Boxes are drawn from the precomputed statistics, so no raw data is sent to the browser.
+    """
+    traces = []
+    for key, g in _groups(stats, [group] if group else []):
+        name = _name(key) if group else attr
+        outliers = g["outliers"].to_list()
+        traces.append(
+            {
+                "type": "box",
+                "name": name,
+                "offsetgroup": name,
+                "x": g[x].to_list(),
+                "q1": g["q1"].to_list(),
+                "median": g["median"].to_list(),
+                "q3": g["q3"].to_list(),
+                "lowerfence": g["lowerfence"].to_list(),
+                "upperfence": g["upperfence"].to_list(),
+                "boxpoints": False,
+                "showlegend": bool(group),
+            }
+        )
+        xs = [xv for xv, out in zip(g[x].to_list(), outliers) for _ in out]
+        if xs:
+            traces.append(
+                {
+                    "type": "box",
+                    "name": name,
+                    "offsetgroup": name,
+                    "x": xs,
+                    "y": [v for out in outliers for v in out],
+                    "boxpoints": "all",
+                    "jitter": 0,
+                    "pointpos": 0,
+                    "fillcolor": "rgba(0,0,0,0)",
+                    "line": {"width": 0},
+                    "marker": {"symbol": "circle-open"},
+                    "hoveron": "points",
+                    "showlegend": False,
+                }
+            )
+    return {
+        "data": traces,
+        "layout": DEFAULT_LAYOUT
+        | {
+            "boxmode": "group" if group else "overlay",
+            "xaxis": {"title": {"text": x}},
+            "yaxis": {"title": {"text": attr}, "type": "log" if ylogscale else "-"},
+            "legend": {"title": {"text": group or ""}},
+        },
+    }
+
+
+def ecdf_figure(knots: pl.DataFrame, value: str, attr: str, by: list[str]) -> dict:
+    """Plotly figure for ECDF knots computed with `ecdf_knots`"""
+    dash = ["solid", "dash", "dot", "dashdot", "longdash", "longdashdot"]
+    dash_keys = {}
+    traces = []
+    for key, g in _groups(knots, by):
+        style = dash_keys.setdefault(key[1:], dash[len(dash_keys) % len(dash)])
+        traces.append(
+            {
+                "type": "scatter",
+                "mode": "lines",
+                "name": _name(key),
+                "legendgroup": str(key[0]),
+                "x": g[value].to_list(),
+                "y": g["probability"].to_list(),
+                "line": {"shape": "hv", "dash": style},
+            }
+        )
+    return {
+        "data": traces,
+        "layout": DEFAULT_LAYOUT
+        | {
+            "xaxis": {"title": {"text": attr}},
+            "yaxis": {"title": {"text": "cumulative probability"}, "range": [0, 1]},
+        },
+    }
+
+
+def enums_figure(counts: pl.DataFrame, grouping: str | None) -> dict:
+    """Plotly stacked bar chart of enum value counts per planner.
+
+    If grouping is not empty, each planner is nested inside its group value on the x-axis.
+    """
+    traces = []
+    for key, g in _groups(counts, ["description"]):
+        x = g["planner"].to_list()
+        traces.append(
+            {
+                "type": "bar",
+                "name": key[0],
+                "x": [g[grouping].to_list(), x] if grouping else x,
+                "y": g["count"].to_list(),
+            }
+        )
+    return {
+        "data": traces,
+        "layout": DEFAULT_LAYOUT
+        | {"barmode": "stack", "xaxis": {"title": {"text": "planner"}}},
+    }
+
+
+def lines_figure(
+    df: pl.DataFrame, x: str, y: str, by: list[str], xlab: str, ylab: str
+) -> dict:
+    """Plotly line chart with one line per group"""
+    return {
+        "data": [
+            {
+                "type": "scatter",
+                "mode": "lines",
+                "name": _name(key),
+                "x": g[x].to_list(),
+                "y": g[y].to_list(),
+            }
+            for key, g in _groups(df, by)
+        ],
+        "layout": DEFAULT_LAYOUT
+        | {
+            "xaxis": {"title": {"text": xlab}},
+            "yaxis": {"title": {"text": ylab}},
+        },
+    }
+
+
+def bands_figure(df: pl.DataFrame, by: list[str], xlab: str, ylab: str) -> dict:
+    """Plotly chart with a median line and a shaded interquartile band per group, as computed
+    by `resample_progress`"""
+    traces = []
+    for i, (key, g) in enumerate(_groups(_str_cols(df, by), by)):
+        color = PALETTE[i % len(PALETTE)]
+        x = g["time"].to_list()
+        traces.extend(
+            [
+                {
+                    "type": "scatter",
+                    "mode": "lines",
+                    "x": x + x[::-1],
+                    "y": g["upper"].to_list() + g["lower"].to_list()[::-1],
+                    "fill": "toself",
+                    "fillcolor": color,
+                    "opacity": 0.2,
+                    "line": {"width": 0},
+                    "legendgroup": _name(key),
+                    "showlegend": False,
+                    "hoverinfo": "skip",
+                },
+                {
+                    "type": "scatter",
+                    "mode": "lines",
+                    "name": _name(key),
+                    "legendgroup": _name(key),
+                    "x": x,
+                    "y": g["median"].to_list(),
+                    "line": {"color": color},
+                },
+            ]
+        )
+    return {
+        "data": traces,
+        "layout": DEFAULT_LAYOUT
+        | {
+            "xaxis": {"title": {"text": xlab}},
+            "yaxis": {"title": {"text": ylab}},
+        },
+    }
+
+
+def bars_figure(stats: pl.DataFrame, attr: str, grouping: str | None) -> dict:
+    """Plotly grouped bar chart with error bars for statistics computed with `mean_ci`.
+
+    If grouping is not empty, each version is nested inside its group value on the x-axis.
+    """
+    traces = []
+    for key, g in _groups(stats, ["planner"]):
+        x = g["version"].to_list()
+        traces.append(
+            {
+                "type": "bar",
+                "name": key[0],
+                "x": [g[grouping].to_list(), x] if grouping else x,
+                "y": g["mean"].to_list(),
+                "error_y": {"type": "data", "array": g["ci"].to_list()},
+            }
+        )
+    return {
+        "data": traces,
+        "layout": DEFAULT_LAYOUT
+        | {
+            "barmode": "group",
+            "xaxis": {"title": {"text": "version"}},
+            "yaxis": {"title": {"text": attr}},
+        },
+    }
+
+
+def output_interactive_plot(figure: dict, id: str) -> ui.TagList:
+    """Return a placeholder element and the script that draws `figure` into it in the browser"""
+    # NaN/Infinity are not valid JSON, but they are valid JavaScript literals
+    spec = json.dumps(figure).replace("</", "<\\/")
+    return ui.TagList(
+        ui.div(id=id, class_="plannerarena-chart"),
+        ui.tags.script(f"PlannerArena.draw({json.dumps(id)}, {spec});"),
+    )
@@ -0,0 +1,600 @@
+"""Replay scripted user sessions against a running Planner Arena server and measure latencies.
+
+Each simulated session talks to the server over the same websocket protocol as a browser: it
+sets inputs, waits for outputs to be recomputed, switches tabs, uploads databases, and
+downloads plots. The latency of every output and download is recorded, and a summary with
+percentiles (and the peak memory usage of the server if it was started by this script) is
+printed at the end.
+
+A scenario is a JSON file of the form
+
+    {
+        "tabs": {"<tab>": ["<output id>", ...], ...},
+        "init": {"<input id>": <value>, ...},
+        "init_wait": ["<output id>", ...],
+        "steps": [
+            {"set": {"<input id>": <value>, ...}, "wait": ["<output id>", ...]},
+            {"tab": "<tab>", "wait": ["<output id>", ...]},
+            {"upload": "<path to database>", "wait": ["<output id>", ...]},
+            {"download": "<download id>"},
+            {"sleep": <seconds>}
+        ]
+    }
+
+where "tabs" lists the outputs that are visible on each tab, "init" holds the input values sent
+when the page is loaded, and the latencies of the outputs in "init_wait" are reported as the
+page load times ("<output id> (initial)"). Without a scenario file, a scenario is generated
+from the benchmark database.
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+import numpy as np
+import websockets
+
+# outputs that are visible on each tab of the app
+TABS = {
+    "performance": [
+        "performance-problem_ui",
+        "performance-problem_parameter_ui",
+        "performance-attribute_ui",
+        "performance-version_ui",
+        "performance-planner_ui",
+        "performance-plot",
+        "performance-missing_data_table",
+    ],
+    "progress": [
+        "progress-problem_ui",
+        "progress-problem_parameter_ui",
+        "progress-attribute_ui",
+        "progress-version_ui",
+        "progress-planner_ui",
+        "progress-plot",
+        "progress-plot_num_measurements",
+    ],
+    "regression": [
+        "regression-problem_ui",
+        "regression-problem_parameter_ui",
+        "regression-attribute_ui",
+        "regression-versions_ui",
+        "regression-planner_ui",
+        "regression-plot",
+    ],
+    "database_info": [
+        "database_info-benchmark_info-table",
+        "database_info-planner_configs-table",
+    ],
+}
+
+PLOT_WIDTH = 800
+PLOT_HEIGHT = 400
+# seconds after a tab change within which outputs on the tab that are out of date start updating
+TAB_SETTLE_TIME = 0.25
+
+
+def default_scenario(database: str, seed: int = 0) -> dict:
+    """Create a scenario that visits all tabs with a few random selections"""
+    from plannerarena.database import load_database
+    from plannerarena.widgets import (
+        default_attribute,
+        default_planners,
+        default_version,
+        planner_choices,
+        version_choices,
+    )
+
+    data = load_database(database)
+    if data["runs"].is_empty():
+        sys.exit(f"Cannot create a scenario for {database}: no runs found")
+    rng = random.Random(seed)
+    runs = data["runs"]
+    problems = data["problem_names"]
+    problem = problems[0]
+
+    def choices(problem: str) -> tuple[list[str], list[str]]:
+        # the choices of the widgets
+        exp = runs.filter(runs["experiment"] == problem)
+        return version_choices(exp), planner_choices(exp)
+
+    versions, planners = choices(problem)
+    attributes = data["attributes"]
+    progress_attributes = data["progress"].columns[2:]
+    init = {"navbar": "performance", "database": None}
+    for tab in ("performance", "progress", "regression"):
+        init |= {
+            f"{tab}-problem": problem,
+            f"{tab}-attribute": default_attribute(attributes),
+            f"{tab}-planners": default_planners(planners),
+            f"{tab}-apply_manually": False,
+            f"{tab}-apply": 0,
+            f"{tab}-interactive": False,
+        }
+    init |= {
+        "performance-version": default_version(versions),
+        "performance-advanced_options": False,
+        "performance-show_as_cdf": False,
+        "performance-show_simplified": False,
+        "performance-hide_outliers": False,
+        "performance-y_log_scale": False,
+        "progress-version": default_version(versions),
+        "progress-advanced_options": False,
+        "progress-show_measurements": False,
+        "progress-opacity": 50,
+        "progress-show_quantiles": False,
+        "regression-versions": versions,
+        "regression-scan": 0,
+    }
+    for table in ("benchmark_info", "planner_configs"):
+        init |= {f"database_info-{table}-search": "", f"database_info-{table}-page": 1}
+    init["database_info-benchmark_info-columns"] = data["experiments"].columns
+    if progress_attributes:
+        init["progress-attribute"] = default_attribute(progress_attributes)
+
+    performance_outputs = ["performance-plot", "performance-missing_data_table"]
+    new_problem = rng.choice(problems)
+    new_versions, new_planners = choices(new_problem)
+    steps = [
+        {
+            "set": {
+                "performance-problem": new_problem,
+                "performance-version": default_version(new_versions),
+                "performance-planners": default_planners(new_planners),
+            },
+            "wait": performance_outputs,
+        },
+    ]
+    selected = new_planners[:1]
+    for planner in rng.sample(new_planners, min(3, len(new_planners))):
+        if planner not in selected:
+            selected = selected + [planner]
+            steps.append(
+                {"set": {"performance-planners": selected}, "wait": performance_outputs}
+            )
+    steps += [
+        {
+            "set": {"performance-attribute": rng.choice(attributes)},
+            "wait": performance_outputs,
+        },
+        {"download": "performance-download_pdf"},
+        {
+            "tab": "progress",
+            "wait": ["progress-plot", "progress-plot_num_measurements"],
+        },
+        {"tab": "regression", "wait": ["regression-plot"]},
+        {"download": "regression-download_pdf"},
+        {"tab": "database_info", "wait": ["database_info-benchmark_info-table"]},
+        {
+            "set": {"database_info-benchmark_info-search": new_problem},
+            "wait": ["database_info-benchmark_info-table"],
+        },
+    ]
+    return {
+        "tabs": TABS,
+        "init": init,
+        "init_wait": performance_outputs,
+        "steps": steps,
+    }
+
+
+class SimulatedSession:
+    """A single simulated browser session"""
+
+    def __init__(self, url: str, scenario: dict, think_time: float, timeout: float):
+        self.url = url.rstrip("/")
+        self.scenario = scenario
+        self.think_time = think_time
+        self.timeout = timeout
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.session_id = None
+        self._arrived: dict[str, float] = {}
+        self._recalculating: dict[str, float] = {}
+        self._responses: dict[int, asyncio.Future] = {}
+        self._tag = 0
+        self._changed = asyncio.Event()
+
+    def _clientdata(self, tab: str) -> dict:
+        data = {".clientdata_pixelratio": 1, ".clientdata_url_search": ""}
+        for name, outputs in self.scenario["tabs"].items():
+            for output in outputs:
+                data[f".clientdata_output_{output}_hidden"] = name != tab
+                data[f".clientdata_output_{output}_width"] = PLOT_WIDTH
+                data[f".clientdata_output_{output}_height"] = PLOT_HEIGHT
+        return data
+
+    def _record(self, name: str, latency: float):
+        self.latencies.setdefault(name, []).append(latency)
+
+    async def _receive(self, ws):
+        async for raw in ws:
+            message = json.loads(raw)
+            now = time.perf_counter()
+            if "config" in message:
+                self.session_id = message["config"]["sessionId"]
+            if "response" in message:
+                future = self._responses.pop(message["response"]["tag"], None)
+                if future is not None and not future.done():
+                    future.set_result(message["response"])
+            if "recalculating" in message:
+                self._recalculating[message["recalculating"]["name"]] = now
+            for name in message.get("values") or {}:
+                self._arrived[name] = now
+            for name in message.get("errors") or {}:
+                self._arrived[name] = now
+                self.errors[name] = self.errors.get(name, 0) + 1
+            self._changed.set()
+
+    async def _wait(
+        self,
+        outputs: list[str],
+        start: float,
+        suffix: str = "",
+        settle: float | None = None,
+    ):
+        """Wait until all outputs have been received after `start` and record the latencies.
+
+        With `settle`, outputs that were received before and whose recalculation has not
+        started within `settle` seconds are considered up to date and are not recorded.
+        """
+        deadline = start + self.timeout
+        pending = set(outputs)
+        while pending:
+            for name in list(pending):
+                if self._arrived.get(name, 0.0) > start:
+                    self._record(name + suffix, self._arrived[name] - start)
+                    pending.discard(name)
+                elif (
+                    settle is not None
+                    and time.perf_counter() >= start + settle
+                    and name in self._arrived
+                    and self._recalculating.get(name, 0.0) <= start
+                ):
+                    pending.discard(name)
+            if not pending:
+                break
+            remaining = deadline - time.perf_counter()
+            if settle is not None and time.perf_counter() < start + settle:
+                remaining = min(remaining, start + settle - time.perf_counter())
+            if remaining <= 0:
+                for name in pending:
+                    name = f"{name}{suffix} (timeout)"
+                    self.errors[name] = self.errors.get(name, 0) + 1
+                break
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _request(self, ws, method: str, args: list) -> dict:
+        self._tag += 1
+        future = asyncio.get_running_loop().create_future()
+        self._responses[self._tag] = future
+        await ws.send(json.dumps({"method": method, "args": args, "tag": self._tag}))
+        return await asyncio.wait_for(future, self.timeout)
+
+    def _http(self, path: str, data: bytes | None = None) -> bytes:
+        request = urllib.request.Request(f"{self.url}/{path}", data=data)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    async def _upload(self, ws, path: str, wait: list[str]):
+        contents = Path(path).read_bytes()
+        start = time.perf_counter()
+        info = {"name": Path(path).name, "size": len(contents), "type": ""}
+        response = await self._request(ws, "uploadInit", [[info]])
+        job = response["value"]
+        await asyncio.to_thread(self._http, job["uploadUrl"], contents)
+        await self._request(ws, "uploadEnd", [job["jobId"], "database"])
+        self._record("upload:database", time.perf_counter() - start)
+        await self._wait(wait, start)
+
+    async def _download(self, download_id: str):
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(
+                self._http, f"session/{self.session_id}/download/{download_id}?w="
+            )
+            self._record("download:" + download_id, time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            name = "download:" + download_id
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    async def run(self, repeat: int = 1):
+        ws_url = self.url.replace("http", "ws", 1) + "/websocket/"
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            receiver = asyncio.create_task(self._receive(ws))
+            try:
+                init = self.scenario["init"]
+                tab = init.get("navbar", next(iter(self.scenario["tabs"])))
+                start = time.perf_counter()
+                await ws.send(
+                    json.dumps({"method": "init", "data": self._clientdata(tab) | init})
+                )
+                await self._wait(
+                    self.scenario.get("init_wait", []), start, " (initial)"
+                )
+                for i in range(repeat):
+                    if i > 0:
+                        # go back to the initial state, since setting inputs to their current
+                        # values does not update any outputs
+                        start = time.perf_counter()
+                        reset = {k: v for k, v in init.items() if v is not None}
+                        await ws.send(
+                            json.dumps(
+                                {
+                                    "method": "update",
+                                    "data": self._clientdata(tab) | reset,
+                                }
+                            )
+                        )
+                        await self._wait(
+                            self.scenario.get("init_wait", []), start, " (reset)"
+                        )
+                    for step in self.scenario["steps"]:
+                        await asyncio.sleep(self.think_time)
+                        await self._step(ws, step)
+            finally:
+                receiver.cancel()
+
+    async def _step(self, ws, step: dict):
+        start = time.perf_counter()
+        if "set" in step:
+            await ws.send(json.dumps({"method": "update", "data": step["set"]}))
+            await self._wait(step.get("wait", []), start)
+        elif "tab" in step:
+            update = self._clientdata(step["tab"]) | {"navbar": step["tab"]}
+            await ws.send(json.dumps({"method": "update", "data": update}))
+            await self._wait(step.get("wait", []), start, settle=TAB_SETTLE_TIME)
+        elif "upload" in step:
+            await self._upload(ws, step["upload"], step.get("wait", []))
+        elif "download" in step:
+            await self._download(step["download"])
+        elif "sleep" in step:
+            await asyncio.sleep(step["sleep"])
+
+
+class MemoryMonitor:
+    """Sample the resident memory of a process (and its children) on Linux"""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    def _children(self) -> list[int]:
+        try:
+            with open(f"/proc/{self.pid}/task/{self.pid}/children") as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self._rss(self.pid) + sum(self._rss(c) for c in self._children())
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(
+    app: str, database: str | None, env: list[str], log: str | None = None
+) -> tuple:
+    """Start a local server on a free port and wait until it accepts requests"""
+    port = _free_port()
+    server_env = os.environ.copy()
+    if database:
+        server_env["DATABASE"] = str(Path(database).resolve())
+    server_env.update(item.split("=", 1) for item in env)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            app,
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=server_env,
+        stdout=subprocess.DEVNULL,
+        stderr=open(log, "w") if log else subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                sys.exit("The server exited during startup")
+            time.sleep(0.1)
+    process.terminate()
+    sys.exit("The server did not start in time")
+
+
+def summarize(sessions: list[SimulatedSession]) -> dict:
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for session in sessions:
+        for name, values in session.latencies.items():
+            latencies.setdefault(name, []).extend(values)
+        for name, count in session.errors.items():
+            errors[name] = errors.get(name, 0) + count
+    summary = {}
+    for name, values in sorted(latencies.items()):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(max(values) * 1000, 1),
+        }
+    return {"latency": summary, "errors": errors}
+
+
+def print_report(report: dict):
+    width = max([len(name) for name in report["latency"]] + [6])
+    print(
+        f"{'output':<{width}} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    )
+    for name, stats in report["latency"].items():
+        print(
+            f"{name:<{width}} {stats['count']:>6} {stats['p50_ms']:>9} "
+            f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}"
+        )
+    for name, count in report["errors"].items():
+        print(f"errors in {name}: {count}")
+    print(f"sessions: {report['sessions']}, wall time: {report['wall_time_s']} s")
+    if report.get("peak_memory_mb") is not None:
+        print(f"peak server memory: {report['peak_memory_mb']} MB")
+
+
+async def run_sessions(url: str, scenario: dict, args) -> list[SimulatedSession]:
+    sessions = [
+        SimulatedSession(url, scenario, args.think_time, args.timeout)
+        for _ in range(args.sessions)
+    ]
+
+    async def run(i: int, session: SimulatedSession):
+        # stagger the session starts a little, like real visitors
+        await asyncio.sleep(i * args.ramp_up / max(1, args.sessions))
+        await session.run(args.repeat)
+
+    await asyncio.gather(*(run(i, s) for i, s in enumerate(sessions)))
+    return sessions
+
+
+def main():
+    """Replay simulated user sessions against Planner Arena and report latencies"""
+    parser = argparse.ArgumentParser(
+        description=main.__doc__,
+        epilog=__doc__.split("\n\n", 1)[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "-n", "--sessions", type=int, default=1, help="concurrent sessions"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=1, help="scenario repetitions per session"
+    )
+    parser.add_argument("-s", "--scenario", help="scenario JSON file")
+    parser.add_argument(
+        "-d",
+        "--database",
+        help="benchmark database used by the server and for generating a scenario",
+    )
+    parser.add_argument(
+        "--url", help="URL of a running server (by default a local server is started)"
+    )
+    parser.add_argument(
+        "--app", default="plannerarena.app:app", help="ASGI app of the local server"
+    )
+    parser.add_argument(
+        "--server-env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="environment variable for the local server",
+    )
+    parser.add_argument(
+        "--server-log", help="write the output of the local server to this file"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=0.5, help="seconds between steps"
+    )
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=1.0,
+        help="seconds over which sessions are started",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="seconds to wait for an output"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="random seed for the generated scenario"
+    )
+    parser.add_argument("-o", "--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.scenario:
+        scenario = json.loads(Path(args.scenario).read_text())
+        scenario.setdefault("tabs", TABS)
+    else:
+        database = args.database or os.getenv("DATABASE")
+        if not database:
+            parser.error("either --scenario or --database is required")
+        scenario = default_scenario(database, args.seed)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(
+            args.app, args.database, args.server_env, args.server_log
+        )
+    try:
+        start = time.perf_counter()
+        if process is not None:
+            with MemoryMonitor(process.pid) as monitor:
+                sessions = asyncio.run(run_sessions(url, scenario, args))
+            peak_memory = round(monitor.peak / 2**20, 1)
+        else:
+            sessions = asyncio.run(run_sessions(url, scenario, args))
+            peak_memory = None
+        report = summarize(sessions) | {
+            "sessions": args.sessions,
+            "wall_time_s": round(time.perf_counter() - start, 1),
+            "peak_memory_mb": peak_memory,
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
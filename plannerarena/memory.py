@@ -0,0 +1,272 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections.abc import Hashable, Iterator, Mapping
+from pathlib import Path
+import polars as pl
+
+# total size in bytes of the uploaded databases that are kept in memory (0 means no limit)
+MEMORY_BUDGET = int(os.getenv("MEMORY_BUDGET", "1000000000"))
+# uploaded databases that were not used for this many seconds are moved to disk (0 means
+# never)
+IDLE_TIMEOUT = float(os.getenv("IDLE_TIMEOUT", "600"))
+# directory for the tables that were moved to disk (by default the system's temporary
+# directory)
+SPILL_DIR = os.getenv("SPILL_DIR")
+
+
+class _DerivedTable:
+    """A table derived from a database, e.g., the runs selected by a tab"""
+
+    def __init__(self, table: pl.DataFrame):
+        self.ref = weakref.ref(table)
+        self.size = table.estimated_size()
+        # the file the table is memory-mapped from, once it was moved to disk
+        self.path: Path | None = None
+
+
+class SpillableDataset(Mapping):
+    """The parsed tables of a database (see `database.load_database`) that can be moved to
+    disk by a `DatasetRegistry`. Tables that were moved are replaced by tables that are
+    memory-mapped from the files, so to the reactive code this behaves like the original
+    dictionary. Tables derived from it (see `track`) are moved to disk with it."""
+
+    def __init__(self, registry: "DatasetRegistry", key: Hashable, data: dict):
+        self._registry = registry
+        self.key = key
+        self.values = dict(data)
+        self.tables = [
+            name
+            for name, value in data.items()
+            if isinstance(value, pl.DataFrame) and not value.is_empty()
+        ]
+        self.size = sum(self.values[name].estimated_size() for name in self.tables)
+        self.directory: Path | None = None
+        self.files: dict[str, Path] = {}
+        self.spilled = False
+        self.derived: dict[int, _DerivedTable] = {}
+        self.last_used = time.monotonic()
+
+    def __getitem__(self, name: str):
+        return self._registry.lookup(self, name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def track(self, table: pl.DataFrame) -> pl.DataFrame:
+        """Count a table derived from this database in its memory use for as long as the
+        table is used, and move it to disk (in place) together with the database"""
+        return self._registry.track(self, table)
+
+    def resident_size(self) -> int:
+        """Return the size of the tables that are kept in memory"""
+        derived = sum(d.size for d in self.derived.values() if d.path is None)
+        return derived + (0 if self.spilled else self.size)
+
+    def mapped_size(self) -> int:
+        """Return the size of the tables that are memory-mapped from disk"""
+        derived = sum(d.size for d in self.derived.values() if d.path is not None)
+        return derived + (self.size if self.spilled else 0)
+
+
+def track_derived(data: Mapping, table: pl.DataFrame) -> pl.DataFrame:
+    """Return `table`, which was derived from `data`, after tracking it with `data` if that
+    is a `SpillableDataset` (see `SpillableDataset.track`)"""
+    if isinstance(data, SpillableDataset):
+        return data.track(table)
+    return table
+
+
+class DatasetRegistry:
+    """Memory accounting for the databases uploaded by the sessions.
+
+    The tables of the least recently used databases are written to disk in the Arrow IPC
+    format (once) and replaced by memory-mapped tables whenever the databases that are kept
+    in memory take more than `budget` bytes, or when they have not been used for
+    `idle_timeout` seconds. The tables that the sessions derived from a database (e.g., the
+    runs selected by each tab) are moved to disk with it: their columns are replaced in place
+    by memory-mapped columns, so that every holder of such a table (e.g., a reactive calc)
+    uses the mapped copy. Mapped tables stay mapped when they are used again; their pages
+    are read back as needed and can be dropped again by the operating system. The tables are
+    written by a background thread, so that looking up a value (on the event loop) never
+    waits for the disk.
+    """
+
+    def __init__(self, budget: int, idle_timeout: float, directory: str | None = None):
+        self.budget = budget
+        self.idle_timeout = idle_timeout
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._datasets: dict[Hashable, SpillableDataset] = {}
+        self._sweeper: threading.Thread | None = None
+        self._wake = threading.Event()
+        self._spills = 0
+
+    def register(self, key: Hashable, data: dict) -> SpillableDataset:
+        """Start tracking the database loaded by a session (replacing its previous one)"""
+        self.discard(key)
+        dataset = SpillableDataset(self, key, data)
+        with self._lock:
+            self._datasets[key] = dataset
+            self._start_sweeper()
+            if self._over_budget():
+                self._wake.set()
+        return dataset
+
+    def discard(self, key: Hashable):
+        """Stop tracking the database of a session and remove its files"""
+        with self._lock:
+            dataset = self._datasets.pop(key, None)
+        if dataset is not None and dataset.directory is not None:
+            shutil.rmtree(dataset.directory, ignore_errors=True)
+
+    def lookup(self, dataset: SpillableDataset, name: str):
+        with self._lock:
+            dataset.last_used = time.monotonic()
+            return dataset.values[name]
+
+    def track(self, dataset: SpillableDataset, table: pl.DataFrame) -> pl.DataFrame:
+        with self._lock:
+            if self._datasets.get(dataset.key) is dataset and not table.is_empty():
+                dataset.derived[id(table)] = _DerivedTable(table)
+                weakref.finalize(table, self._forget, dataset, id(table))
+                dataset.last_used = time.monotonic()
+                if self._over_budget():
+                    self._wake.set()
+        return table
+
+    def _forget(self, dataset: SpillableDataset, table_id: int):
+        # called when a derived table is garbage collected
+        with self._lock:
+            derived = dataset.derived.pop(table_id, None)
+        if derived is not None and derived.path is not None:
+            derived.path.unlink(missing_ok=True)
+
+    def _resident(self) -> int:
+        return sum(d.resident_size() for d in self._datasets.values())
+
+    def _over_budget(self) -> bool:
+        return self.budget > 0 and self._resident() > self.budget
+
+    def _start_sweeper(self):
+        if self._sweeper is None and (self.budget > 0 or self.idle_timeout > 0):
+            self._sweeper = threading.Thread(
+                target=self._sweep_forever, name="dataset-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep_forever(self):
+        # woken up when the budget is exceeded, and otherwise checks for idle databases
+        # every tenth of the timeout
+        interval = self.idle_timeout / 10 if self.idle_timeout > 0 else None
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self._sweep()
+
+    def _sweep(self):
+        with self._lock:
+            now = time.monotonic()
+            datasets = sorted(self._datasets.values(), key=lambda d: d.last_used)
+            resident = self._resident()
+            victims = []
+            for dataset in datasets:
+                size = dataset.resident_size()
+                if size == 0:
+                    continue
+                idle = (
+                    self.idle_timeout > 0
+                    and now - dataset.last_used > self.idle_timeout
+                )
+                # the most recently used database is kept in memory even if it exceeds
+                # the budget on its own
+                over_budget = (
+                    self.budget > 0
+                    and resident > self.budget
+                    and dataset is not datasets[-1]
+                )
+                if idle or over_budget:
+                    tables = [
+                        (table_id, table)
+                        for table_id, derived in dataset.derived.items()
+                        if derived.path is None and (table := derived.ref()) is not None
+                    ]
+                    victims.append((dataset, dataset.last_used, tables))
+                    resident -= size
+        for dataset, last_used, tables in victims:
+            self._spill(dataset, last_used, tables)
+
+    def _spill(
+        self,
+        dataset: SpillableDataset,
+        last_used: float,
+        derived: list[tuple[int, pl.DataFrame]],
+    ):
+        # the tables are written and mapped without holding the lock
+        directory = dataset.directory or Path(
+            tempfile.mkdtemp(prefix="plannerarena-", dir=self.directory)
+        )
+        files = dataset.files
+        if not files:
+            files = {}
+            for name in dataset.tables:
+                path = directory / f"{name}.arrow"
+                # uncompressed, so that the tables can be memory-mapped
+                dataset.values[name].write_ipc(path, compression="uncompressed")
+                files[name] = path
+        derived_files = []
+        for table_id, table in derived:
+            path = directory / f"derived-{table_id}.arrow"
+            table.write_ipc(path, compression="uncompressed")
+            derived_files.append(path)
+        tables = {
+            name: pl.read_ipc(path, memory_map=True) for name, path in files.items()
+        }
+        mapped = [pl.read_ipc(path, memory_map=True) for path in derived_files]
+        with self._lock:
+            if self._datasets.get(dataset.key) is not dataset:
+                # discarded in the meantime
+                shutil.rmtree(directory, ignore_errors=True)
+                return
+            dataset.directory = directory
+            dataset.files = files
+            if dataset.last_used != last_used:
+                # used again in the meantime
+                for path in derived_files:
+                    path.unlink(missing_ok=True)
+                return
+            if not dataset.spilled:
+                dataset.values.update(tables)
+                dataset.spilled = True
+            for (table_id, table), path, copy in zip(derived, derived_files, mapped):
+                entry = dataset.derived.get(table_id)
+                if entry is None or entry.ref() is not table:
+                    path.unlink(missing_ok=True)
+                    continue
+                for i, column in enumerate(copy.iter_columns()):
+                    table.replace_column(i, column)
+                entry.path = path
+            self._spills += 1
+
+    def status(self) -> dict:
+        """Return the number and size of the tracked databases (and the tables derived from
+        them) in memory and on disk"""
+        with self._lock:
+            datasets = list(self._datasets.values())
+            return {
+                "budget": self.budget,
+                "in memory": sum(d.resident_size() > 0 for d in datasets),
+                "in memory size": self._resident(),
+                "on disk": sum(d.spilled for d in datasets),
+                "on disk size": sum(d.mapped_size() for d in datasets),
+                "spills": self._spills,
+            }
+
+
+DATASETS = DatasetRegistry(MEMORY_BUDGET, IDLE_TIMEOUT, SPILL_DIR)
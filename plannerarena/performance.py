@@ -1,24 +1,48 @@
 import io
 import pickle
+from collections.abc import Callable
 import polars as pl
 import plotnine as p9
 from shiny import Inputs, Outputs, Session, module, reactive, render, ui, req
 from plannerarena.widgets import (
     problem_widget,
-    problem_parameter_filter,
-    problem_parameter_values,
-    problem_parameter_groups,
     problem_parameter_widgets,
+    read_selection,
+    selection_profile_context,
+    cached_selection,
     attribute_widget,
     version_widget,
     planner_widget,
+    problem_summary,
     download_buttons,
+    interactive_widget,
+    apply_widget,
+    plot_output,
     DataTuple,
 )
+from plannerarena.reactivity import applied_selection, scheduled_calc
+from plannerarena.profiling import profiled
+from plannerarena.rendering import export_pdf, viewport_plot
+from plannerarena.interactive import (
+    box_stats,
+    boxplot_figure,
+    ecdf_figure,
+    ecdf_knots,
+    enum_counts,
+    enums_figure,
+    key_columns,
+    output_interactive_plot,
+)
+from plannerarena.sketch import (
+    sketch_box_stats,
+    sketch_ecdf_knots,
+    sketch_enum_counts,
+    sketch_stats,
+)
 
 
 @module.ui
-def performance_ui() -> ui.Tag:
+def performance_ui(interactive: bool = False) -> ui.Tag:
     return ui.page_sidebar(
         ui.sidebar(
             ui.TagList(
@@ -39,10 +63,12 @@ def performance_ui() -> ui.Tag:
                             "hide_outliers", "Hide outliers in box plots"
                         ),
                         ui.input_checkbox("y_log_scale", "Use log scale for Y-axis"),
+                        interactive_widget(interactive),
                     ),
                 ),
                 ui.output_ui("version_ui"),
                 ui.output_ui("planner_ui"),
+                apply_widget(),
             ),
             width="350px",
         ),
@@ -56,7 +82,7 @@ If you use Planner Arena or the OMPL benchmarking facilities, then we kindly ask
 </div>"""
         ),
         download_buttons(),
-        ui.output_plot("plot"),
+        plot_output("plot"),
         ui.output_data_frame("missing_data_table"),
     )
 
@@ -74,6 +100,19 @@ def enums_plot(df: pl.DataFrame, enum: pl.DataFrame, grouping: str) -> p9.ggplot
         return plot
 
 
+def unpivot_simplified(
+    df: pl.DataFrame, attr: str, simplified_attr: str
+) -> pl.DataFrame:
+    """Stack the attribute and its value after simplification into a single "value" column,
+    distinguished by the "key" column"""
+    return df.unpivot(
+        index=["planner"],
+        on=[attr, simplified_attr],
+        variable_name="key",
+        value_name="value",
+    ).with_columns(pl.col("key").cast(pl.Categorical))
+
+
 def ecdf_plot(df: pl.DataFrame, attr: str, grouping: str) -> p9.ggplot:
     """Create a plot of the empirical cumulative distribution function for the specified attribute."""
     plot = (
@@ -162,36 +201,89 @@ def boxplot_with_simplified(
         return plot
 
 
+def enums_plot_from_counts(counts: pl.DataFrame, grouping: str) -> p9.ggplot:
+    """Same as `enums_plot`, but from counts computed with `enum_counts`"""
+    plot = p9.ggplot(
+        counts, p9.aes(x="planner", y="count", fill="description")
+    ) + p9.geom_col(position="stack")
+    if grouping:
+        return plot + p9.facet_grid(grouping)
+    else:
+        return plot
+
+
+def ecdf_plot_from_knots(
+    knots: pl.DataFrame, value: str, attr: str, linetype: str
+) -> p9.ggplot:
+    """Same as `ecdf_plot`, but from knots computed with `ecdf_knots`"""
+    aes = {"x": value, "y": "probability", "color": "planner"}
+    if linetype:
+        aes["linetype"] = linetype
+    return (
+        p9.ggplot(knots, p9.aes(**aes))
+        + p9.xlab(attr)
+        + p9.ylab("cumulative probability")
+        + p9.geom_step()
+    )
+
+
+def boxplot_from_stats(
+    stats: pl.DataFrame, attr: str, grouping: str, ylogscale: bool
+) -> p9.ggplot:
+    """Same as `boxplot`, but from statistics computed with `box_stats`"""
+    aes = {
+        "x": "planner",
+        "lower": "q1",
+        "middle": "median",
+        "upper": "q3",
+        "ymin": "lowerfence",
+        "ymax": "upperfence",
+    }
+    if grouping:
+        plot = p9.ggplot(stats, p9.aes(**aes, fill=grouping)) + p9.geom_boxplot(
+            stat="identity", position=p9.position_dodge2(width=0.8)
+        )
+    else:
+        plot = p9.ggplot(stats, p9.aes(**aes)) + p9.geom_boxplot(
+            stat="identity", color="#3073ba", fill="#99c9eb"
+        )
+    plot = plot + p9.ylab(attr)
+    if ylogscale:
+        return plot + p9.scale_y_log10()
+    else:
+        return plot
+
+
 @module.server
 def performance_server(
     input: Inputs, output: Outputs, session: Session, raw_data: reactive.Value
 ):
     @reactive.calc
-    def exp_data() -> pl.DataFrame:
-        """Return data for the selected experiment"""
+    def problem() -> dict:
+        """Return the choices of the widgets for the selected problem"""
         req(not raw_data()["runs"].is_empty())
-        return raw_data()["runs"].filter(pl.col("experiment") == input.problem())
+        return problem_summary(raw_data()["runs"], input.problem())
 
-    @reactive.calc
-    def data() -> DataTuple:
+    def read() -> dict:
+        return read_selection(input, raw_data())
+
+    # debounced (or manually applied) selection, so that a burst of input changes only
+    # triggers a single update of the plots
+    selection = applied_selection(input, read)
+
+    @scheduled_calc(
+        session.id,
+        "performance data",
+        selection_profile_context(input, selection, problem),
+    )
+    def data() -> Callable[[], DataTuple]:
         """Return data for the selected OMPL version, the selected planners, and selected experiment
         parameters (if present)"""
-        param_values = problem_parameter_values(raw_data()["parameters"], input)
-        grouping = problem_parameter_groups(param_values)
-        df = problem_parameter_filter(
-            exp_data().filter(
-                (pl.col("version") == input.version())
-                & (pl.col("planner").is_in(input.planners()))
-            ),
-            param_values,
-        )
-        if grouping:
-            # hacky way to create enum type from numerically sorted experiment parameters
-            grouping_enum = pl.Enum(
-                [str(v) for v in sorted(df[grouping].unique().to_list())]
-            )
-            df = df.with_columns(pl.col(grouping).cast(pl.String).cast(grouping_enum))
-        return DataTuple(df, grouping)
+        req(not raw_data()["runs"].is_empty())
+        raw, sel = raw_data(), selection()
+        return lambda: cached_selection(raw, sel, pl.col("version") == sel["version"])
+
+    profile_context = selection_profile_context(input, selection, problem, data)
 
     @output
     @render.ui
@@ -203,12 +295,15 @@ def performance_server(
     @render.ui
     def problem_parameter_ui() -> ui.Tag | None:
         req(not raw_data()["experiments"].is_empty())
+        experiments = raw_data()["experiments"].filter(
+            (pl.col("experiment") == input.problem())
+            & (pl.col("version") == input.version())
+        )
         return problem_parameter_widgets(
-            raw_data()["experiments"].filter(
-                (pl.col("experiment") == input.problem())
-                & (pl.col("version") == input.version())
-            ),
+            experiments["id"].to_list(),
             raw_data()["parameters"],
+            raw_data()["parameter_index"],
+            raw_data()["parameter_labels"],
         )
 
     @output
@@ -220,15 +315,74 @@ def performance_server(
     @output
     @render.ui
     def version_ui() -> ui.Tag | None:
-        return version_widget(exp_data()["version"].unique().to_list())
+        return version_widget(problem()["versions"])
 
     @output
     @render.ui
     def planner_ui() -> ui.Tag:
-        return planner_widget(exp_data()["planner"].unique().to_list())
+        return planner_widget(problem()["planners"])
 
     @reactive.calc
+    def sketched_summary() -> dict:
+        """Return the statistics that are plotted for a summarized database (see
+        `database.load_database`), estimated from the sketches of the selected runs"""
+        sketches, groups = raw_data()["sketches"], data().df
+        attr = input.attribute()
+        grouping = data().grouping
+        enums = raw_data()["enums"].filter(pl.col("name") == attr)
+        if len(enums) > 0:
+            by = key_columns("planner", grouping)
+            return {
+                "kind": "enums",
+                "stats": sketch_enum_counts(sketches, groups, enums, attr, by),
+                "grouping": grouping,
+            }
+        simplified_attr = "simplified " + attr
+        if input.show_simplified() and simplified_attr in raw_data()["attributes"]:
+            # same as `unpivot_simplified`
+            attrs, grouping = [attr, simplified_attr], "key"
+            by = ["planner"]
+        else:
+            attrs = [attr]
+            by = key_columns("planner", grouping)
+        if input.show_as_cdf():
+            stats = [
+                sketch_ecdf_knots(sketches, groups, a, by).rename({a: "value"})
+                for a in attrs
+            ]
+            kind = "ecdf"
+        else:
+            stats = [
+                sketch_box_stats(
+                    sketches, groups, a, by, outliers=not input.hide_outliers()
+                )
+                for a in attrs
+            ]
+            kind = "box"
+        if len(attrs) > 1:
+            stats = [
+                s.with_columns(pl.lit(a).alias("key")) for s, a in zip(stats, attrs)
+            ]
+        return {"kind": kind, "stats": pl.concat(stats), "grouping": grouping}
+
+    @reactive.calc
+    @profiled("performance plot", session.id, profile_context)
     def plot_object() -> p9.ggplot:
+        if raw_data()["sketches"] is not None:
+            summary = sketched_summary()
+            if summary["kind"] == "enums":
+                return enums_plot_from_counts(summary["stats"], summary["grouping"])
+            if summary["kind"] == "ecdf":
+                return ecdf_plot_from_knots(
+                    summary["stats"], "value", input.attribute(), summary["grouping"]
+                )
+            return boxplot_from_stats(
+                summary["stats"],
+                input.attribute(),
+                summary["grouping"],
+                input.y_log_scale(),
+            )
+
         attr = input.attribute()
         # use bar charts for enum types
         enums = raw_data()["enums"].filter(pl.col("name") == attr)
@@ -243,16 +397,7 @@ def performance_server(
         )
 
         if include_simplified_attr:
-            df = (
-                data()
-                .df.unpivot(
-                    index=["planner"],
-                    on=[attr, simplified_attr],
-                    variable_name="key",
-                    value_name="value",
-                )
-                .with_columns(pl.col("key").cast(pl.Categorical))
-            )
+            df = unpivot_simplified(data().df, attr, simplified_attr)
             if input.show_as_cdf():
                 return ecdf_plot_with_simplified(df, attr)
             return boxplot_with_simplified(df, attr, outlier_shape, input.y_log_scale())
@@ -264,15 +409,66 @@ def performance_server(
             return boxplot(df, attr, grouping, outlier_shape, input.y_log_scale())
 
     @output
-    @render.plot
+    @viewport_plot(name="performance render", context=profile_context)
     def plot():
         return plot_object()
 
+    @output
+    @render.ui
+    def plot_interactive() -> ui.TagList:
+        """Same plot as `plot_object`, but only the aggregated statistics are sent to the
+        browser, which draws the plot itself"""
+        attr = input.attribute()
+        if raw_data()["sketches"] is not None:
+            summary = sketched_summary()
+            grouping = summary["grouping"]
+            if summary["kind"] == "enums":
+                figure = enums_figure(summary["stats"], grouping)
+            elif summary["kind"] == "ecdf":
+                by = key_columns("planner", grouping)
+                figure = ecdf_figure(summary["stats"], "value", attr, by)
+            else:
+                figure = boxplot_figure(
+                    summary["stats"], attr, "planner", grouping, input.y_log_scale()
+                )
+            return output_interactive_plot(figure, session.ns("plot_chart"))
+
+        enums = raw_data()["enums"].filter(pl.col("name") == attr)
+        grouping = data().grouping
+        if len(enums) > 0:
+            counts = enum_counts(data().df, enums, key_columns("planner", grouping))
+            return output_interactive_plot(
+                enums_figure(counts, grouping), session.ns("plot_chart")
+            )
+
+        simplified_attr = "simplified " + attr
+        if input.show_simplified() and simplified_attr in raw_data()["attributes"]:
+            df = unpivot_simplified(data().df, attr, simplified_attr)
+            value, grouping = "value", "key"
+        else:
+            df, value = data().df, attr
+        if input.show_as_cdf():
+            by = key_columns("planner", grouping)
+            figure = ecdf_figure(ecdf_knots(df, value, by), value, attr, by)
+        else:
+            stats = box_stats(
+                df,
+                value,
+                key_columns("planner", grouping),
+                outliers=not input.hide_outliers(),
+            )
+            figure = boxplot_figure(
+                stats, attr, "planner", grouping, input.y_log_scale()
+            )
+        return output_interactive_plot(figure, session.ns("plot_chart"))
+
     @render.download(filename="performance_plot.pdf")
-    def download_pdf():
-        buffer = io.BytesIO()
-        plot_object().save(buffer, format="pdf")
-        yield buffer.getvalue()
+    async def download_pdf():
+        # the PDF is saved in a worker thread once a slot is free, so that the plots of other
+        # sessions are updated first
+        yield await export_pdf(
+            plot_object(), "performance PDF", session.id, profile_context
+        )
 
     @render.download(filename="performance_plot.pkl")
     def download_pkl():
@@ -289,6 +485,14 @@ def performance_server(
             grouping = ["planner", grouping]
         else:
             grouping = ["planner"]
+        if raw_data()["sketches"] is not None:
+            return sketch_stats(
+                raw_data()["sketches"], data().df, input.attribute(), grouping
+            ).select(
+                *grouping,
+                pl.col("nulls").alias("missing"),
+                (pl.col("count") + pl.col("nulls")).alias("total"),
+            )
         return (
             data()
             .df.with_columns(pl.col(input.attribute()).is_null().alias("missing"))
@@ -0,0 +1,252 @@
+import contextlib
+import datetime
+import functools
+import itertools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter, deque
+from collections.abc import Callable
+from shiny import reactive, ui
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+# computations that take longer than this many seconds are profiled (0 means never)
+PROFILE_THRESHOLD = float(os.getenv("PROFILE_THRESHOLD", "0"))
+# number of seconds between two samples of the call stack of a computation
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# number of profiles that are kept (the oldest are dropped first)
+MAX_PROFILES = int(os.getenv("MAX_PROFILES", "50"))
+# the profiles can only be viewed with this token (if not set, they cannot be viewed)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+class _Computation:
+    def __init__(self, name: str, key: str, context: Callable[[], dict], root):
+        self.name = name
+        self.key = key
+        self.context = context
+        # the frame of the tracked function, the callers are left out of the call stacks
+        self.root = root
+        self.start = time.perf_counter()
+        self.stacks: Counter[str] = Counter()
+
+
+def _collapse(frame, root) -> str:
+    """Return the call stack of a frame up to `root` in the "collapsed" format of flame graph
+    tools (outermost call first, separated by semicolons)"""
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        )
+        if frame is root:
+            break
+        frame = frame.f_back
+    return ";".join(reversed(calls))
+
+
+class SlowComputationProfiler:
+    """Sample the call stacks of tracked computations and keep the profiles of the ones that
+    take longer than `threshold` seconds.
+
+    A single background thread samples all threads that run a tracked computation, so that
+    computations do not need to be repeated to find out why they were slow. Nested
+    computations in the same thread are part of the outermost one."""
+
+    def __init__(self, threshold: float, interval: float, max_profiles: int):
+        self.threshold = threshold
+        self.interval = interval
+        self.profiles: deque[dict] = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._active: dict[int, _Computation] = {}
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _sample(self):
+        while True:
+            with self._condition:
+                while not self._active:
+                    self._condition.wait()
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for thread_id, computation in active:
+                if (frame := frames.get(thread_id)) is not None:
+                    computation.stacks[_collapse(frame, computation.root)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    @contextlib.contextmanager
+    def track(self, name: str, key: str, context: Callable[[], dict]):
+        """Profile the block if it takes too long. `context` is called afterwards to describe
+        the inputs of the computation"""
+        thread_id = threading.get_ident()
+        if not self.enabled or thread_id in self._active:
+            yield
+            return
+        # skip the frames of this generator and of the context manager
+        computation = _Computation(name, key, context, sys._getframe(2))
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, daemon=True)
+                self._thread.start()
+            self._active[thread_id] = computation
+            self._condition.notify()
+        try:
+            yield
+        finally:
+            with self._condition:
+                del self._active[thread_id]
+            computation.root = None
+            duration = time.perf_counter() - computation.start
+            if duration > self.threshold:
+                self._store(computation, duration)
+
+    def freeze(self, context: Callable[[], dict]) -> Callable[[], dict]:
+        """Describe the inputs of a computation now, for a computation that is tracked in a
+        worker thread (where reactive values cannot be read safely)"""
+        if not self.enabled:
+            return dict
+        try:
+            with reactive.isolate():
+                value = context()
+        except Exception as e:
+            value = {"error": repr(e)}
+        return lambda: value
+
+    def _store(self, computation: _Computation, duration: float):
+        try:
+            with reactive.isolate():
+                context = computation.context()
+        except Exception as e:
+            # e.g., an input that is not set yet
+            context = {"error": repr(e)}
+        self.profiles.appendleft(
+            {
+                "id": next(self._ids),
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "name": computation.name,
+                "session": computation.key,
+                "duration": duration,
+                "samples": computation.stacks.total(),
+                "context": context,
+                "stacks": dict(computation.stacks.most_common()),
+            }
+        )
+
+
+PROFILER = SlowComputationProfiler(PROFILE_THRESHOLD, PROFILE_INTERVAL, MAX_PROFILES)
+
+
+def profiled(name: str, key: str, context: Callable[[], dict]):
+    """Decorator that profiles a function with `PROFILER` (see
+    `SlowComputationProfiler.track`)"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with PROFILER.track(name, key, context):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _authorized(request: Request) -> bool:
+    token = request.query_params.get("token") or request.headers.get(
+        "authorization", ""
+    ).removeprefix("Bearer ")
+    return ADMIN_TOKEN is not None and secrets.compare_digest(
+        token.encode(), ADMIN_TOKEN.encode()
+    )
+
+
+def _profile_page(profiles: list[dict], token: str | None) -> str:
+    """Return the list of profiles. The links only pass on the token if the page was
+    requested with it as query parameter (a client that sent it as bearer token sends it
+    again)."""
+    query = "?" + urllib.parse.urlencode({"token": token}) if token else ""
+
+    def link(profile: dict, fmt: str) -> ui.Tag:
+        return ui.tags.a(fmt, href=f"profiles/{profile['id']}.{fmt}{query}")
+
+    rows = [
+        ui.tags.tr(
+            ui.tags.td(profile["time"]),
+            ui.tags.td(profile["name"]),
+            ui.tags.td(f"{profile['duration']:.2f} s"),
+            ui.tags.td(profile["samples"]),
+            ui.tags.td(ui.tags.code(json.dumps(profile["context"], default=str))),
+            ui.tags.td(link(profile, "json"), " ", link(profile, "txt")),
+        )
+        for profile in profiles
+    ]
+    header = ["time", "computation", "duration", "samples", "inputs", "profile"]
+    return str(
+        ui.tags.html(
+            ui.tags.head(ui.tags.title("Planner Arena: slow computations")),
+            ui.tags.body(
+                ui.tags.h1("Slow computations"),
+                ui.tags.p(
+                    f"Computations that took longer than {PROFILER.threshold} s. The "
+                    "profiles in the txt format can be opened with flame graph viewers "
+                    "such as speedscope."
+                ),
+                ui.tags.table(
+                    ui.tags.tr(*(ui.tags.th(name) for name in header)), *rows
+                ),
+            ),
+        )
+    )
+
+
+def admin_routes() -> list[Route]:
+    """Routes to view and download the profiles of slow computations. They require the
+    `ADMIN_TOKEN` as "token" query parameter or as bearer token."""
+
+    def restricted(fn):
+        async def endpoint(request: Request) -> Response:
+            if not _authorized(request):
+                return JSONResponse({"error": "not authorized"}, status_code=403)
+            return fn(request)
+
+        return endpoint
+
+    @restricted
+    def profiles(request: Request) -> Response:
+        return HTMLResponse(
+            _profile_page(list(PROFILER.profiles), request.query_params.get("token"))
+        )
+
+    @restricted
+    def profile(request: Request) -> Response:
+        id = request.path_params["id"]
+        selected = next((p for p in PROFILER.profiles if p["id"] == id), None)
+        if selected is None:
+            return JSONResponse({"error": "unknown profile"}, status_code=404)
+        fmt = request.path_params["format"]
+        if fmt not in ("json", "txt"):
+            return JSONResponse({"error": f"unknown format: {fmt}"}, status_code=404)
+        headers = {"Content-Disposition": f'attachment; filename="profile-{id}.{fmt}"'}
+        if fmt == "txt":
+            return PlainTextResponse(
+                "".join(f"{stack} {n}\n" for stack, n in selected["stacks"].items()),
+                headers=headers,
+            )
+        return JSONResponse(selected, headers=headers)
+
+    return [
+        Route("/profiles", profiles, methods=["GET"]),
+        Route("/profiles/{id:int}.{format:str}", profile, methods=["GET"]),
+    ]
@@ -1,24 +1,47 @@
 import io
 import pickle
+from collections.abc import Callable
 import polars as pl
 import plotnine as p9
 from shiny import Inputs, Outputs, Session, module, reactive, render, ui, req
 from plannerarena.widgets import (
     problem_widget,
-    problem_parameter_filter,
-    problem_parameter_values,
-    problem_parameter_groups,
     problem_parameter_widgets,
+    read_selection,
+    selection_profile_context,
+    cached_selection,
+    selection_key,
     attribute_widget,
     version_widget,
     planner_widget,
+    problem_summary,
     download_buttons,
+    interactive_widget,
+    apply_widget,
+    plot_output,
     DataTuple,
 )
+from plannerarena.reactivity import applied_selection, scheduled_calc
+from plannerarena.profiling import profiled
+from plannerarena.rendering import export_pdf, viewport_plot
+from plannerarena.interactive import (
+    bands_figure,
+    binned_counts,
+    binned_means,
+    key_columns,
+    lines_figure,
+    output_interactive_plot,
+)
+from plannerarena.cache import LRUCache
+from plannerarena.database import shared_cache_get
+
+# resampled progress data for recently used selections of the default database (shared by
+# all sessions)
+RESAMPLED_CACHE = LRUCache(maxsize=64)
 
 
 @module.ui
-def progress_ui() -> ui.Tag:
+def progress_ui(interactive: bool = False) -> ui.Tag:
     return ui.page_sidebar(
         ui.sidebar(
             ui.TagList(
@@ -33,16 +56,92 @@ def progress_ui() -> ui.Tag:
                             "show_measurements", "Show individual measurements"
                         ),
                         ui.input_slider("opacity", "Measurement opacity", 0, 100, 50),
+                        ui.input_checkbox(
+                            "show_quantiles",
+                            "Show median and interquartile range over runs",
+                        ),
+                        interactive_widget(interactive),
                     ),
                 ),
                 ui.output_ui("version_ui"),
                 ui.output_ui("planner_ui"),
+                apply_widget(),
             ),
             width="350px",
         ),
         download_buttons(),
-        ui.output_plot("plot"),
-        ui.output_plot("plot_num_measurements"),
+        plot_output("plot"),
+        plot_output("plot_num_measurements"),
+    )
+
+
+def smooth_plot(df: pl.DataFrame, attr: str, grouping: str) -> p9.ggplot:
+    """Create a plot of a smoothed curve of the progress attribute over time for each planner"""
+    plot = (
+        p9.ggplot(df, p9.aes(x="time", y=attr, color="planner", fill="planner"))
+        + p9.xlab("time (s)")
+        # TODO: make this work with statsmodels' GAM
+        + p9.geom_smooth(na_rm=True, method="loess", span=0.1, se=False)
+    )
+    if grouping:
+        return plot + p9.scale_linetype(name=grouping)
+    else:
+        return plot
+
+
+def num_measurements_plot(df: pl.DataFrame, attr: str, grouping: str) -> p9.ggplot:
+    """Create a plot of the number of measurements of the progress attribute over time"""
+    plot = (
+        p9.ggplot(df, p9.aes(x="time", color="planner"))
+        + p9.xlab("time (s)")
+        + p9.ylab(f"# measurements for {attr}")
+        + p9.geom_freqpoly(binwidth=1)
+    )
+    if grouping:
+        return plot + p9.scale_linetype(name=grouping)
+    else:
+        return plot
+
+
+def resample_progress(
+    df: pl.DataFrame, attr: str, by: list[str], num_points: int = 200
+) -> pl.DataFrame:
+    """Align every run onto a common time grid and summarize the runs per group.
+
+    The progress of each run is sampled at irregular times. For each grid point the last value
+    reported by a run at or before that time is used (i.e., the last value is carried forward).
+    Grid points before a run reported its first value are treated as missing. The result
+    contains the median and the interquartile range over all runs for each group and grid
+    point, as well as the number of runs that contributed to it."""
+    df = df.select("runid", *by, pl.col("time").cast(pl.Float64), attr).drop_nulls(attr)
+    if df.is_empty():
+        return pl.DataFrame()
+    grid = pl.DataFrame(
+        {"time": pl.linear_space(0.0, df["time"].max(), num_points, eager=True)}
+    )
+    aligned = (
+        df.select("runid", *by)
+        .unique()
+        .join(grid, how="cross")
+        .sort("time")
+        .join_asof(
+            df.select("runid", "time", attr).sort("time"),
+            on="time",
+            by="runid",
+            strategy="backward",
+            check_sortedness=False,
+        )
+    )
+    return (
+        aligned.group_by(*by, "time")
+        .agg(
+            pl.col(attr).median().alias("median"),
+            pl.col(attr).quantile(0.25, "linear").alias("lower"),
+            pl.col(attr).quantile(0.75, "linear").alias("upper"),
+            pl.col(attr).count().alias("runs"),
+        )
+        .filter(pl.col("runs") > 0)
+        .sort(*by, "time")
     )
 
 
@@ -51,35 +150,45 @@ def progress_server(
     input: Inputs, output: Outputs, session: Session, raw_data: reactive.Value
 ):
     @reactive.calc
-    def exp_data() -> pl.DataFrame:
+    def problem() -> dict:
+        """Return the choices of the widgets for the selected problem"""
         req(not raw_data()["runs"].is_empty())
-        return raw_data()["runs"].filter(pl.col("experiment") == input.problem())
+        return problem_summary(raw_data()["runs"], input.problem())
 
-    @reactive.calc
-    def data() -> DataTuple:
+    def read() -> dict:
+        return read_selection(input, raw_data())
+
+    selection = applied_selection(input, read)
+
+    @scheduled_calc(
+        session.id,
+        "progress data",
+        selection_profile_context(input, selection, problem),
+    )
+    def data() -> Callable[[], DataTuple]:
+        req(not raw_data()["runs"].is_empty())
         req(not raw_data()["progress"].is_empty())
-        param_values = problem_parameter_values(raw_data()["parameters"], input)
-        grouping = problem_parameter_groups(param_values)
-        df = problem_parameter_filter(
-            raw_data()["progress"].join(
-                exp_data()
-                .filter(
-                    (pl.col("version") == input.version())
-                    & (pl.col("planner").is_in(input.planners()))
-                )
-                .select(["id", "planner", grouping]),
-                left_on="runid",
-                right_on="id",
-            ),
-            param_values,
+        raw, sel = raw_data(), selection()
+        return lambda: cached_selection(
+            raw, sel, pl.col("version") == sel["version"], progress=True
+        )
+
+    profile_context = selection_profile_context(input, selection, problem, data)
+
+    @reactive.calc
+    def resampled_data() -> pl.DataFrame:
+        """Return the median and interquartile range over runs of the selected progress
+        attribute on a common time grid"""
+        req(not data().df.is_empty())
+        attr = input.attribute()
+        by = key_columns("planner", data().grouping)
+        key = (*selection_key(raw_data(), selection()), attr)
+        return shared_cache_get(
+            RESAMPLED_CACHE,
+            raw_data(),
+            key,
+            lambda: resample_progress(data().df, attr, by),
         )
-        if grouping:
-            # hacky way to create enum type from numerically sorted experiment parameters
-            grouping_enum = pl.Enum(
-                [str(v) for v in sorted(df[grouping].unique().to_list())]
-            )
-            df = df.with_columns(pl.col(grouping).cast(pl.String).cast(grouping_enum))
-        return DataTuple(df, grouping)
 
     @output
     @render.ui
@@ -91,12 +200,15 @@ def progress_server(
     @render.ui
     def problem_parameter_ui() -> ui.Tag | None:
         req(not raw_data()["experiments"].is_empty())
+        experiments = raw_data()["experiments"].filter(
+            (pl.col("experiment") == input.problem())
+            & (pl.col("version") == input.version())
+        )
         return problem_parameter_widgets(
-            raw_data()["experiments"].filter(
-                (pl.col("experiment") == input.problem())
-                & (pl.col("version") == input.version())
-            ),
+            experiments["id"].to_list(),
             raw_data()["parameters"],
+            raw_data()["parameter_index"],
+            raw_data()["parameter_labels"],
         )
 
     @output
@@ -110,64 +222,104 @@ def progress_server(
     @output
     @render.ui
     def version_ui() -> ui.Tag | None:
-        return version_widget(exp_data()["version"].unique().to_list())
+        return version_widget(problem()["versions"])
 
     @output
     @render.ui
     def planner_ui() -> ui.Tag:
-        return planner_widget(exp_data()["planner"].unique().to_list())
+        return planner_widget(problem()["planners"])
 
     @reactive.calc
+    @profiled("progress plot", session.id, profile_context)
     def plot_object() -> p9.ggplot:
         req(not data().df.is_empty())
+        if input.show_quantiles():
+            return quantiles_plot_object()
+        plot = smooth_plot(data().df, input.attribute(), data().grouping)
+        if input.show_measurements():
+            plot = plot + p9.geom_point(alpha=input.opacity() / 100)
+        return plot
+
+    def quantiles_plot_object() -> p9.ggplot:
+        df = resampled_data()
+        req(not df.is_empty())
+        grouping = data().grouping
         plot = (
-            p9.ggplot(
-                data().df,
-                p9.aes(
-                    x="time",
-                    y=input.attribute(),
-                    color="planner",
-                    fill="planner",
-                ),
-            )
+            p9.ggplot(df, p9.aes(x="time", color="planner", fill="planner"))
             + p9.xlab("time (s)")
-            # TODO: make this work with statsmodels' GAM
-            + p9.geom_smooth(na_rm=True, method="loess", span=0.1, se=False)
+            + p9.ylab(input.attribute())
+            + p9.geom_ribbon(
+                p9.aes(ymin="lower", ymax="upper"), alpha=0.2, color="none"
+            )
+            + p9.geom_line(p9.aes(y="median"))
         )
-        if data().grouping:
-            plot = plot + p9.scale_linetype(name=data().grouping)
+        if grouping:
+            plot = plot + p9.facet_grid(grouping)
         if input.show_measurements():
-            plot = plot + p9.geom_point(alpha=input.opacity() / 100)
+            plot = plot + p9.geom_point(
+                p9.aes(y=input.attribute()),
+                data=data().df,
+                alpha=input.opacity() / 100,
+            )
         return plot
 
     @reactive.calc
     def plot_num_measurements_object() -> p9.ggplot:
         req(not data().df.is_empty())
-        plot = (
-            p9.ggplot(data().df, p9.aes(x="time", color="planner"))
-            + p9.xlab("time (s)")
-            + p9.ylab(f"# measurements for {input.attribute()}")
-            + p9.geom_freqpoly(binwidth=1)
-        )
-        if data().grouping:
-            plot = plot + p9.scale_linetype(name=data().grouping)
-        return plot
+        return num_measurements_plot(data().df, input.attribute(), data().grouping)
 
     @output
-    @render.plot
+    @viewport_plot(name="progress render", context=profile_context)
     def plot():
         return plot_object()
 
     @output
-    @render.plot
+    @viewport_plot(name="progress render", context=profile_context)
     def plot_num_measurements():
         return plot_num_measurements_object()
 
+    @output
+    @render.ui
+    def plot_interactive() -> ui.TagList:
+        req(not data().df.is_empty())
+        attr = input.attribute()
+        by = key_columns("planner", data().grouping)
+        if input.show_quantiles():
+            figure = bands_figure(resampled_data(), by, "time (s)", attr)
+        else:
+            figure = lines_figure(
+                binned_means(data().df, attr, by), "bin", attr, by, "time (s)", attr
+            )
+        return output_interactive_plot(figure, session.ns("plot_chart"))
+
+    @output
+    @render.ui
+    def plot_num_measurements_interactive() -> ui.TagList:
+        req(not data().df.is_empty())
+        attr = input.attribute()
+        by = key_columns("planner", data().grouping)
+        return output_interactive_plot(
+            lines_figure(
+                binned_counts(data().df, attr, by, binwidth=1),
+                "bin",
+                "count",
+                by,
+                "time (s)",
+                f"# measurements for {attr}",
+            ),
+            session.ns("plot_num_measurements_chart"),
+        )
+
     @render.download(filename="progress_plot.pdf")
-    def download_pdf():
-        buffer = io.BytesIO()
-        (plot_object() / plot_num_measurements_object()).save(buffer, format="pdf")
-        yield buffer.getvalue()
+    async def download_pdf():
+        # the PDF is saved in a worker thread once a slot is free, so that the plots of other
+        # sessions are updated first
+        yield await export_pdf(
+            plot_object() / plot_num_measurements_object(),
+            "progress PDF",
+            session.id,
+            profile_context,
+        )
 
     @render.download(filename="progress_plot.pkl")
     def download_pkl():
@@ -0,0 +1,288 @@
+from collections.abc import Sequence
+from itertools import combinations
+import numpy as np
+import polars as pl
+from shiny import Inputs, Outputs, Session, module, reactive, render, ui, req
+from plannerarena.cache import LRUCache
+from plannerarena.database import shared_cache_get
+from plannerarena.scheduler import INTERACTIVE, SCHEDULER
+from plannerarena.stats import (
+    benjamini_hochberg,
+    higher_is_better,
+    pairwise_mann_whitney,
+)
+from plannerarena.widgets import attribute_widget, version_widget, version_choices
+
+RANKINGS_CACHE = LRUCache(maxsize=16)
+
+
+def planner_statistics(
+    runs: pl.DataFrame,
+    attribute: str,
+    higher_better: bool,
+    parameters: Sequence[str] = (),
+) -> pl.DataFrame:
+    """Compute summary statistics of an attribute for every planner in every experiment and
+    rank the planners within each experiment by their median.
+
+    Experiments with the same name but different values of the experiment `parameters` are
+    ranked separately."""
+    setting = ["experiment", *parameters]
+    return (
+        runs.group_by(*setting, "planner")
+        .agg(
+            pl.len().alias("runs"),
+            pl.col(attribute).null_count().alias("missing"),
+            pl.col(attribute).cast(pl.Float64).mean().alias("mean"),
+            pl.col(attribute).cast(pl.Float64).median().alias("median"),
+        )
+        .with_columns(
+            pl.col("median")
+            .rank("min", descending=higher_better)
+            .over(setting)
+            .alias("rank")
+        )
+        .sort(*setting, "rank")
+    )
+
+
+def _pairwise_tests(
+    setting: tuple, samples: dict[str, np.ndarray], higher_better: bool, alpha: float
+) -> list[tuple]:
+    """Mann-Whitney U tests for all pairs of planners in one experiment (with one setting of
+    the experiment parameters). The tests of an experiment are one family: a planner wins
+    or loses a comparison if its q-value (see `benjamini_hochberg`) is less than `alpha`.
+    """
+    planners = sorted(samples)
+    _, delta, p = pairwise_mann_whitney([samples[planner] for planner in planners])
+    pairs = list(combinations(range(len(planners)), 2))
+    q = benjamini_hochberg(np.array([p[i, j] for i, j in pairs]))
+    rows = []
+    for (i, j), q_ij in zip(pairs, q):
+        a, b = planners[i], planners[j]
+        if not (q_ij < alpha) or delta[i, j] == 0:
+            outcome_a, outcome_b = "tie", "tie"
+        elif (delta[i, j] > 0) == higher_better:
+            outcome_a, outcome_b = "win", "loss"
+        else:
+            outcome_a, outcome_b = "loss", "win"
+        rows.append((*setting, a, b, delta[i, j], p[i, j], q_ij, outcome_a))
+        rows.append((*setting, b, a, -delta[i, j], p[i, j], q_ij, outcome_b))
+    return rows
+
+
+def pairwise_tests(
+    runs: pl.DataFrame,
+    attribute: str,
+    higher_better: bool,
+    alpha: float = 0.05,
+    parameters: Sequence[str] = (),
+) -> pl.DataFrame:
+    """Test all pairs of planners in all experiments for a difference in the attribute.
+
+    Experiments with the same name but different values of the experiment `parameters` are
+    tested separately. Each pair appears twice, once from the point of view of each planner,
+    so that the results can be aggregated per planner.
+    """
+    setting = ["experiment", *parameters]
+    grouped = (
+        runs.select(*setting, pl.col("planner").cast(pl.String), attribute)
+        .drop_nulls(attribute)
+        .group_by(*setting, "planner")
+        .agg(pl.col(attribute).cast(pl.Float64))
+    )
+    samples: dict[tuple, dict[str, np.ndarray]] = {}
+    for *key, planner, values in grouped.iter_rows():
+        samples.setdefault(tuple(key), {})[planner] = np.asarray(values)
+    rows = [
+        row
+        for key, planner_samples in samples.items()
+        for row in _pairwise_tests(key, planner_samples, higher_better, alpha)
+    ]
+    return pl.DataFrame(
+        rows,
+        schema={
+            "experiment": pl.String,
+            **{param: runs.schema[param] for param in parameters},
+            "planner": pl.String,
+            "opponent": pl.String,
+            "effect size": pl.Float64,
+            "p-value": pl.Float64,
+            "q-value": pl.Float64,
+            "outcome": pl.String,
+        },
+        orient="row",
+    ).sort(*setting, "planner", "opponent")
+
+
+def compute_rankings(
+    runs: pl.DataFrame,
+    attribute: str,
+    version: str,
+    higher_better: bool | None = None,
+    alpha: float = 0.05,
+    parameters: Sequence[str] = (),
+) -> dict:
+    """Rank all planners across all experiments for one version. Experiments with the same
+    name but different values of the experiment `parameters` count as different experiments.
+
+    Returns a dictionary with per-experiment planner statistics ("statistics"), the results of
+    the pairwise significance tests ("pairs"), and a leaderboard that counts for each planner
+    the number of significantly better ("wins") and worse ("losses") comparisons over all
+    experiments, sorted by the difference ("score"), as "leaderboard". Within each
+    experiment, the false discovery rate of the wins and losses is `alpha`."""
+    if higher_better is None:
+        higher_better = higher_is_better(attribute)
+    runs = runs.filter(pl.col("version") == version)
+    statistics = planner_statistics(
+        runs, attribute, higher_better, parameters
+    ).with_columns(pl.col("planner").cast(pl.String))
+    pairs = pairwise_tests(runs, attribute, higher_better, alpha, parameters)
+    leaderboard = (
+        statistics.group_by("planner")
+        .agg(
+            pl.len().alias("experiments"),
+            pl.col("rank").mean().alias("mean rank"),
+            (pl.col("rank") == 1).sum().alias("first places"),
+        )
+        .join(
+            pairs.group_by("planner").agg(
+                (pl.col("outcome") == "win").sum().alias("wins"),
+                (pl.col("outcome") == "loss").sum().alias("losses"),
+                (pl.col("outcome") == "tie").sum().alias("ties"),
+            ),
+            on="planner",
+            how="left",
+        )
+        .with_columns(pl.col("wins", "losses", "ties").fill_null(0))
+        .with_columns((pl.col("wins").cast(pl.Int64) - pl.col("losses")).alias("score"))
+        .sort("score", "mean rank", descending=[True, False])
+        .select("planner", "score", pl.exclude("planner", "score"))
+    )
+    return {"statistics": statistics, "pairs": pairs, "leaderboard": leaderboard}
+
+
+def ranked_attributes(data: dict) -> list[str]:
+    """Return the attributes of a loaded database that planners can be ranked by (all but
+    the enum attributes)"""
+    enums = data["enums"]
+    enum_names = [] if enums.is_empty() else enums["name"].cast(pl.String).to_list()
+    return [a for a in data["attributes"] if a not in enum_names]
+
+
+def cached_rankings(
+    data: dict, attribute: str, version: str, higher_better: bool, alpha: float
+) -> dict:
+    """Return the rankings for a loaded database, reusing earlier results for the same
+    arguments and the default database"""
+    return shared_cache_get(
+        RANKINGS_CACHE,
+        data,
+        (data["fingerprint"], attribute, version, higher_better, alpha),
+        lambda: compute_rankings(
+            data["runs"],
+            attribute,
+            version,
+            higher_better,
+            alpha,
+            data["parameters"],
+        ),
+    )
+
+
+@module.ui
+def rankings_ui() -> ui.Tag:
+    return ui.page_sidebar(
+        ui.sidebar(
+            ui.TagList(
+                ui.output_ui("attribute_ui"),
+                ui.output_ui("version_ui"),
+                ui.output_ui("higher_is_better_ui"),
+                ui.input_numeric(
+                    "alpha", "False discovery rate", 0.05, min=0.001, max=0.5, step=0.01
+                ),
+            ),
+            width="350px",
+        ),
+        ui.navset_tab(
+            ui.nav_panel("Leaderboard", ui.output_data_frame("leaderboard")),
+            ui.nav_panel("Per experiment", ui.output_data_frame("statistics")),
+            ui.nav_panel("Pairwise tests", ui.output_data_frame("pairs")),
+        ),
+    )
+
+
+@module.server
+def rankings_server(
+    input: Inputs, output: Outputs, session: Session, raw_data: reactive.Value
+):
+    @output
+    @render.ui
+    def attribute_ui() -> ui.Tag:
+        req(raw_data()["attributes"])
+        return attribute_widget(ranked_attributes(raw_data()))
+
+    @output
+    @render.ui
+    def version_ui() -> ui.Tag | None:
+        req(not raw_data()["experiments"].is_empty())
+        return version_widget(version_choices(raw_data()["experiments"]))
+
+    @output
+    @render.ui
+    def higher_is_better_ui() -> ui.Tag:
+        return ui.input_checkbox(
+            "higher_is_better",
+            "Higher values are better",
+            value=higher_is_better(input.attribute()),
+        )
+
+    @reactive.extended_task
+    async def rankings_task(
+        data: dict, attribute: str, version: str, higher_better: bool, alpha: float
+    ) -> dict:
+        # the significance tests take a while for large databases, so they are computed in
+        # a worker thread instead of blocking all sessions
+        return await SCHEDULER.run_in_thread(
+            session.id,
+            INTERACTIVE,
+            cached_rankings,
+            data,
+            attribute,
+            version,
+            higher_better,
+            alpha,
+        )
+
+    @reactive.effect
+    def _():
+        req(not raw_data()["runs"].is_empty())
+        # the significance tests need the individual runs
+        req(raw_data()["sketches"] is None)
+        req(input.alpha())
+        rankings_task.invoke(
+            raw_data(),
+            input.attribute(),
+            input.version(),
+            input.higher_is_better(),
+            input.alpha(),
+        )
+
+    @reactive.calc
+    def rankings() -> dict:
+        return rankings_task.result()
+
+    @output
+    @render.data_frame
+    def leaderboard():
+        return rankings()["leaderboard"]
+
+    @output
+    @render.data_frame
+    def statistics():
+        return render.DataGrid(rankings()["statistics"], filters=True)
+
+    @output
+    @render.data_frame
+    def pairs():
+        return render.DataGrid(rankings()["pairs"], filters=True)
@@ -0,0 +1,141 @@
+import os
+import time
+from collections.abc import Callable
+from typing import TypeVar
+from shiny import Inputs, reactive
+from plannerarena.profiling import PROFILER
+from plannerarena.scheduler import INTERACTIVE, SCHEDULER
+
+T = TypeVar("T")
+
+# number of seconds inputs need to stay unchanged before plots are updated
+INPUT_DEBOUNCE_DELAY = float(os.getenv("INPUT_DEBOUNCE_DELAY", "0.5"))
+
+
+def debounce(delay: float) -> Callable[[Callable[[], T]], reactive.Calc_[T]]:
+    """Decorator that turns a function reading reactive inputs into a reactive calc that only
+    updates after its value has not been invalidated for `delay` seconds.
+
+    Dependents of the debounced calc are therefore only invalidated once for a burst of input
+    changes (e.g., clicking several checkboxes in a row), instead of once per change, and not
+    at all if the value is the same as before (e.g., when the session starts). Like the other
+    reactive objects, this must be called inside a session's server function."""
+
+    def decorator(fn: Callable[[], T]) -> reactive.Calc_[T]:
+        deadline: reactive.Value[float | None] = reactive.Value(None)
+        trigger = reactive.Value(0)
+        # the value last returned by `debounced`
+        sent: list[T] = []
+
+        @reactive.calc
+        def latest() -> T:
+            return fn()
+
+        # (re)start the timer whenever the inputs read by `fn` change
+        @reactive.effect(priority=2)
+        def _():
+            try:
+                latest()
+            except Exception:
+                # errors (including req() failures) are raised again by `debounced`
+                pass
+            deadline.set(time.monotonic() + delay)
+
+        # when the timer expires, invalidate the dependents of `debounced`
+        @reactive.effect(priority=1)
+        def _():
+            when = deadline()
+            if when is None:
+                return
+            remaining = when - time.monotonic()
+            if remaining > 0:
+                reactive.invalidate_later(remaining)
+                return
+            with reactive.isolate():
+                deadline.set(None)
+                if not _unchanged():
+                    trigger.set(trigger() + 1)
+
+        def _unchanged() -> bool:
+            try:
+                return bool(sent) and latest() == sent[0]
+            except Exception:
+                return False
+
+        @reactive.calc
+        def debounced() -> T:
+            trigger()
+            with reactive.isolate():
+                value = latest()
+            sent[:] = [value]
+            return value
+
+        return debounced
+
+    return decorator
+
+
+def applied_selection(
+    input: Inputs, fn: Callable[[], T], delay: float = INPUT_DEBOUNCE_DELAY
+) -> reactive.Calc_[T]:
+    """Return a reactive calc with the debounced value of `fn`.
+
+    If the user has checked the "apply_manually" checkbox (see `widgets.apply_widget`), the
+    value is only updated when the "apply" button is pressed."""
+    current = debounce(delay)(fn)
+
+    @reactive.calc
+    def selection() -> T:
+        if input.apply_manually():
+            input.apply()
+            with reactive.isolate():
+                return current()
+        return current()
+
+    return selection
+
+
+def scheduled_calc(
+    key: str,
+    name: str,
+    context: Callable[[], dict] = dict,
+    priority: int = INTERACTIVE,
+) -> Callable[[Callable[[], Callable[[], T]]], reactive.Calc_[T]]:
+    """Decorator that turns a function reading reactive values and returning a function that
+    does the heavy work into a reactive calc whose value is computed in a worker thread.
+
+    The work is queued with `SCHEDULER` under `key` and `priority` (so sessions get a fair
+    share of the slots) and profiled with `PROFILER` under `name`. While it runs, dependents
+    show that they are in progress, and when the reactive values change again, the
+    superseded computation is cancelled. Like the other reactive objects, this must be called
+    inside a session's server function."""
+
+    def decorator(fn: Callable[[], Callable[[], T]]) -> reactive.Calc_[T]:
+        @reactive.extended_task
+        async def task(work: Callable[[], T], frozen: Callable[[], dict]) -> T:
+            def run() -> T:
+                with PROFILER.track(name, key, frozen):
+                    return work()
+
+            return await SCHEDULER.run_in_thread(key, priority, run)
+
+        @reactive.calc
+        def latest() -> Callable[[], T]:
+            return fn()
+
+        # the work last passed to `task`
+        started: list[Callable[[], T]] = []
+
+        @reactive.calc
+        def value() -> T:
+            work = latest()
+            if not started or started[0] is not work:
+                started[:] = [work]
+                with reactive.isolate():
+                    task.cancel()
+                    task.invoke(work, PROFILER.freeze(context))
+            return task.result()
+
+        return value
+
+    return decorator
@@ -1,24 +1,229 @@
+import argparse
 import io
+import multiprocessing
+import os
 import pickle
+import sys
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
 import polars as pl
+import numpy as np
 import plotnine as p9
+import faicons as fa
 from shiny import Inputs, Outputs, Session, module, reactive, render, ui, req
 from plannerarena.widgets import (
     problem_widget,
-    problem_parameter_filter,
-    problem_parameter_values,
-    problem_parameter_groups,
     problem_parameter_widgets,
+    read_selection,
+    selection_profile_context,
+    cached_selection,
     attribute_widget,
     version_widget,
     planner_widget,
+    problem_summary,
     download_buttons,
+    interactive_widget,
+    apply_widget,
+    plot_output,
     DataTuple,
 )
+from plannerarena.reactivity import applied_selection, scheduled_calc
+from plannerarena.profiling import profiled
+from plannerarena.rendering import export_pdf, viewport_plot
+from plannerarena.scheduler import BACKGROUND, SCHEDULER
+from plannerarena.interactive import (
+    bars_figure,
+    key_columns,
+    mean_ci,
+    output_interactive_plot,
+)
+from plannerarena.cache import LRUCache
+from plannerarena.database import shared_cache_get
+from plannerarena.stats import (
+    batch_consecutive_version_tests,
+    benjamini_hochberg,
+    higher_is_better,
+)
+from plannerarena.sketch import sketch_mean_ci
+
+REGRESSIONS_CACHE = LRUCache(maxsize=8)
+
+# the experiment parameter columns (if any) are inserted after "experiment"
+REGRESSIONS_SCHEMA = {
+    "experiment": pl.String,
+    "planner": pl.String,
+    "attribute": pl.String,
+    "from version": pl.String,
+    "to version": pl.String,
+    "runs before": pl.Int64,
+    "runs after": pl.Int64,
+    "median before": pl.Float64,
+    "median after": pl.Float64,
+    "effect size": pl.Float64,
+    "p-value": pl.Float64,
+    "q-value": pl.Float64,
+    "regression": pl.Boolean,
+}
+
+
+def bar_plot(df: pl.DataFrame, attr: str, grouping: str) -> p9.ggplot:
+    """Create a bar plot with error bars of the mean of the attribute for each version and
+    planner"""
+    plot = (
+        p9.ggplot(df, p9.aes(x="version", y=attr, fill="planner", group="planner"))
+        + p9.stat_summary(geom="bar", position=p9.position_dodge(width=1))
+        + p9.stat_summary(geom="errorbar", position=p9.position_dodge(width=1))
+    )
+    if grouping:
+        return plot + p9.facet_grid(grouping)
+    else:
+        return plot
+
+
+def bar_plot_from_stats(stats: pl.DataFrame, attr: str, grouping: str) -> p9.ggplot:
+    """Same as `bar_plot`, but from statistics computed with `mean_ci`"""
+    dodge = p9.position_dodge(width=1)
+    plot = (
+        p9.ggplot(stats, p9.aes(x="version", fill="planner", group="planner"))
+        + p9.ylab(attr)
+        + p9.geom_col(p9.aes(y="mean"), position=dodge)
+        + p9.geom_errorbar(
+            p9.aes(ymin="mean - ci", ymax="mean + ci"), position=dodge, width=0.5
+        )
+    )
+    if grouping:
+        return plot + p9.facet_grid(grouping)
+    else:
+        return plot
+
+
+def detect_regressions(
+    data: dict,
+    attributes: list[str] | None = None,
+    alpha: float = 0.05,
+    max_workers: int | None = None,
+    min_effect_size: float = 0.0,
+) -> pl.DataFrame:
+    """Compare every planner on every experiment for every attribute between consecutive
+    versions of OMPL (in the order of the "version" enum, see `database._version_key`).
+
+    Each comparison is a Mann-Whitney U test of the runs of the newer version versus the runs of
+    the older version. Because a scan consists of thousands of tests, the p-values are adjusted
+    over all of them with the Benjamini-Hochberg procedure. A comparison is flagged as a
+    regression if the newer version is worse, its q-value is less than `alpha` (so that at most
+    a fraction `alpha` of the flagged comparisons is expected to be false alarms), and the
+    absolute effect size is at least `min_effect_size`. Experiments with the same name but different values of the experiment parameters are
+    compared separately, so that a different mix of parameter settings in two versions is not
+    mistaken for a change in performance. The comparisons are computed in worker processes, one
+    batch of experiments at a time. The result is sorted with the most likely regressions
+    first (by q-value)."""
+    runs = data["runs"]
+    parameters = [p for p in data["parameters"] if p in runs.columns]
+    setting = ["experiment", *parameters]
+    schema = {
+        "experiment": pl.String,
+        **{param: runs.schema[param] for param in parameters},
+    } | REGRESSIONS_SCHEMA
+    if runs.is_empty():
+        return pl.DataFrame(schema=schema)
+    enum_names = (
+        data["enums"]["name"].cast(pl.String).to_list()
+        if not data["enums"].is_empty()
+        else []
+    )
+    if attributes is None:
+        attributes = [a for a in data["attributes"] if a not in enum_names]
+    samples = (
+        runs.select(
+            *setting,
+            pl.col("planner").cast(pl.String),
+            "version",
+            pl.col(attributes).cast(pl.Float64),
+        )
+        .unpivot(
+            index=[*setting, "planner", "version"],
+            variable_name="attribute",
+            value_name="value",
+        )
+        .drop_nulls("value")
+        .group_by(*setting, "planner", "attribute", "version")
+        .agg("value")
+        .sort(*setting, "planner", "attribute", "version")
+        .group_by(*setting, "planner", "attribute", maintain_order=True)
+        .agg(pl.col("version").cast(pl.String), "value")
+        .filter(pl.col("version").list.len() > 1)
+    )
+    tasks = [
+        (
+            tuple(key),
+            higher_is_better(key[-1]),
+            [(v, np.asarray(x)) for v, x in zip(versions, values)],
+        )
+        for *key, versions, values in samples.iter_rows()
+    ]
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(tasks) < 100:
+        rows = batch_consecutive_version_tests(tasks)
+    else:
+        num_batches = 4 * max_workers
+        batches = [tasks[i::num_batches] for i in range(num_batches)]
+        # forking a process that uses polars' thread pool can deadlock, so spawn workers
+        with ProcessPoolExecutor(
+            max_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = executor.map(batch_consecutive_version_tests, batches)
+            rows = [row for batch in results for row in batch]
+    tests = pl.DataFrame(
+        rows,
+        schema={
+            name: dtype
+            for name, dtype in schema.items()
+            if name not in ("q-value", "regression")
+        }
+        | {"worse": pl.Boolean},
+        orient="row",
+    )
+    return (
+        tests.with_columns(
+            pl.Series("q-value", benjamini_hochberg(tests["p-value"].to_numpy()))
+        )
+        .with_columns(
+            (
+                pl.col("worse")
+                & (pl.col("q-value") < alpha)
+                & (pl.col("effect size").abs() >= min_effect_size)
+            ).alias("regression")
+        )
+        .select(*schema)
+        .sort(
+            "regression",
+            "q-value",
+            pl.col("effect size").abs(),
+            descending=[True, False, True],
+        )
+    )
+
+
+def flagged_regressions(regressions: pl.DataFrame) -> pl.DataFrame:
+    """Return the comparisons of `detect_regressions` that are flagged as regressions"""
+    return regressions.filter(pl.col("regression")).drop("regression")
+
+
+def cached_regressions(data: dict, alpha: float = 0.05) -> pl.DataFrame:
+    """Return `detect_regressions` for all attributes of a loaded database, reusing earlier
+    results for the default database"""
+    return shared_cache_get(
+        REGRESSIONS_CACHE,
+        data,
+        (data["fingerprint"], alpha),
+        lambda: detect_regressions(
+            data, alpha=alpha, max_workers=SCHEDULER.threads_per_job
+        ),
+    )
 
 
 @module.ui
-def regression_ui() -> ui.Tag:
+def regression_ui(interactive: bool = False) -> ui.Tag:
     return ui.page_sidebar(
         ui.sidebar(
             ui.TagList(
@@ -27,11 +232,33 @@ def regression_ui() -> ui.Tag:
                 ui.output_ui("attribute_ui"),
                 ui.output_ui("versions_ui"),
                 ui.output_ui("planner_ui"),
+                apply_widget(),
+                interactive_widget(interactive),
             ),
             width="350px",
         ),
         download_buttons(),
-        ui.output_plot("plot"),
+        plot_output("plot"),
+        ui.card(
+            ui.card_header("Regressions in all experiments"),
+            ui.p(
+                "Compare all planners on all experiments for all attributes between "
+                "consecutive versions and list the significant deteriorations, with a "
+                "false discovery rate of 5%."
+            ),
+            ui.div(
+                ui.input_task_button(
+                    "scan", "Scan for regressions", label_busy="Scanning..."
+                ),
+                ui.download_button(
+                    "download_regressions",
+                    "Download as CSV",
+                    icon=fa.icon_svg("download"),
+                    class_="btn-outline-primary",
+                ),
+            ),
+            ui.output_data_frame("regressions"),
+        ),
     )
 
 
@@ -40,22 +267,31 @@ def regression_server(
     input: Inputs, output: Outputs, session: Session, raw_data: reactive.Value
 ):
     @reactive.calc
-    def exp_data() -> pl.DataFrame:
+    def problem() -> dict:
+        """Return the choices of the widgets for the selected problem"""
+        req(not raw_data()["runs"].is_empty())
+        return problem_summary(raw_data()["runs"], input.problem())
+
+    def read() -> dict:
+        return read_selection(input, raw_data(), "versions")
+
+    selection = applied_selection(input, read)
+
+    @scheduled_calc(
+        session.id,
+        "regression data",
+        selection_profile_context(input, selection, problem),
+    )
+    def selected() -> Callable[[], DataTuple]:
         req(not raw_data()["runs"].is_empty())
-        return raw_data()["runs"].filter(pl.col("experiment") == input.problem())
+        raw, sel = raw_data(), selection()
+        return lambda: cached_selection(
+            raw, sel, pl.col("version").is_in(sel["versions"])
+        )
 
     @reactive.calc
     def data() -> DataTuple:
-        param_values = problem_parameter_values(raw_data()["parameters"], input)
-        grouping = problem_parameter_groups(param_values)
-        df = problem_parameter_filter(
-            exp_data().filter(
-                (pl.col("version").is_in(input.versions()))
-                & (pl.col("planner").is_in(input.planners()))
-            ),
-            param_values,
-        )
-        if df["version"].unique().count() <= 1:
+        if selected().df["version"].unique().count() <= 1:
             ui.notification_show(
                 "Need data for more than 1 version of OMPL", duration=5, type="warning"
             )
@@ -63,13 +299,9 @@ def regression_server(
                 pl.DataFrame({"version": [], "planner": [], input.attribute(): []}),
                 None,
             )
-        if grouping:
-            # hacky way to create enum type from numerically sorted experiment parameters
-            grouping_enum = pl.Enum(
-                [str(v) for v in sorted(df[grouping].unique().to_list())]
-            )
-            df = df.with_columns(pl.col(grouping).cast(pl.String).cast(grouping_enum))
-        return DataTuple(df, grouping)
+        return selected()
+
+    profile_context = selection_profile_context(input, selection, problem, data)
 
     @output
     @render.ui
@@ -81,12 +313,15 @@ def regression_server(
     @render.ui
     def problem_parameter_ui() -> ui.Tag | None:
         req(not raw_data()["experiments"].is_empty())
+        experiments = raw_data()["experiments"].filter(
+            (pl.col("experiment") == input.problem())
+            & (pl.col("version").is_in(input.versions()))
+        )
         return problem_parameter_widgets(
-            raw_data()["experiments"].filter(
-                (pl.col("experiment") == input.problem())
-                & (pl.col("version").is_in(input.versions()))
-            ),
+            experiments["id"].to_list(),
             raw_data()["parameters"],
+            raw_data()["parameter_index"],
+            raw_data()["parameter_labels"],
         )
 
     @output
@@ -98,43 +333,144 @@ def regression_server(
     @output
     @render.ui
     def versions_ui() -> ui.Tag | None:
-        return version_widget(exp_data()["version"].unique().to_list(), checkbox=True)
+        return version_widget(problem()["versions"], checkbox=True)
 
     @output
     @render.ui
     def planner_ui():
-        return planner_widget(exp_data()["planner"].unique().to_list())
+        return planner_widget(problem()["planners"])
 
     @reactive.calc
+    def sketched_stats() -> pl.DataFrame:
+        """Return the mean and confidence interval per version and planner for a summarized
+        database (see `database.load_database`)"""
+        return sketch_mean_ci(
+            raw_data()["sketches"],
+            data().df,
+            input.attribute(),
+            key_columns("version", "planner", data().grouping),
+        )
+
+    @reactive.calc
+    @profiled("regression plot", session.id, profile_context)
     def plot_object() -> p9.ggplot:
         req(not data().df.is_empty())
-        plot = (
-            p9.ggplot(
-                data().df,
-                p9.aes(
-                    x="version", y=input.attribute(), fill="planner", group="planner"
-                ),
+        if raw_data()["sketches"] is not None:
+            return bar_plot_from_stats(
+                sketched_stats(), input.attribute(), data().grouping
             )
-            + p9.stat_summary(geom="bar", position=p9.position_dodge(width=1))
-            + p9.stat_summary(geom="errorbar", position=p9.position_dodge(width=1))
-        )
-        if data().grouping:
-            plot = plot + p9.facet_grid(data().grouping)
-        return plot
+        return bar_plot(data().df, input.attribute(), data().grouping)
 
     @output
-    @render.plot
+    @viewport_plot(name="regression render", context=profile_context)
     def plot():
         return plot_object()
 
+    @output
+    @render.ui
+    def plot_interactive() -> ui.TagList:
+        req(not data().df.is_empty())
+        attr = input.attribute()
+        if raw_data()["sketches"] is not None:
+            stats = sketched_stats()
+        else:
+            stats = mean_ci(
+                data().df, attr, key_columns("version", "planner", data().grouping)
+            )
+        return output_interactive_plot(
+            bars_figure(stats, attr, data().grouping), session.ns("plot_chart")
+        )
+
     @render.download(filename="regression_plot.pdf")
-    def download_pdf():
-        buffer = io.BytesIO()
-        plot_object().save(buffer, format="pdf")
-        yield buffer.getvalue()
+    async def download_pdf():
+        # the PDF is saved in a worker thread once a slot is free, so that the plots of other
+        # sessions are updated first
+        yield await export_pdf(
+            plot_object(), "regression PDF", session.id, profile_context
+        )
 
     @render.download(filename="regression_plot.pkl")
     def download_pkl():
         buffer = io.BytesIO()
         pickle.dump(plot_object(), buffer)
         yield buffer.getvalue()
+
+    @reactive.extended_task
+    async def scan_task(data: dict) -> pl.DataFrame:
+        return await SCHEDULER.run_in_thread(
+            session.id, BACKGROUND, cached_regressions, data
+        )
+
+    @reactive.effect
+    @reactive.event(input.scan)
+    def _():
+        if raw_data()["sketches"] is not None:
+            ui.notification_show(
+                "The individual runs of summarized databases are not available for "
+                "scanning",
+                duration=5,
+                type="warning",
+            )
+            return
+        scan_task.invoke(raw_data())
+
+    @output
+    @render.data_frame
+    def regressions():
+        return render.DataGrid(flagged_regressions(scan_task.result()), filters=True)
+
+    @render.download(filename="regressions.csv")
+    def download_regressions():
+        buffer = io.BytesIO()
+        flagged_regressions(scan_task.result()).write_csv(buffer)
+        yield buffer.getvalue()
+
+
+def main():
+    """Scan a benchmark database for performance regressions without starting the web app"""
+    from plannerarena.database import load_database
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("database", help="Planner Arena benchmark database")
+    parser.add_argument(
+        "-o", "--output", help="write the results to a CSV or Parquet file"
+    )
+    parser.add_argument(
+        "-a", "--attribute", action="append", help="attribute(s) to compare"
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=0.05, help="false discovery rate"
+    )
+    parser.add_argument(
+        "--min-effect-size",
+        type=float,
+        default=0.0,
+        help="minimum absolute Cliff's delta of a regression",
+    )
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes")
+    parser.add_argument(
+        "--all", action="store_true", help="include comparisons without a regression"
+    )
+    args = parser.parse_args()
+
+    result = detect_regressions(
+        load_database(args.database),
+        args.attribute,
+        args.alpha,
+        args.jobs,
+        args.min_effect_size,
+    )
+    if not args.all:
+        result = flagged_regressions(result)
+    if args.output is None:
+        with pl.Config(tbl_rows=-1, tbl_cols=-1):
+            print(result)
+    elif args.output.endswith(".parquet"):
+        result.write_parquet(args.output)
+    else:
+        result.write_csv(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import asyncio
+import base64
+import copy
+import io
+import os
+import threading
+import warnings
+from collections.abc import Callable, Hashable
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import plotnine as p9
+from plotnine.composition import Compose
+from plotnine.exceptions import PlotnineWarning
+from shiny import req, ui
+from shiny.render.renderer import Jsonifiable, Renderer
+from shiny.session import require_active_session
+from shiny.types import ImgData
+from plannerarena.profiling import PROFILER
+from plannerarena.scheduler import DOWNLOAD, INTERACTIVE, SCHEDULER
+
+# point and line layers that draw more points (or line vertices) than this are rasterized in
+# exported PDFs (0 means never). Below about 10000 points, the bitmap of a layer is not
+# smaller than its vector graphics
+DENSE_LAYER_ROWS = int(os.getenv("DENSE_LAYER_ROWS", "10000"))
+# resolution in dots per inch of the rasterized layers in exported PDFs
+PDF_RASTER_DPI = int(os.getenv("PDF_RASTER_DPI", "200"))
+# plots are not rendered at a higher resolution than this many pixels per CSS pixel, even on
+# displays with a higher pixel density
+MAX_PIXEL_RATIO = 2
+
+# plotnine and matplotlib's pyplot keep global state (e.g., the rcParams that plotnine sets
+# while drawing), so only one plot is drawn at a time. Plots are drawn in worker threads that
+# hold a slot of the scheduler and this lock, so that the event loop is not blocked
+RENDER_LOCK = threading.Lock()
+
+# CSS pixels per inch, which is also what `render.plot` uses to size its plots
+CSS_PPI = 96
+
+# geoms that draw a point or line vertex per row of their (computed) data
+_DENSE_GEOMS = (p9.geom_point, p9.geom_path)
+
+
+def rasterize_dense_layers(plot: p9.ggplot | Compose):
+    """Mark the point and line layers of a plot (or of all the plots of a composition) that
+    draw more than `DENSE_LAYER_ROWS` points or line vertices to be drawn as a bitmap when the
+    plot is saved in a vector format. The axes, labels, and other layers remain vector
+    graphics."""
+    if isinstance(plot, Compose):
+        for item in plot:
+            rasterize_dense_layers(item)
+        return
+    if DENSE_LAYER_ROWS <= 0:
+        return
+    # the layers are drawn from the data computed by their stats (e.g., an ECDF), which is
+    # only known once the plot is built
+    built = copy.deepcopy(plot)
+    with warnings.catch_warnings():
+        # the same warnings (e.g., about missing values) are issued when the plot is saved
+        warnings.simplefilter("ignore", PlotnineWarning)
+        built._build()
+    for layer, built_layer in zip(plot.layers, built.layers):
+        if (
+            isinstance(layer.geom, _DENSE_GEOMS)
+            and len(built_layer.data) > DENSE_LAYER_ROWS
+        ):
+            layer.raster = True
+
+
+def save_pdf(plot: p9.ggplot | Compose) -> bytes:
+    """Return a plot as PDF with its dense layers rasterized"""
+    # the plot data is not copied
+    plot = copy.deepcopy(plot)
+    buffer = io.BytesIO()
+    with RENDER_LOCK:
+        rasterize_dense_layers(plot)
+        plot.save(buffer, format="pdf", dpi=PDF_RASTER_DPI, verbose=False)
+    return buffer.getvalue()
+
+
+async def export_pdf(
+    plot: p9.ggplot | Compose, name: str, key: Hashable, context: Callable[[], dict]
+) -> bytes:
+    """Wait for a slot (with download priority) and save a plot as PDF in a worker thread.
+    Saving is profiled as `name` (see `profiling.SlowComputationProfiler.track`)."""
+    context = PROFILER.freeze(context)
+
+    def export() -> bytes:
+        with PROFILER.track(name, key, context):
+            return save_pdf(plot)
+
+    return await SCHEDULER.run_in_thread(key, DOWNLOAD, export)
+
+
+class viewport_plot(Renderer[p9.ggplot]):
+    """Render a plotnine plot as an image with the size and pixel density of its output in the
+    browser (like `render.plot`).
+
+    The plot is drawn once. When only the size of the output changes (e.g., when the browser
+    window is resized), the drawn figure is laid out again and saved at the new size instead
+    of building the whole plot again. Rendering waits for a slot of the scheduler (with
+    interactive priority) and is profiled as `name` (see
+    `profiling.SlowComputationProfiler.track`). A render that is superseded by a newer value
+    (or by the end of the session) before it is done is cancelled."""
+
+    def auto_output_ui(self) -> ui.Tag:
+        return ui.output_plot(self.output_id)
+
+    def __init__(
+        self,
+        _fn=None,
+        *,
+        name: str = "plot",
+        context: Callable[[], dict] = dict,
+    ):
+        super().__init__(_fn)
+        self.name = name
+        self.context = context
+        self._plot: p9.ggplot | None = None
+        self._figure: Figure | None = None
+        self._session = None
+        # the render that is waiting for a slot or running
+        self._pending: asyncio.Future | None = None
+
+    def _render(
+        self, plot: p9.ggplot, width: float, height: float, dpi: float, context
+    ) -> bytes:
+        # runs in a worker thread
+        with RENDER_LOCK, PROFILER.track(self.name, self._session.id, context):
+            if plot is not self._plot:
+                self._close()
+                self._figure = plot.draw()
+                self._plot = plot
+            self._figure.set_size_inches(width / CSS_PPI, height / CSS_PPI)
+            buffer = io.BytesIO()
+            self._figure.savefig(buffer, format="png", dpi=dpi)
+        return buffer.getvalue()
+
+    def _close(self):
+        # must be called with the render lock held
+        if self._figure is not None:
+            plt.close(self._figure)
+        self._plot = self._figure = None
+
+    async def close(self):
+        """Cancel the pending render and release the drawn figure"""
+        self._cancel()
+
+        def close():
+            with RENDER_LOCK:
+                self._close()
+
+        await asyncio.to_thread(close)
+
+    def _cancel(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    async def transform(self, value: p9.ggplot) -> Jsonifiable:
+        session = require_active_session(None)
+        width = session.clientdata.output_width()
+        height = session.clientdata.output_height()
+        req(width, height)
+        pixelratio = min(session.clientdata.pixelratio() or 1, MAX_PIXEL_RATIO)
+        if self._session is not session:
+            self._session = session
+            session.on_ended(self.close)
+        # a render that is still queued leaves the queue (and one that is running is not
+        # shown)
+        self._cancel()
+        pending = asyncio.ensure_future(
+            SCHEDULER.run_in_thread(
+                session.id,
+                INTERACTIVE,
+                self._render,
+                value,
+                width,
+                height,
+                CSS_PPI * pixelratio,
+                PROFILER.freeze(self.context),
+            )
+        )
+        self._pending = pending
+        try:
+            png = await pending
+        except asyncio.CancelledError:
+            if pending is self._pending:
+                # this render itself was cancelled
+                raise
+            # superseded: keep showing the current image until the newer render is done
+            req(False, cancel_output=True)
+        finally:
+            if pending is self._pending:
+                self._pending = None
+        src = base64.b64encode(png).decode("utf-8")
+        image: ImgData = {
+            "src": f"data:image/png;base64,{src}",
+            "width": "100%",
+            "height": "100%",
+        }
+        return image
@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Callable, Hashable
+from typing import TypeVar
+
+T = TypeVar("T")
+
+# priorities of the heavy computations, from highest to lowest
+INTERACTIVE = 0  # data selection and plots that a user is waiting for
+DOWNLOAD = 1  # exported plots
+BACKGROUND = 2  # data API requests, regression scans, warming up
+PRIORITY_NAMES = ["interactive", "download", "background"]
+
+# maximum number of heavy computations that run at the same time
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+# total number of threads used by the heavy computations
+THREAD_BUDGET = int(os.getenv("THREAD_BUDGET", str(os.cpu_count() or 1)))
+if "THREAD_BUDGET" in os.environ:
+    # the size of polars' thread pool is fixed when polars is imported, so this module needs
+    # to be imported first
+    os.environ.setdefault("POLARS_MAX_THREADS", str(THREAD_BUDGET))
+
+# whether the current thread or task already holds a slot (nested jobs share the slot)
+_holding: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "holding", default=False
+)
+
+
+class _Waiter:
+    def __init__(self, notify: Callable[[], None]):
+        self.notify = notify
+        self.admitted = False
+
+
+class ComputeScheduler:
+    """Process-wide admission control for heavy computations.
+
+    At most `max_jobs` computations hold a slot at the same time. Waiting computations are
+    admitted in order of priority and, within a priority, round-robin over their keys (the
+    session or client that asked for them), so that one session cannot starve the others.
+    Computations that need more threads themselves should use `threads_per_job` threads.
+
+    Computations on the thread of the event loop are never delayed, because waiting there
+    would block all sessions. They still hold a slot, so that other computations wait for
+    them. Heavy computations of sessions (e.g., selecting data and rendering plots) should
+    therefore run in a worker thread with `run_in_thread`, where they are queued like all
+    others."""
+
+    def __init__(self, max_jobs: int, threads: int):
+        self.max_jobs = max(1, max_jobs)
+        self.threads = max(1, threads)
+        self.threads_per_job = max(1, self.threads // self.max_jobs)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._admitted = 0
+        self._queues: list[OrderedDict[Hashable, deque[_Waiter]]] = [
+            OrderedDict() for _ in PRIORITY_NAMES
+        ]
+
+    def _enqueue(self, key: Hashable, priority: int, waiter: _Waiter):
+        # must be called with the lock held
+        if self._running < self.max_jobs and not any(self._queues):
+            self._running += 1
+            self._admitted += 1
+            waiter.admitted = True
+        else:
+            self._queues[priority].setdefault(key, deque()).append(waiter)
+
+    def _dequeue(self, waiter: _Waiter) -> bool:
+        # must be called with the lock held, returns whether the waiter was still queued
+        for queue in self._queues:
+            for key, waiters in queue.items():
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del queue[key]
+                    return True
+        return False
+
+    def _release(self):
+        admitted = []
+        with self._lock:
+            self._running -= 1
+            while self._running < self.max_jobs:
+                queue = next((queue for queue in self._queues if queue), None)
+                if queue is None:
+                    break
+                key, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                # the next waiter of this key has to wait for the other keys' turn
+                if waiters:
+                    queue.move_to_end(key)
+                else:
+                    del queue[key]
+                waiter.admitted = True
+                self._running += 1
+                self._admitted += 1
+                admitted.append(waiter)
+        for waiter in admitted:
+            waiter.notify()
+
+    @contextlib.contextmanager
+    def slot(self, key: Hashable, priority: int = INTERACTIVE):
+        """Wait for a slot (blocking the current thread) and hold it while the block runs"""
+        if _holding.get():
+            yield
+            return
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        with self._lock:
+            if _in_event_loop():
+                self._running += 1
+                self._admitted += 1
+                waiter.admitted = True
+            else:
+                self._enqueue(key, priority, waiter)
+        if not waiter.admitted:
+            event.wait()
+        token = _holding.set(True)
+        try:
+            yield
+        finally:
+            _holding.reset(token)
+            self._release()
+
+    async def _admit(self, key: Hashable, priority: int):
+        # wait for a slot without blocking the event loop
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(notify)
+        with self._lock:
+            self._enqueue(key, priority, waiter)
+        if not waiter.admitted:
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    queued = self._dequeue(waiter)
+                if not queued:
+                    # admitted in the meantime
+                    self._release()
+                raise
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, key: Hashable, priority: int = INTERACTIVE):
+        """Wait for a slot (without blocking the event loop) and hold it while the block runs"""
+        if _holding.get():
+            yield
+            return
+        await self._admit(key, priority)
+        token = _holding.set(True)
+        try:
+            yield
+        finally:
+            _holding.reset(token)
+            self._release()
+
+    async def run_in_thread(
+        self, key: Hashable, priority: int, fn: Callable[..., T], *args
+    ) -> T:
+        """Wait for a slot and run `fn(*args)` in a worker thread.
+
+        If the caller is cancelled while it waits, it leaves the queue. If it is cancelled
+        while the thread runs, the thread (which cannot be interrupted) keeps the slot until
+        it is done and its result is dropped."""
+        if _holding.get():
+            return await asyncio.to_thread(fn, *args)
+        await self._admit(key, priority)
+        # the worker thread runs in a copy of the current context, so it holds the slot
+        token = _holding.set(True)
+        try:
+            thread = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        finally:
+            _holding.reset(token)
+
+        def done(thread: asyncio.Future):
+            self._release()
+            if not thread.cancelled():
+                # retrieve the exception of a dropped result
+                thread.exception()
+
+        thread.add_done_callback(done)
+        return await asyncio.shield(thread)
+
+    def status(self) -> dict:
+        """Return the number of running computations and of waiting computations per priority"""
+        with self._lock:
+            return {
+                "max jobs": self.max_jobs,
+                "threads": self.threads,
+                "running": self._running,
+                "admitted": self._admitted,
+                "queued": {
+                    name: sum(len(waiters) for waiters in queue.values())
+                    for name, queue in zip(PRIORITY_NAMES, self._queues)
+                },
+                "queued keys": len(set().union(*self._queues)),
+            }
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+SCHEDULER = ComputeScheduler(MAX_CONCURRENT_JOBS, THREAD_BUDGET)
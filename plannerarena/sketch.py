@@ -0,0 +1,399 @@
+import argparse
+import math
+import sqlite3
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+import polars as pl
+import pyarrow.parquet as pq
+from plannerarena.interactive import _str_cols
+
+# maximum relative error of the quantiles computed from the sketches
+RELATIVE_ACCURACY = 0.01
+# number of runs that are read from the database at a time
+CHUNK_SIZE = 100_000
+# runs with the same experiment (i.e., problem, version, and parameter values) and planner
+# are summarized in one sketch per attribute
+SKETCH_KEYS = ["experimentid", "plannerid", "attribute"]
+
+
+def runs_sidecar_path(dbname: str | Path) -> Path:
+    """Return the path of the Parquet copy of the runs table of a database"""
+    return Path(dbname).with_suffix(".runs.parquet")
+
+
+def _rename(df: pl.DataFrame) -> pl.DataFrame:
+    # same column names as `database.get_table`
+    return df.rename({name: name.replace("_", " ") for name in df.columns})
+
+
+def iter_runs(
+    dbname: str | Path, chunk_size: int = CHUNK_SIZE
+) -> Iterator[pl.DataFrame]:
+    """Read the runs table of a database in chunks.
+
+    If there is an up-to-date Parquet sidecar file (see `write_runs_sidecar`), the runs are
+    read from it, which is much faster than reading them from SQLite."""
+    sidecar = runs_sidecar_path(dbname)
+    if sidecar.exists() and sidecar.stat().st_mtime >= Path(dbname).stat().st_mtime:
+        for batch in pq.ParquetFile(sidecar).iter_batches(batch_size=chunk_size):
+            yield _rename(pl.from_arrow(batch))
+        return
+    conn = sqlite3.connect(dbname)
+    try:
+        for batch in pl.read_database(
+            "SELECT * FROM runs", conn, iter_batches=True, batch_size=chunk_size
+        ):
+            yield _rename(batch)
+    finally:
+        conn.close()
+
+
+def write_runs_sidecar(dbname: str | Path, chunk_size: int = CHUNK_SIZE) -> Path:
+    """Copy the runs table of a database to a Parquet file next to it, one chunk at a time"""
+    sidecar = runs_sidecar_path(dbname)
+    conn = sqlite3.connect(dbname)
+    writer = None
+    try:
+        for batch in pl.read_database(
+            "SELECT * FROM runs", conn, iter_batches=True, batch_size=chunk_size
+        ):
+            table = batch.to_arrow()
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(sidecar, schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        conn.close()
+        if writer is not None:
+            writer.close()
+    return sidecar
+
+
+def _log_gamma(accuracy: float) -> float:
+    return math.log((1 + accuracy) / (1 - accuracy))
+
+
+def _combine_stats(stats: pl.DataFrame, keys: list[str]) -> pl.DataFrame:
+    """Combine the exact statistics of several sketches per key.
+
+    The sums of squared deviations ("m2") are combined with the parallel algorithm of Chan et
+    al., which, unlike a sum of squares, does not lose precision for large counts. Keys
+    without any values (e.g., in a chunk where all of them are missing) have no mean."""
+    mean = pl.col("mean").fill_nan(None)
+    count = pl.col("count").sum().over(keys)
+    weighted = (mean.fill_null(0.0) * pl.col("count")).sum().over(keys)
+    return (
+        stats.with_columns(
+            pl.when(count > 0).then(weighted / count).alias("combined mean")
+        )
+        .group_by(keys)
+        .agg(
+            pl.col("count").sum(),
+            pl.col("nulls").sum(),
+            pl.col("combined mean").first().alias("mean"),
+            (
+                pl.col("m2").fill_nan(None).fill_null(0.0)
+                + pl.col("count") * (mean - pl.col("combined mean")).fill_null(0.0) ** 2
+            )
+            .sum()
+            .alias("m2"),
+            pl.col("min").min(),
+            pl.col("max").max(),
+        )
+    )
+
+
+def _combine_buckets(buckets: pl.DataFrame, keys: list[str]) -> pl.DataFrame:
+    return buckets.group_by(*keys, "sign", "bucket").agg(pl.col("count").sum())
+
+
+def sketch_runs(
+    runs: pl.DataFrame, attributes: list[str], accuracy: float = RELATIVE_ACCURACY
+) -> dict:
+    """Summarize each attribute of each experiment and planner in a chunk of runs.
+
+    The summary consists of the exact number of values, missing values, mean, sum of squared
+    deviations from the mean, minimum, and maximum ("stats"), and a DDSketch ("buckets"):
+    the number of values per logarithmically sized bucket, from which any quantile can be
+    estimated with a relative error of at most `accuracy`. Both can be merged with the
+    summaries of other chunks (see `merge_sketches`)."""
+    values = runs.select(
+        "experimentid",
+        "plannerid",
+        pl.col(attributes).cast(pl.Float64, strict=False).fill_nan(None),
+    ).unpivot(
+        index=["experimentid", "plannerid"],
+        variable_name="attribute",
+        value_name="value",
+    )
+    stats = values.group_by(SKETCH_KEYS).agg(
+        pl.col("value").count().alias("count"),
+        pl.col("value").null_count().alias("nulls"),
+        pl.col("value").mean().alias("mean"),
+        ((pl.col("value") - pl.col("value").mean()) ** 2).sum().alias("m2"),
+        pl.col("value").min().alias("min"),
+        pl.col("value").max().alias("max"),
+    )
+    buckets = (
+        values.drop_nulls("value")
+        .with_columns(
+            pl.col("value").sign().cast(pl.Int8).alias("sign"),
+            pl.when(pl.col("value") != 0)
+            .then((pl.col("value").abs().log() / _log_gamma(accuracy)).ceil())
+            .otherwise(0)
+            .cast(pl.Int32)
+            .alias("bucket"),
+        )
+        .group_by(*SKETCH_KEYS, "sign", "bucket")
+        .agg(pl.len().cast(pl.Int64).alias("count"))
+    )
+    return {
+        "stats": stats.with_columns(pl.col("count", "nulls").cast(pl.Int64)),
+        "buckets": buckets,
+        "accuracy": accuracy,
+    }
+
+
+def merge_sketches(a: dict, b: dict) -> dict:
+    """Merge the summaries of two sets of runs with the same relative accuracy"""
+    assert a["accuracy"] == b["accuracy"]
+    return {
+        "stats": _combine_stats(pl.concat([a["stats"], b["stats"]]), SKETCH_KEYS),
+        "buckets": _combine_buckets(
+            pl.concat([a["buckets"], b["buckets"]]), SKETCH_KEYS
+        ),
+        "accuracy": a["accuracy"],
+    }
+
+
+def build_sketches(
+    dbname: str | Path,
+    attributes: list[str],
+    accuracy: float = RELATIVE_ACCURACY,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    """Summarize all runs of a database with `sketch_runs`, one chunk at a time.
+
+    The memory use is bounded by the chunk size and the number of experiments, planners,
+    attributes, and buckets, independent of the number of runs."""
+    sketches = None
+    for chunk in iter_runs(dbname, chunk_size):
+        sketch = sketch_runs(chunk, attributes, accuracy)
+        sketches = sketch if sketches is None else merge_sketches(sketches, sketch)
+    if sketches is None:
+        sketches = sketch_runs(
+            pl.DataFrame(
+                schema={"experimentid": pl.Int64, "plannerid": pl.Int64}
+                | {a: pl.Float64 for a in attributes}
+            ),
+            attributes,
+            accuracy,
+        )
+    return sketches
+
+
+def _select(
+    sketches: dict, table: str, groups: pl.DataFrame, attr: str, by: list[str]
+) -> pl.DataFrame:
+    """Return the rows of a sketch table for an attribute and the selected groups, i.e., the
+    rows of the "runs" table of a summarized database, with the columns in `by` added"""
+    return (
+        sketches[table]
+        .filter(pl.col("attribute") == attr)
+        .join(
+            groups.select("experimentid", "plannerid", *by),
+            on=["experimentid", "plannerid"],
+        )
+    )
+
+
+def sketch_histograms(
+    sketches: dict, groups: pl.DataFrame, attr: str, by: list[str]
+) -> pl.DataFrame:
+    """Merge the buckets of the selected groups per `by` and estimate the value of each bucket.
+
+    Returns the estimated value, the number of values in the bucket, and the cumulative and
+    total number of values per `by`, sorted by value."""
+    gamma = math.exp(_log_gamma(sketches["accuracy"]))
+    return (
+        _combine_buckets(_select(sketches, "buckets", groups, attr, by), by)
+        .with_columns(
+            (
+                pl.col("sign")
+                * 2.0
+                * gamma ** pl.col("bucket").cast(pl.Float64)
+                / (gamma + 1.0)
+            ).alias("value")
+        )
+        .sort(*by, "value")
+        .with_columns(
+            pl.col("count").cum_sum().over(by).alias("cumulative"),
+            pl.col("count").sum().over(by).alias("n"),
+        )
+    )
+
+
+def sketch_stats(
+    sketches: dict, groups: pl.DataFrame, attr: str, by: list[str]
+) -> pl.DataFrame:
+    """Return the exact count, number of missing values, mean, standard deviation, minimum,
+    and maximum of the attribute per `by` for the selected groups"""
+    return (
+        _combine_stats(_select(sketches, "stats", groups, attr, by), by)
+        .with_columns(
+            (pl.col("m2") / (pl.col("count") - 1)).sqrt().alias("std"),
+        )
+        .drop("m2")
+        .sort(by)
+    )
+
+
+def _quantile(q: float) -> pl.Expr:
+    """Linearly interpolate between the estimated values of the two ranks around q * (n - 1),
+    like the "linear" method of `polars.Expr.quantile`, so that the relative error is at most
+    the accuracy of the sketch"""
+    rank = q * (pl.col("n") - 1)
+    lower = pl.col("value").filter(pl.col("cumulative") > rank.floor()).first()
+    upper = pl.col("value").filter(pl.col("cumulative") > rank.ceil()).first()
+    return lower + (upper - lower) * (rank - rank.floor()).first()
+
+
+def sketch_quantiles(
+    sketches: dict,
+    groups: pl.DataFrame,
+    attr: str,
+    by: list[str],
+    quantiles: dict[str, float],
+) -> pl.DataFrame:
+    """Estimate quantiles of the attribute per `by` for the selected groups, e.g., with
+    `quantiles={"median": 0.5}`. The estimates are clamped to the exact minimum and maximum.
+    """
+    stats = sketch_stats(sketches, groups, attr, by).select(*by, "min", "max")
+    return (
+        sketch_histograms(sketches, groups, attr, by)
+        .group_by(by)
+        .agg(_quantile(q).alias(name) for name, q in quantiles.items())
+        .join(stats, on=by)
+        .with_columns(pl.col(quantiles).clip(pl.col("min"), pl.col("max")))
+        .drop("min", "max")
+        .sort(by)
+    )
+
+
+def sketch_box_stats(
+    sketches: dict,
+    groups: pl.DataFrame,
+    attr: str,
+    by: list[str],
+    outliers: bool = True,
+) -> pl.DataFrame:
+    """Same as `interactive.box_stats`, but estimated from the sketches of the selected
+    groups. The outliers are the estimated values of the buckets outside the fences, so there
+    is at most one outlier per bucket."""
+    histograms = sketch_histograms(sketches, groups, attr, by)
+    stats = sketch_quantiles(
+        sketches, groups, attr, by, {"q1": 0.25, "median": 0.5, "q3": 0.75}
+    ).join(sketch_stats(sketches, groups, attr, by).select(*by, "min", "max"), on=by)
+    iqr = pl.col("q3") - pl.col("q1")
+    stats = stats.with_columns(
+        (pl.col("q1") - 1.5 * iqr).alias("lo"), (pl.col("q3") + 1.5 * iqr).alias("hi")
+    )
+    inside = pl.col("value").is_between(pl.col("lo"), pl.col("hi"))
+    fences = (
+        histograms.join(stats.select(*by, "lo", "hi"), on=by)
+        .group_by(by)
+        .agg(
+            pl.col("value").filter(inside).min().alias("lowerfence"),
+            pl.col("value").filter(inside).max().alias("upperfence"),
+            pl.col("value").filter(~inside).alias("outliers"),
+            pl.col("count").sum().alias("n"),
+        )
+    )
+    stats = (
+        stats.join(fences, on=by)
+        .with_columns(
+            pl.col("lowerfence").clip(pl.col("min"), pl.col("q1")),
+            pl.col("upperfence").clip(pl.col("q3"), pl.col("max")),
+        )
+        .select(*by, "q1", "median", "q3", "n", "lowerfence", "upperfence", "outliers")
+    )
+    if not outliers:
+        stats = stats.with_columns(
+            pl.lit([], dtype=pl.List(pl.Float64)).alias("outliers")
+        )
+    return _str_cols(stats, by).sort(by)
+
+
+def sketch_ecdf_knots(
+    sketches: dict, groups: pl.DataFrame, attr: str, by: list[str]
+) -> pl.DataFrame:
+    """Same as `interactive.ecdf_knots`, but with the estimated values of the buckets of the
+    selected groups as knots"""
+    return _str_cols(
+        sketch_histograms(sketches, groups, attr, by).select(
+            *by,
+            pl.col("value").alias(attr),
+            "count",
+            (pl.col("cumulative") / pl.col("n")).alias("probability"),
+        ),
+        by,
+    )
+
+
+def sketch_enum_counts(
+    sketches: dict,
+    groups: pl.DataFrame,
+    enum: pl.DataFrame,
+    attr: str,
+    by: list[str],
+) -> pl.DataFrame:
+    """Same as `interactive.enum_counts`, but computed from the sketches.
+
+    Enum values are small non-negative integers, for which the estimated values of the
+    buckets rounded to the nearest integer are exact."""
+    return _str_cols(
+        sketch_histograms(sketches, groups, attr, by)
+        .with_columns(pl.col("value").round().cast(enum["value"].dtype))
+        .join(enum, on="value")
+        .group_by(*by, "description")
+        .agg(pl.col("count").sum())
+        .sort(*by, "description"),
+        [*by, "description"],
+    )
+
+
+def sketch_mean_ci(
+    sketches: dict, groups: pl.DataFrame, attr: str, by: list[str]
+) -> pl.DataFrame:
+    """Same as `interactive.mean_ci`, but computed (exactly) from the sketches"""
+    return _str_cols(
+        sketch_stats(sketches, groups, attr, by)
+        .filter(pl.col("count") > 0)
+        .select(
+            *by,
+            "mean",
+            (1.96 * pl.col("std") / pl.col("count").sqrt())
+            .fill_null(0.0)
+            .fill_nan(0.0)
+            .alias("ci"),
+        ),
+        by,
+    )
+
+
+def main():
+    """Copy the runs table of a benchmark database to a Parquet file, from which summaries of
+    the runs can be computed faster"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("database", help="Planner Arena benchmark database")
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE, help="runs per chunk"
+    )
+    args = parser.parse_args()
+    print(write_runs_sidecar(args.database, args.chunk_size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import math
+import numpy as np
+
+# run attributes for which larger values are better; for all others smaller is better
+HIGHER_IS_BETTER = {
+    "solved",
+    "correct solution",
+    "graph states",
+    "iterations",
+    "valid segment fraction",
+}
+
+
+def higher_is_better(attribute: str) -> bool:
+    return attribute in HIGHER_IS_BETTER
+
+
+def mann_whitney(x: np.ndarray, y: np.ndarray) -> tuple[float, float, float]:
+    """Two-sided Mann-Whitney U test of samples `x` and `y` (without missing values).
+
+    Returns the U statistic of `x`, Cliff's delta (P(x > y) - P(x < y), an effect size in
+    [-1, 1]), and the p-value based on the normal approximation with tie correction. All counts
+    are computed with binary searches in the sorted samples, so no pairwise comparisons or
+    ranks of the pooled sample are needed."""
+    n, m = len(x), len(y)
+    if n == 0 or m == 0:
+        return math.nan, math.nan, math.nan
+    y = np.sort(y)
+    # for each value in x, count the values in y that are smaller plus half the ties
+    u = float(
+        (np.searchsorted(y, x, "left") + np.searchsorted(y, x, "right")).sum() / 2.0
+    )
+    delta = 2.0 * u / (n * m) - 1.0
+    _, ties = np.unique(np.concatenate((x, y)), return_counts=True)
+    N = n + m
+    variance = n * m / 12.0 * ((N + 1) - float((ties**3 - ties).sum()) / (N * (N - 1)))
+    if variance <= 0:
+        return u, delta, 1.0
+    z = (abs(u - n * m / 2.0) - 0.5) / math.sqrt(variance)
+    return u, delta, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2.0)))
+
+
+def pairwise_mann_whitney(
+    samples: list[np.ndarray],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Two-sided Mann-Whitney U tests of all pairs of samples (without missing values, none of
+    them empty), computed as in `mann_whitney`.
+
+    Returns matrices of the U statistics, Cliff's deltas, and p-values, where entry [i, j]
+    compares sample i with sample j. The U statistics of each sample against all others are
+    counted with one binary search of the pooled samples, and the tie corrections of all pairs
+    with matrix products of the counts of the tied values, so there is no loop over pairs.
+    """
+    k = len(samples)
+    sizes = np.array([len(x) for x in samples], dtype=float)
+    labels = np.repeat(np.arange(k), [len(x) for x in samples])
+    pooled = np.concatenate(samples)
+    u = np.empty((k, k))
+    for j, y in enumerate(samples):
+        y = np.sort(y)
+        # for each value, count the values in y that are smaller plus half the ties
+        below = np.searchsorted(y, pooled, "left") + np.searchsorted(y, pooled, "right")
+        u[:, j] = np.bincount(labels, weights=below, minlength=k) / 2.0
+    n, m = sizes[:, None], sizes[None, :]
+    delta = 2.0 * u / (n * m) - 1.0
+    # counts of the values that occur more than once in the pooled samples (the others do not
+    # contribute to the tie correction) in each sample
+    _, inverse, pooled_counts = np.unique(
+        pooled, return_inverse=True, return_counts=True
+    )
+    tied = pooled_counts[inverse] > 1
+    tied_values, tied_inverse = np.unique(inverse[tied], return_inverse=True)
+    counts = np.bincount(
+        labels[tied] * len(tied_values) + tied_inverse,
+        minlength=k * len(tied_values),
+    ).reshape(k, len(tied_values))
+    counts = counts.astype(float)
+    # sum of t^3 - t over the values of the pooled samples of each pair, where t = a + b is
+    # the sum of the counts in both samples
+    squares = counts**2
+    cubes = (squares * counts).sum(axis=1)
+    ties = (
+        cubes[:, None]
+        + cubes[None, :]
+        + 3.0 * (squares @ counts.T + counts @ squares.T)
+        - counts.sum(axis=1)[:, None]
+        - counts.sum(axis=1)[None, :]
+    )
+    N = n + m
+    variance = n * m / 12.0 * ((N + 1) - ties / (N * (N - 1)))
+    z = (np.abs(u - n * m / 2.0) - 0.5) / np.sqrt(np.maximum(variance, 1e-300))
+    erfc = np.vectorize(math.erfc, otypes=[float])
+    p = np.where(
+        variance > 0,
+        np.minimum(1.0, erfc(np.maximum(z, 0.0) / math.sqrt(2.0))),
+        1.0,
+    )
+    return u, delta, p
+
+
+def benjamini_hochberg(p: np.ndarray) -> np.ndarray:
+    """Return the q-values of the p-values of a family of tests: the p-values adjusted with
+    the Benjamini-Hochberg procedure, so that flagging the tests with q < alpha controls the
+    expected fraction of false discoveries among them at alpha. Missing p-values (NaN) are not
+    counted as tests and stay missing."""
+    p = np.asarray(p, dtype=float)
+    q = np.full(p.shape, np.nan)
+    tested = np.flatnonzero(~np.isnan(p))
+    # indices of the tested p-values in increasing order
+    order = tested[np.argsort(p[tested], kind="stable")]
+    m = len(order)
+    if m > 0:
+        adjusted = p[order] * m / np.arange(1, m + 1)
+        # q-values do not decrease with the p-values
+        q[order] = np.minimum(1.0, np.minimum.accumulate(adjusted[::-1])[::-1])
+    return q
+
+
+def consecutive_version_tests(
+    samples: list[tuple[str, np.ndarray]], higher_better: bool
+) -> list[tuple]:
+    """Compare the samples of each version with those of the previous version.
+
+    `samples` is a list of (version, values) pairs in version order. For each consecutive pair
+    of versions this returns the versions, the sample sizes, the medians, the effect size (Cliff's
+    delta of the newer versus the older version), the p-value of the Mann-Whitney U test, and
+    whether the newer version is worse. Whether the deterioration is significant depends on
+    the other tests of a scan (see `benjamini_hochberg`)."""
+    rows = []
+    for (old_version, old), (new_version, new) in zip(samples, samples[1:]):
+        _, delta, p = mann_whitney(new, old)
+        worse = delta < 0 if higher_better else delta > 0
+        rows.append(
+            (
+                old_version,
+                new_version,
+                len(old),
+                len(new),
+                float(np.median(old)),
+                float(np.median(new)),
+                delta,
+                p,
+                bool(worse),
+            )
+        )
+    return rows
+
+
+def batch_consecutive_version_tests(
+    tasks: list[tuple[tuple, bool, list[tuple[str, np.ndarray]]]],
+) -> list[tuple]:
+    """Run `consecutive_version_tests` for a batch of (key, higher_better, samples) tasks and
+    prefix every result row with its key.
+
+    This is a module-level function (and this module has no heavy imports), so that batches
+    can be sent cheaply to worker processes."""
+    return [
+        key + row
+        for key, higher_better, samples in tasks
+        for row in consecutive_version_tests(samples, higher_better)
+    ]
@@ -0,0 +1,94 @@
+import io
+from pathlib import Path
+import matplotlib.pyplot as plt
+import polars as pl
+import plotnine as p9
+from plannerarena import performance
+from plannerarena.database import load_database_cached
+from plannerarena.rankings import cached_rankings, ranked_attributes
+from plannerarena.rendering import RENDER_LOCK
+from plannerarena.stats import higher_is_better
+from plannerarena.widgets import (
+    default_attribute,
+    default_parameter_values,
+    default_planners,
+    default_version,
+    cached_selection,
+    problem_parameter_choices,
+    problem_summary,
+    version_choices,
+)
+
+
+def _draw(plot: p9.ggplot):
+    """Draw a plot once and discard it, which loads the plotting code and fonts"""
+    with RENDER_LOCK:
+        figure = plot.draw()
+        figure.savefig(io.BytesIO(), format="png")
+        plt.close(figure)
+
+
+def warm_up(database: str | Path, sketch: bool = False):
+    """Parse the default database and select the data of the default selections of each tab,
+    so that the first visitors do not have to wait for it.
+
+    The defaults are picked like the widgets pick them, and the parsed database, the
+    selected data, and the rankings are stored in the caches that are shared by all
+    sessions. The plots themselves depend on the size of each browser window, so one plot is
+    only drawn (under the render lock) to load the plotting code and fonts. The caller
+    should hold a slot of the scheduler."""
+    data = load_database_cached(database, sketch)
+    runs = data["runs"]
+    if runs.is_empty():
+        return
+    problem = data["problem_names"][0]
+    summary = problem_summary(runs, problem)
+    versions = summary["versions"]
+    planners = default_planners(summary["planners"])
+
+    def param_values(versions: list[str]) -> dict[str, str]:
+        experiments = data["experiments"].filter(
+            (pl.col("experiment") == problem) & (pl.col("version").is_in(versions))
+        )
+        return default_parameter_values(
+            problem_parameter_choices(
+                experiments["id"].to_list(),
+                data["parameters"],
+                data["parameter_index"],
+                data["parameter_labels"],
+            )
+        )
+
+    version = default_version(versions)
+    sel = {
+        "problem": problem,
+        "version": version,
+        "planners": planners,
+        "param_values": param_values([version]),
+    }
+    selected = cached_selection(data, sel, pl.col("version") == version)
+    if not data["progress"].is_empty():
+        cached_selection(data, sel, pl.col("version") == version, progress=True)
+    cached_selection(
+        data,
+        {
+            "problem": problem,
+            "versions": versions,
+            "planners": planners,
+            "param_values": param_values(versions),
+        },
+        pl.col("version").is_in(versions),
+    )
+    if data["sketches"] is not None:
+        # the plots and rankings of a summarized database only need the sketches
+        return
+
+    # enum attributes cannot be ranked and are plotted as bar charts instead of box plots
+    numeric_attrs = ranked_attributes(data)
+    attr = default_attribute(data["attributes"])
+    if attr in numeric_attrs:
+        _draw(performance.boxplot(selected.df, attr, selected.grouping, "o", False))
+    if numeric_attrs:
+        attr = default_attribute(numeric_attrs)
+        latest = default_version(version_choices(data["experiments"]))
+        cached_rankings(data, attr, latest, higher_is_better(attr), 0.05)
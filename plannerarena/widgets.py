@@ -1,13 +1,25 @@
 from collections import namedtuple
+from collections.abc import Callable, Mapping
 from shiny import ui, Inputs
 import polars as pl
 import faicons as fa
+from plannerarena.cache import LRUCache
+from plannerarena.database import (
+    canonical_parameter_value,
+    select_progress,
+    shared_cache_get,
+)
+from plannerarena.memory import track_derived
 
 PROBLEM_PARAMETERS_AGGREGATE_TEXT = "all (aggregate)"
 PROBLEM_PARAMETERS_SEPARATE_TEXT = "all (separate)"
 
 DataTuple = namedtuple("DataTuple", ["df", "grouping"])
 
+# selected runs for recently used selections of the default database (shared by all
+# sessions and tabs)
+SELECTION_CACHE = LRUCache(maxsize=48)
+
 
 def problem_widget(problems: list[str]) -> ui.Tag:
     return ui.input_select(
@@ -22,13 +34,45 @@ def _problem_parameter_id_map(parameters: list[str]) -> dict[str, str]:
     }
 
 
-def problem_parameter_filter(df: pl.DataFrame, param_values: dict[str, str]):
+def _is_selected(value: str | None) -> bool:
+    return (
+        value != None
+        and value != PROBLEM_PARAMETERS_AGGREGATE_TEXT
+        and value != PROBLEM_PARAMETERS_SEPARATE_TEXT
+    )
+
+
+def selected_experiment_ids(
+    param_values: dict[str, str], index: dict[str, dict[str, frozenset[int]]]
+) -> frozenset[int] | None:
+    """Return the ids of the experiments matching all selected parameter values (using the
+    index created by `database.build_parameter_index`) or None if no value is selected
+    """
+    ids = None
+    for param, value in param_values.items():
+        if _is_selected(value):
+            matches = index[param].get(canonical_parameter_value(value), frozenset())
+            ids = matches if ids is None else ids & matches
+    return ids
+
+
+def problem_parameter_filter(
+    df: pl.DataFrame,
+    param_values: dict[str, str],
+    index: dict[str, dict[str, frozenset[int]]] | None = None,
+):
+    """Select the rows of `df` that match the selected parameter values.
+
+    If the parameter index is given, `df` needs an "experimentid" column and all selections
+    are resolved with a single filter. Otherwise each parameter is filtered separately.
+    """
+    if index is not None:
+        ids = selected_experiment_ids(param_values, index)
+        if ids is None:
+            return df
+        return df.filter(pl.col("experimentid").is_in(list(ids)))
     for param, value in param_values.items():
-        if (
-            value != None
-            and value != PROBLEM_PARAMETERS_AGGREGATE_TEXT
-            and value != PROBLEM_PARAMETERS_SEPARATE_TEXT
-        ):
+        if _is_selected(value):
             try:
                 val = float(value)
                 df = df.filter(pl.col(param).is_close(val, abs_tol=1e-7, rel_tol=1e-7))
@@ -37,6 +81,21 @@ def problem_parameter_filter(df: pl.DataFrame, param_values: dict[str, str]):
     return df
 
 
+def selection_key(data: Mapping, sel: dict) -> tuple:
+    """Return the key of a selection (e.g., the problem, version, planners, and parameter
+    values of a tab) of the database `data` in the caches that are shared by all sessions
+    """
+
+    def frozen(value):
+        if isinstance(value, dict):
+            return tuple(sorted(value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(sorted(value))
+        return value
+
+    return (data["fingerprint"], *((key, frozen(sel[key])) for key in sorted(sel)))
+
+
 def problem_parameter_values(parameters: list[str], input: Inputs) -> dict[str, str]:
     return {
         param: input[param_id].get()
@@ -45,6 +104,84 @@ def problem_parameter_values(parameters: list[str], input: Inputs) -> dict[str,
     }
 
 
+def read_selection(input: Inputs, data: Mapping, versions: str = "version") -> dict:
+    """Return the current values of the selection widgets of a tab: the problem, the OMPL
+    version(s) (the value of the input `versions`), the planners, and the experiment
+    parameter values"""
+    return {
+        "problem": input.problem(),
+        versions: input[versions](),
+        "planners": input.planners(),
+        "param_values": problem_parameter_values(data["parameters"], input),
+    }
+
+
+def selection_profile_context(
+    input: Inputs,
+    selection: Callable[[], dict],
+    problem: Callable[[], dict],
+    data: Callable[[], DataTuple] | None = None,
+) -> Callable[[], dict]:
+    """Return a function that describes the applied selection of a tab in the profiles of
+    slow computations (`problem` returns the `problem_summary` of the selected problem). With
+    `data`, the number of selected rows is included as well."""
+
+    def context() -> dict:
+        described = selection() | {
+            "attribute": input.attribute(),
+            "problem rows": problem()["rows"],
+        }
+        if data is not None:
+            described["selected rows"] = data().df.height
+        return described
+
+    return context
+
+
+def select_runs(
+    data: Mapping, sel: dict, version: pl.Expr, progress: bool = False
+) -> DataTuple:
+    """Return the runs of the selected problem, planners, and experiment parameters (if
+    present) of a loaded database whose version matches the predicate `version`. With
+    `progress`, return the progress of the selected runs instead (see
+    `database.select_progress`)."""
+    grouping = problem_parameter_groups(sel["param_values"])
+    df = problem_parameter_filter(
+        data["runs"].filter(
+            (pl.col("experiment") == sel["problem"])
+            & version
+            & (pl.col("planner").is_in(sel["planners"]))
+        ),
+        sel["param_values"],
+        data["parameter_index"],
+    )
+    if progress:
+        df = select_progress(data, df.select(["id", "planner", grouping]))
+    if grouping:
+        # hacky way to create enum type from numerically sorted experiment parameters
+        grouping_enum = pl.Enum(
+            [str(v) for v in sorted(df[grouping].unique().to_list())]
+        )
+        df = df.with_columns(pl.col(grouping).cast(pl.String).cast(grouping_enum))
+    return DataTuple(df, grouping)
+
+
+def cached_selection(
+    data: Mapping, sel: dict, version: pl.Expr, progress: bool = False
+) -> DataTuple:
+    """Return `select_runs`, reusing earlier results for the same selection of the default
+    database. The selections of uploaded databases are moved to disk with them (see
+    `memory.py`)."""
+
+    def select() -> DataTuple:
+        df, grouping = select_runs(data, sel, version, progress)
+        return DataTuple(track_derived(data, df), grouping)
+
+    return shared_cache_get(
+        SELECTION_CACHE, data, (*selection_key(data, sel), progress), select
+    )
+
+
 def problem_parameter_groups(param_values: dict[str, str]) -> str:
     for param, val in param_values.items():
         if val == PROBLEM_PARAMETERS_SEPARATE_TEXT:
@@ -52,17 +189,42 @@ def problem_parameter_groups(param_values: dict[str, str]) -> str:
     return []
 
 
+def problem_parameter_choices(
+    experiment_ids: list[int],
+    parameters: list[str],
+    index: dict[str, dict[str, frozenset[int]]],
+    labels: dict[str, dict[str, str]],
+) -> dict[str, dict[str, str]]:
+    """Return the choices of the parameter widgets for the given experiments: the values of
+    each parameter that occur in them, keyed as in the parameter index and labelled as in
+    the plots (see `database.build_parameter_labels`)"""
+    experiment_ids = set(experiment_ids)
+    choices = {}
+    for param in parameters:
+        values = {
+            value: labels[param].get(value, value)
+            for value, ids in index[param].items()
+            if not ids.isdisjoint(experiment_ids)
+        }
+        if len(values) > 1:
+            values = {
+                PROBLEM_PARAMETERS_AGGREGATE_TEXT: PROBLEM_PARAMETERS_AGGREGATE_TEXT,
+                PROBLEM_PARAMETERS_SEPARATE_TEXT: PROBLEM_PARAMETERS_SEPARATE_TEXT,
+            } | values
+        choices[param] = values
+    return choices
+
+
+def default_parameter_values(choices: dict[str, dict[str, str]]) -> dict[str, str]:
+    """Return the values that the parameter widgets select initially (the first choice)"""
+    return {param: next(iter(values)) for param, values in choices.items() if values}
+
+
 def problem_parameter_widget(
-    data: pl.DataFrame, param_id: str, parameter: str
+    values: dict[str, str], param_id: str, parameter: str
 ) -> ui.Tag:
-    values = data[parameter].unique().drop_nulls().to_list()
     if len(values) == 0:
         return []
-    if len(values) > 1:
-        values = [
-            PROBLEM_PARAMETERS_AGGREGATE_TEXT,
-            PROBLEM_PARAMETERS_SEPARATE_TEXT,
-        ] + values
     return ui.input_select(
         param_id,
         label=ui.h6(parameter),
@@ -71,19 +233,59 @@ def problem_parameter_widget(
 
 
 def problem_parameter_widgets(
-    data: pl.DataFrame, parameters: list[str]
+    experiment_ids: list[int],
+    parameters: list[str],
+    index: dict[str, dict[str, frozenset[int]]],
+    labels: dict[str, dict[str, str]],
 ) -> ui.Tag | None:
+    """Create a select widget for each parameter with the values that occur in the given
+    experiments (see `problem_parameter_choices`)"""
     if len(parameters) > 0:
+        choices = problem_parameter_choices(experiment_ids, parameters, index, labels)
         return ui.card(
             ui.h5("Problem parameters"),
             [
-                problem_parameter_widget(data, id, param)
+                problem_parameter_widget(choices[param], id, param)
                 for param, id in _problem_parameter_id_map(parameters).items()
             ],
         )
     return None
 
 
+def version_choices(runs: pl.DataFrame) -> list[str]:
+    """Return the versions of `runs` from oldest to newest"""
+    return runs["version"].unique().sort().cast(pl.String).to_list()
+
+
+def planner_choices(runs: pl.DataFrame) -> list[str]:
+    """Return the planners of `runs` in the order in which they occur"""
+    return runs["planner"].unique(maintain_order=True).cast(pl.String).to_list()
+
+
+def problem_summary(runs: pl.DataFrame, problem: str) -> dict:
+    """Return the choices of the version and planner widgets for the runs of a problem, and
+    the number of these runs, without keeping a copy of the runs"""
+    runs = runs.filter(pl.col("experiment") == problem)
+    return {
+        "versions": version_choices(runs),
+        "planners": planner_choices(runs),
+        "rows": runs.height,
+    }
+
+
+def default_attribute(attributes: list[str]) -> str | None:
+    return "time" if "time" in attributes else next(iter(attributes), None)
+
+
+def default_version(versions: list[str]) -> str:
+    return versions[-1]
+
+
+def default_planners(planners: list[str]) -> list[str]:
+    # select first 4 planners (or all if there are less than 4)
+    return planners[: min(len(planners), 4)]
+
+
 def attribute_widget(
     attributes: list[str], label: str = "Benchmark attribute"
 ) -> ui.Tag:
@@ -91,7 +293,7 @@ def attribute_widget(
         "attribute",
         label=ui.h4(label),
         choices=attributes,
-        selected="time" if "time" in attributes else None,
+        selected=default_attribute(attributes),
     )
 
 
@@ -110,17 +312,44 @@ def version_widget(versions: list[str], checkbox: bool = False) -> ui.Tag | None
             "version",
             label=ui.h4("Version"),
             choices=versions,
-            selected=versions[-1],
+            selected=default_version(versions),
         )
 
 
 def planner_widget(planners: list[str]) -> ui.Tag:
-    # select first 4 planners (or all if there are less than 4)
     return ui.input_checkbox_group(
         "planners",
         label=ui.h4("Selected planners"),
         choices=planners,
-        selected=planners[: min(len(planners), 4)],
+        selected=default_planners(planners),
+    )
+
+
+def apply_widget() -> ui.Tag:
+    return ui.div(
+        ui.input_checkbox("apply_manually", "Apply selection changes manually"),
+        ui.panel_conditional(
+            "input.apply_manually",
+            ui.input_action_button(
+                "apply", "Apply", icon=fa.icon_svg("check"), class_="btn-primary"
+            ),
+        ),
+    )
+
+
+def interactive_widget(value: bool = False) -> ui.Tag:
+    return ui.input_checkbox(
+        "interactive", "Render interactive plot in the browser", value=value
+    )
+
+
+def plot_output(id: str) -> ui.TagList:
+    """Output for a plot that is either rendered on the server or drawn in the browser.
+
+    Shiny suspends outputs that are hidden, so only one of the two is ever computed."""
+    return ui.TagList(
+        ui.panel_conditional("!input.interactive", ui.output_plot(id)),
+        ui.panel_conditional("input.interactive", ui.output_ui(id + "_interactive")),
     )
 
 
@@ -0,0 +1,32 @@
+// Draw plots from pre-aggregated data sent by the server. Plotly.js is loaded on
+// first use, so pages that only show server-rendered plots never download it.
+window.PlannerArena = (function () {
+  var plotly = null;
+
+  function loadPlotly() {
+    if (plotly === null) {
+      plotly = new Promise(function (resolve, reject) {
+        var script = document.createElement("script");
+        script.src = document.querySelector("meta[name=plannerarena-plotly]").content;
+        script.onload = function () { resolve(window.Plotly); };
+        script.onerror = reject;
+        document.head.appendChild(script);
+      });
+    }
+    return plotly;
+  }
+
+  return {
+    draw: function (id, figure) {
+      loadPlotly().then(function (Plotly) {
+        var el = document.getElementById(id);
+        if (el) {
+          Plotly.react(el, figure.data, figure.layout, {
+            responsive: true,
+            displaylogo: false,
+          });
+        }
+      });
+    },
+  };
+})();
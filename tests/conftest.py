@@ -0,0 +1,88 @@
+import itertools
+import random
+import sqlite3
+import pytest
+from plannerarena.database import load_database
+
+PLANNERS = ["geometric_RRT", "geometric_RRTstar", "geometric_PRM"]
+VERSIONS = ["1.5.2", "1.6.0", "1.10.0"]
+RUNS_PER_EXPERIMENT = 20
+
+
+def write_database(path, seed: int = 0):
+    """Write a small benchmark database in the format of OMPL's benchmark log parser, with
+    two problems, three versions, and two experiment parameters"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE experiments (id INTEGER PRIMARY KEY, name VARCHAR(512),
+            totaltime REAL, timelimit REAL, memorylimit REAL, runcount INTEGER,
+            version VARCHAR(128), hostname VARCHAR(1024), cpuinfo TEXT, date DATETIME,
+            seed INTEGER, setup TEXT, robot_dof INTEGER, clearance REAL);
+        CREATE TABLE plannerConfigs (id INTEGER PRIMARY KEY, name VARCHAR(512),
+            settings TEXT);
+        CREATE TABLE enums (name VARCHAR(512), value INTEGER, description TEXT);
+        CREATE TABLE runs (id INTEGER PRIMARY KEY, experimentid INTEGER,
+            plannerid INTEGER, time REAL, memory REAL, solved BOOLEAN, status INTEGER,
+            "best cost" REAL);
+        CREATE TABLE progress (runid INTEGER, time REAL, best_cost REAL,
+            iterations INTEGER);
+        """)
+    for i, planner in enumerate(PLANNERS, 1):
+        conn.execute(
+            "INSERT INTO plannerConfigs VALUES (?, ?, ?)", (i, planner, "range=0.1")
+        )
+    for value, description in [(1, "Exact solution"), (3, "Timeout")]:
+        conn.execute("INSERT INTO enums VALUES ('status', ?, ?)", (value, description))
+    experiments = itertools.product(
+        ["problem0", "problem1"], VERSIONS, [3, 6], [0.1, 1e7]
+    )
+    run_id = 0
+    for experiment_id, (problem, version, dof, clearance) in enumerate(experiments, 1):
+        conn.execute(
+            "INSERT INTO experiments VALUES (?, ?, 10, 5, 4096, ?, ?, 'host', 'cpu', "
+            "'2024-01-01', 42, '', ?, ?)",
+            (experiment_id, problem, RUNS_PER_EXPERIMENT, version, dof, clearance),
+        )
+        for planner_id in range(1, len(PLANNERS) + 1):
+            for _ in range(RUNS_PER_EXPERIMENT):
+                run_id += 1
+                time = min(rng.expovariate(1 / (0.2 * planner_id * dof)), 5.0)
+                solved = time < 5
+                conn.execute(
+                    "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        experiment_id,
+                        planner_id,
+                        time,
+                        rng.gauss(100, 10),
+                        solved,
+                        1 if solved else 3,
+                        10 + rng.random() * dof if solved else None,
+                    ),
+                )
+                if planner_id == 2:
+                    # only RRT* reports its progress
+                    t, best = 0.0, 30.0
+                    while t < 5:
+                        t += rng.uniform(0.1, 0.5)
+                        best *= rng.uniform(0.9, 1.0)
+                        conn.execute(
+                            "INSERT INTO progress VALUES (?, ?, ?, ?)",
+                            (run_id, t, best, int(t * 1000)),
+                        )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def database(tmp_path_factory):
+    path = tmp_path_factory.mktemp("db") / "benchmark.db"
+    write_database(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def data(database):
+    return load_database(database)
@@ -0,0 +1,116 @@
+import asyncio
+import io
+from urllib.parse import urlencode
+import polars as pl
+import pyarrow as pa
+import pytest
+from starlette.requests import Request
+from plannerarena.api import api_routes
+
+
+@pytest.fixture(scope="module")
+def api(database):
+    """Call a route of the data API of the test database and return its response"""
+    routes = {route.path: route.endpoint for route in api_routes(database)}
+
+    def get(path: str, **query):
+        query_string = urlencode(query, doseq=True).encode()
+        scope = {"type": "http", "method": "GET", "query_string": query_string}
+        return routes[path](Request(scope))
+
+    return get
+
+
+def read_arrow(response) -> pl.DataFrame:
+    async def body() -> bytes:
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    assert response.status_code == 200
+    return pl.from_arrow(pa.ipc.open_stream(asyncio.run(body())).read_all())
+
+
+def test_runs_filters(api, data):
+    runs = read_arrow(
+        api(
+            "/runs",
+            experiment="problem1",
+            version=["1.5.2", "1.10.0"],
+            planner="RRT",
+            attribute="time",
+        )
+    )
+    expected = data["runs"].filter(
+        (pl.col("experiment") == "problem1")
+        & pl.col("version").cast(pl.String).is_in(["1.5.2", "1.10.0"])
+        & (pl.col("planner") == "RRT")
+    )
+    assert runs.columns[-1] == "time"
+    assert "memory" not in runs.columns
+    assert runs["id"].sort().to_list() == expected["id"].sort().to_list()
+
+
+@pytest.mark.parametrize("clearance", ["1e7", "10000000", "10000000.0"])
+def test_runs_parameter_filters(api, data, clearance):
+    query = {"param.robot dof": "6", "param.clearance": clearance}
+    runs = read_arrow(api("/runs", **query))
+    expected = data["runs"].filter(
+        (pl.col("robot dof") == 6) & (pl.col("clearance") == 1e7)
+    )
+    assert runs["id"].sort().to_list() == expected["id"].sort().to_list()
+
+
+def test_aggregated_runs(api, data):
+    query = {"experiment": "problem0", "param.clearance": "all (separate)"}
+    aggregated = read_arrow(api("/runs", aggregate=1, attribute="time", **query))
+    runs = data["runs"].filter(pl.col("experiment") == "problem0")
+    expected = (
+        runs.group_by("experiment", "version", "planner", "clearance")
+        .agg(
+            pl.len().alias("expected runs"),
+            pl.col("time").mean().alias("expected mean"),
+            pl.col("time").median().alias("expected median"),
+        )
+        .with_columns(pl.col("version", "planner").cast(pl.String))
+    )
+    assert aggregated.height == expected.height == 3 * 3 * 2
+    joined = aggregated.with_columns(pl.col("version", "planner").cast(pl.String)).join(
+        expected, on=["experiment", "version", "planner", "clearance"]
+    )
+    assert joined.height == expected.height
+    assert (joined["runs"] == joined["expected runs"]).all()
+    assert joined["time mean"].to_list() == pytest.approx(
+        joined["expected mean"].to_list()
+    )
+    assert joined["time median"].to_list() == pytest.approx(
+        joined["expected median"].to_list()
+    )
+
+
+def test_parquet_format(api):
+    response = api("/experiments", format="parquet")
+    assert response.status_code == 200
+    assert pl.read_parquet(io.BytesIO(response.body)).height == 24
+
+
+@pytest.mark.parametrize(
+    "query",
+    [{"attribute": "length"}, {"param.seed": "1"}, {"format": "csv"}],
+)
+def test_bad_requests(api, query):
+    assert api("/runs", **query).status_code == 400
+
+
+def test_progress_types(api, data):
+    progress = read_arrow(
+        api("/progress", experiment="problem0", planner="RRTstar", version="1.6.0")
+    )
+    assert progress.schema["runid"] == pl.Int64
+    assert progress.schema["time"] == pl.Float64
+    assert progress.schema["best cost"] == pl.Float64
+    assert progress.schema["iterations"] == pl.Int64
+    expected = data["runs"].filter(
+        (pl.col("experiment") == "problem0")
+        & (pl.col("planner") == "RRTstar")
+        & (pl.col("version") == "1.6.0")
+    )
+    assert set(progress["runid"]) == set(expected["id"])
@@ -0,0 +1,56 @@
+import sqlite3
+import polars as pl
+from plannerarena.database import (
+    compact_dtypes,
+    get_table,
+    select_progress,
+    widen_dtypes,
+)
+
+
+def test_compact_dtypes_round_trip():
+    df = pl.DataFrame(
+        {
+            "runid": [1, 2, 3],
+            "small": [0, 100, -5],
+            "large": [0, 2**40, 1],
+            "half": [0.5, 1.25, None],
+            "tenth": [0.1, 0.2, 0.3],
+        }
+    )
+    compact = compact_dtypes(df, keep=["runid"])
+    assert compact.schema == pl.Schema(
+        {
+            "runid": pl.Int64,
+            "small": pl.Int8,
+            "large": pl.Int64,
+            "half": pl.Float32,
+            # not exactly representable as Float32
+            "tenth": pl.Float64,
+        }
+    )
+    assert widen_dtypes(compact, compact.columns).equals(df)
+
+
+def test_progress_is_stored_compactly(data, database):
+    progress = data["progress"]
+    assert progress.schema["runid"] == pl.Int64
+    assert progress["runid"].is_sorted()
+    conn = sqlite3.connect(database)
+    original = get_table(conn, "progress").sort("runid", "time")
+    conn.close()
+    assert progress.schema["iterations"] == pl.Int16
+    assert widen_dtypes(progress, progress.columns).equals(original)
+
+
+def test_select_progress_matches_join(data):
+    runs = data["runs"].filter(
+        (pl.col("experiment") == "problem1") & (pl.col("clearance") == 0.1)
+    )
+    # runs without progress are skipped
+    selected = runs.select("id", "planner", "robot dof").sample(fraction=0.5, seed=1)
+    progress = select_progress(data, selected)
+    expected = data["progress"].join(selected, left_on="runid", right_on="id")
+    assert progress.columns == expected.columns
+    assert progress.sort("runid", "time").equals(expected.sort("runid", "time"))
+    assert select_progress(data, selected.clear()).is_empty()
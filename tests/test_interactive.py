@@ -0,0 +1,118 @@
+import numpy as np
+import polars as pl
+import pytest
+from plannerarena.interactive import (
+    binned_counts,
+    binned_means,
+    box_stats,
+    ecdf_knots,
+    mean_ci,
+)
+
+
+@pytest.fixture
+def runs() -> pl.DataFrame:
+    """Skewed values (with outliers and missing values) of two planners for a numeric
+    parameter whose values sort differently as text"""
+    rng = np.random.default_rng(0)
+    frames = []
+    for planner, scale in [("PRM", 1.0), ("RRT", 2.0)]:
+        for dof in [2, 10]:
+            values = rng.lognormal(np.log(scale), 1.0, 200).round(2)
+            frames.append(
+                pl.DataFrame({"planner": planner, "robot dof": dof, "time": values})
+            )
+    return pl.concat(frames).with_columns(
+        pl.when(pl.col("time") >= 0.5)
+        .then(pl.col("robot dof") * pl.col("time"))
+        .alias("best cost")
+    )
+
+
+def groups(runs: pl.DataFrame, value: str, by: list[str]):
+    """Iterate over the groups of `runs` in the order of their (numeric) keys as (key strings,
+    non-missing values)"""
+    for key, group in runs.drop_nulls(value).sort(by).group_by(by, maintain_order=True):
+        yield [str(k) for k in key], group[value].to_numpy()
+
+
+def test_box_stats_match_numpy_and_tukey_fences(runs):
+    by = ["robot dof", "planner"]
+    stats = box_stats(runs, "best cost", by)
+    assert stats.select(by).rows() == [
+        ("2", "PRM"),
+        ("2", "RRT"),
+        ("10", "PRM"),
+        ("10", "RRT"),
+    ]
+    for row, (key, values) in zip(
+        stats.iter_rows(named=True), groups(runs, "best cost", by)
+    ):
+        assert [row[c] for c in by] == key
+        q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+        assert (row["q1"], row["median"], row["q3"]) == pytest.approx((q1, median, q3))
+        assert row["n"] == len(values)
+        lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        inside = (values >= lo) & (values <= hi)
+        assert row["lowerfence"] == values[inside].min()
+        assert row["upperfence"] == values[inside].max()
+        assert sorted(row["outliers"]) == sorted(values[~inside])
+        assert row["outliers"]
+
+
+def test_box_stats_without_outliers(runs):
+    stats = box_stats(runs, "time", ["planner"], outliers=False)
+    assert stats["outliers"].to_list() == [[], []]
+    assert stats["n"].to_list() == [400, 400]
+
+
+def test_ecdf_knots_match_numpy(runs):
+    knots = ecdf_knots(runs, "best cost", ["robot dof"])
+    assert knots["robot dof"].unique(maintain_order=True).to_list() == ["2", "10"]
+    for key, values in groups(runs, "best cost", ["robot dof"]):
+        group = knots.filter(pl.col("robot dof") == key[0])
+        x = group["best cost"].to_numpy()
+        np.testing.assert_array_equal(x, np.unique(values))
+        np.testing.assert_allclose(
+            group["probability"].to_numpy(), (values[:, None] <= x).mean(axis=0)
+        )
+
+
+def test_mean_ci_match_numpy(runs):
+    ci = mean_ci(runs, "best cost", ["robot dof"])
+    assert ci["robot dof"].to_list() == ["2", "10"]
+    for row, (_, values) in zip(
+        ci.iter_rows(named=True), groups(runs, "best cost", ["robot dof"])
+    ):
+        assert row["mean"] == pytest.approx(values.mean())
+        assert row["ci"] == pytest.approx(
+            1.96 * values.std(ddof=1) / np.sqrt(len(values))
+        )
+    single = mean_ci(runs.head(1), "time", ["planner"])
+    assert single["ci"].to_list() == [0.0]
+
+
+def test_binned_counts_and_means_match_numpy(runs):
+    # times on a grid of quarters up to 10, so that the bins of width 0.5 are computed
+    # exactly
+    runs = runs.with_columns(((pl.col("time") * 4).round().clip(1, 40) / 4))
+    binwidth = width = 0.5
+    counts = binned_counts(runs, "best cost", ["robot dof"], binwidth)
+    means = binned_means(runs, "best cost", ["robot dof"], num_bins=20)
+    assert runs.drop_nulls("best cost")["time"].max() == 20 * width
+    for key, group in runs.drop_nulls("best cost").group_by(["robot dof"]):
+        time = group["time"].to_numpy()
+        cost = group["best cost"].to_numpy()
+        selected = counts.filter(pl.col("robot dof") == str(key[0]))
+        bins, n = np.unique(np.floor(time / binwidth) * binwidth, return_counts=True)
+        np.testing.assert_allclose(selected["bin"].to_numpy(), bins)
+        np.testing.assert_array_equal(selected["count"].to_numpy(), n)
+        selected = means.filter(pl.col("robot dof") == str(key[0]))
+        index = np.floor(time / width)
+        bins = np.unique(index)
+        np.testing.assert_allclose(selected["bin"].to_numpy(), (bins + 0.5) * width)
+        np.testing.assert_allclose(
+            selected["best cost"].to_numpy(),
+            [cost[index == b].mean() for b in bins],
+        )
+    assert counts["robot dof"].unique(maintain_order=True).to_list() == ["2", "10"]
@@ -0,0 +1,114 @@
+import gc
+import time
+import polars as pl
+from plannerarena.memory import DatasetRegistry, track_derived
+from plannerarena.widgets import cached_selection
+
+
+def wait_until(predicate, timeout: float = 5.0):
+    """Wait for the sweeper thread of a registry"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def assert_same_tables(dataset, data: dict):
+    for name, value in data.items():
+        if isinstance(value, pl.DataFrame):
+            assert dataset[name].equals(value)
+        else:
+            assert dataset[name] == value
+
+
+def database_size(data: dict) -> int:
+    return sum(v.estimated_size() for v in data.values() if isinstance(v, pl.DataFrame))
+
+
+def test_least_recently_used_database_is_spilled_over_budget(data, tmp_path):
+    size = database_size(data)
+    registry = DatasetRegistry(int(1.2 * size), 0, str(tmp_path))
+    a = registry.register("a", data)
+    b = registry.register("b", data)
+    wait_until(lambda: registry.status()["on disk"] == 1)
+    assert a.spilled and not b.spilled
+    assert {path.name for path in tmp_path.glob("*/*")} == {
+        f"{name}.arrow" for name in a.tables
+    }
+    assert_same_tables(a, data)
+
+    # the mapped tables are not read back into memory when they are used again
+    status = registry.status()
+    assert a.spilled
+    assert status["in memory size"] == size
+    assert status["on disk size"] == size
+
+    # a table derived from the most recently used database counts as in memory, so the
+    # other database is spilled
+    selected = a.track(a["runs"].filter(pl.col("version") != "1.5.2"))
+    wait_until(lambda: b.spilled)
+    assert registry.status()["in memory size"] == selected.estimated_size()
+    assert registry.status()["spills"] == 2
+
+    registry.discard("a")
+    registry.discard("b")
+    assert list(tmp_path.iterdir()) == []
+    assert registry.status()["in memory"] == registry.status()["on disk"] == 0
+
+
+def test_idle_database_is_spilled_with_derived_tables(data, tmp_path):
+    registry = DatasetRegistry(0, 0.2, str(tmp_path))
+    dataset = registry.register("a", data)
+    wait_until(lambda: dataset.spilled)
+    assert_same_tables(dataset, data)
+
+    runs = dataset["runs"].filter(pl.col("planner") == "RRT")
+    expected = runs.clone()
+    assert track_derived(dataset, runs) is runs
+    assert registry.status()["in memory size"] == runs.estimated_size()
+    # the derived table is moved to disk in place
+    wait_until(lambda: registry.status()["in memory"] == 0)
+    assert runs.equals(expected)
+    assert registry.status()["on disk size"] == dataset.size + runs.estimated_size()
+    (directory,) = tmp_path.iterdir()
+    assert len(list(directory.glob("derived-*.arrow"))) == 1
+    # the tables of the database are written to disk only once
+    assert registry.status()["spills"] == 2
+    assert len(list(directory.iterdir())) == len(dataset.tables) + 1
+
+    # the file of a derived table is removed once the table is not used anymore
+    del runs
+    gc.collect()
+    assert list(directory.glob("derived-*.arrow")) == []
+    assert registry.status()["on disk size"] == dataset.size
+
+    # a new database of the session replaces the previous one
+    registry.register("a", {"runs": data["runs"]})
+    assert list(tmp_path.iterdir()) == []
+    assert registry.status()["in memory"] == 1
+
+
+def test_tables_of_other_databases_are_not_tracked(data):
+    runs = data["runs"].head(10)
+    assert track_derived(data, runs) is runs
+
+
+def test_selections_of_uploaded_databases_are_tracked(data, tmp_path):
+    registry = DatasetRegistry(0, 0, str(tmp_path))
+    dataset = registry.register("a", data)
+    sel = {
+        "problem": "problem1",
+        "version": "1.10.0",
+        "planners": ["RRT"],
+        "param_values": {},
+    }
+    version = pl.col("version") == sel["version"]
+    selected = cached_selection(dataset, sel, version)
+    again = cached_selection(dataset, sel, version)
+    assert again is not selected
+    assert again.df.equals(selected.df)
+    size = selected.df.estimated_size()
+    assert registry.status()["in memory size"] == dataset.size + 2 * size
+    del selected
+    gc.collect()
+    assert registry.status()["in memory size"] == dataset.size + size
@@ -0,0 +1,115 @@
+import polars as pl
+import pytest
+from plannerarena.database import (
+    build_parameter_index,
+    build_parameter_labels,
+    canonical_parameter_value,
+    load_database_cached,
+)
+from plannerarena.widgets import (
+    PROBLEM_PARAMETERS_AGGREGATE_TEXT,
+    PROBLEM_PARAMETERS_SEPARATE_TEXT,
+    cached_selection,
+    problem_parameter_filter,
+    selected_experiment_ids,
+)
+
+
+@pytest.mark.parametrize(
+    "value, key",
+    [
+        (10000000, "10000000"),
+        (10000000.0, "10000000"),
+        ("1e7", "10000000"),
+        ("10000000.0", "10000000"),
+        (0.1, "0.1"),
+        ("0.10", "0.1"),
+        (0.1 + 1e-12, repr(0.1 + 1e-12)),
+        (2**60 + 1, str(2**60 + 1)),
+        (True, "True"),
+        ("box", "box"),
+    ],
+)
+def test_canonical_parameter_value(value, key):
+    assert canonical_parameter_value(value) == key
+
+
+def test_parameter_index_keeps_close_values_apart():
+    experiments = pl.DataFrame({"id": [1, 2, 3], "clearance": [0.1, 0.1 + 1e-12, 0.1]})
+    index = build_parameter_index(experiments, ["clearance"])
+    assert index["clearance"] == {
+        "0.1": frozenset({1, 3}),
+        repr(0.1 + 1e-12): frozenset({2}),
+    }
+
+
+def test_parameter_index_and_labels(data):
+    experiments = data["experiments"]
+    index = data["parameter_index"]
+    assert list(index) == ["robot dof", "clearance"]
+    # sorted numerically
+    assert list(index["clearance"]) == ["0.1", "10000000"]
+    for param in index:
+        for key, ids in index[param].items():
+            expected = experiments.filter(
+                pl.col(param).map_elements(canonical_parameter_value, pl.String) == key
+            )["id"]
+            assert ids == frozenset(expected)
+    labels = build_parameter_labels(experiments, data["parameters"])
+    assert labels["clearance"] == {"0.1": "0.1", "10000000": "10000000.0"}
+
+
+def test_parameter_filter_matches_column_filter(data):
+    runs = data["runs"]
+    for dof in ["3", "6"]:
+        for clearance in ["0.1", "1e7", "10000000.0"]:
+            param_values = {"robot dof": dof, "clearance": clearance}
+            indexed = problem_parameter_filter(
+                runs, param_values, data["parameter_index"]
+            )
+            filtered = runs.filter(
+                (pl.col("robot dof") == int(dof))
+                & (pl.col("clearance") == float(clearance))
+            )
+            assert not indexed.is_empty()
+            assert indexed["id"].sort().to_list() == filtered["id"].sort().to_list()
+
+
+def test_unselected_parameters_do_not_filter(data):
+    index = data["parameter_index"]
+    param_values = {
+        "robot dof": PROBLEM_PARAMETERS_AGGREGATE_TEXT,
+        "clearance": PROBLEM_PARAMETERS_SEPARATE_TEXT,
+    }
+    assert selected_experiment_ids(param_values, index) is None
+    assert selected_experiment_ids({"clearance": "0.5"}, index) == frozenset()
+
+
+def test_selections_are_only_cached_for_the_shared_database(database, data):
+    shared = load_database_cached(database)
+    sel = {
+        "problem": "problem0",
+        "version": "1.6.0",
+        "planners": ["RRT", "PRM"],
+        "param_values": {
+            "robot dof": "3",
+            "clearance": PROBLEM_PARAMETERS_SEPARATE_TEXT,
+        },
+    }
+    version = pl.col("version") == sel["version"]
+    selected = cached_selection(shared, sel, version)
+    assert cached_selection(shared, sel, version) is selected
+    assert cached_selection(data, sel, version) is not cached_selection(
+        data, sel, version
+    )
+    expected = data["runs"].filter(
+        (pl.col("experiment") == "problem0")
+        & version
+        & pl.col("planner").is_in(sel["planners"])
+        & (pl.col("robot dof") == 3)
+    )
+    assert selected.grouping == "clearance"
+    assert selected.df["clearance"].dtype == pl.Enum(["0.1", "10000000.0"])
+    assert selected.df["id"].sort().to_list() == expected["id"].sort().to_list()
+    # the progress of the same selection is cached separately
+    assert cached_selection(shared, sel, version, progress=True).df.is_empty()
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from plannerarena import profiling
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    """Call a route of the admin pages with a profile of a slow computation and return its
+    response"""
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(profiling.PROFILER, "profiles", [])
+    profiling.PROFILER.profiles.append(
+        {
+            "id": 1,
+            "time": "2024-01-01T00:00:00",
+            "name": "performance data",
+            "duration": 2.0,
+            "samples": 400,
+            "context": {"problem": "problem0"},
+            "stacks": {"main;select": 400},
+        }
+    )
+    routes = profiling.admin_routes()
+
+    def get(path: str, query: str = "", authorization: str | None = None):
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "query_string": query.encode(),
+            "headers": (
+                [(b"authorization", authorization.encode())] if authorization else []
+            ),
+        }
+        for route in routes:
+            match, child = route.matches(scope | {"path": path})
+            if match.name == "FULL":
+                return asyncio.run(route.endpoint(Request(scope | child)))
+        raise KeyError(path)
+
+    return get
+
+
+def test_profile_links_keep_the_query_token(admin):
+    response = admin("/profiles", "token=secret")
+    assert response.status_code == 200
+    assert 'href="profiles/1.txt?token=secret"' in response.body.decode()
+
+
+def test_profile_links_work_with_bearer_tokens(admin):
+    bearer = "Bearer secret"
+    response = admin("/profiles", authorization=bearer)
+    assert response.status_code == 200
+    assert 'href="profiles/1.txt"' in response.body.decode()
+    response = admin("/profiles/1.txt", authorization=bearer)
+    assert response.body.decode() == "main;select 400\n"
+    assert admin("/profiles/1.txt").status_code == 403
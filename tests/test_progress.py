@@ -0,0 +1,58 @@
+import numpy as np
+import polars as pl
+from plannerarena.progress import resample_progress
+
+
+def test_resample_progress_carries_last_value_forward():
+    df = pl.DataFrame(
+        {
+            "runid": [1, 1, 2, 2],
+            "planner": ["A", "A", "A", "A"],
+            "time": [1.0, 3.0, 2.0, 4.0],
+            "cost": [10.0, 6.0, 8.0, 4.0],
+        }
+    )
+    resampled = resample_progress(df, "cost", ["planner"], num_points=5)
+    # grid points 0, 1, 2, 3, 4; no run reported a value at time 0
+    assert resampled["time"].to_list() == [1.0, 2.0, 3.0, 4.0]
+    assert resampled["runs"].to_list() == [1, 2, 2, 2]
+    assert resampled["median"].to_list() == [10.0, 9.0, 7.0, 5.0]
+    assert resampled["lower"].to_list() == [10.0, 8.5, 6.5, 4.5]
+    assert resampled["upper"].to_list() == [10.0, 9.5, 7.5, 5.5]
+
+
+def test_resample_progress_matches_exact_quantiles_per_group():
+    rng = np.random.default_rng(0)
+    rows = []
+    for runid in range(30):
+        planner = "A" if runid % 2 else "B"
+        times = np.sort(rng.uniform(0, 10, 8))
+        costs = np.sort(rng.uniform(0, 100, 8))[::-1]
+        rows += [(runid, planner, t, c) for t, c in zip(times, costs)]
+    df = pl.DataFrame(rows, schema=["runid", "planner", "time", "cost"], orient="row")
+    resampled = resample_progress(df, "cost", ["planner"], num_points=20)
+    grid = np.linspace(0, df["time"].max(), 20)
+    for (planner,), group in df.group_by("planner"):
+        expected = resampled.filter(pl.col("planner") == planner)
+        for row in expected.iter_rows(named=True):
+            t = row["time"]
+            assert t in grid
+            # the last value of each run at or before t
+            values = (
+                group.filter(pl.col("time") <= t)
+                .group_by("runid")
+                .agg(pl.col("cost").sort_by("time").last())["cost"]
+                .to_numpy()
+            )
+            assert row["runs"] == len(values)
+            assert np.isclose(row["median"], np.median(values))
+            assert np.isclose(row["lower"], np.quantile(values, 0.25))
+            assert np.isclose(row["upper"], np.quantile(values, 0.75))
+
+
+def test_resample_progress_without_values():
+    df = pl.DataFrame(
+        {"runid": [1], "planner": ["A"], "time": [1.0], "cost": [None]},
+        schema_overrides={"cost": pl.Float64},
+    )
+    assert resample_progress(df, "cost", ["planner"]).is_empty()
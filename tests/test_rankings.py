@@ -0,0 +1,105 @@
+import numpy as np
+import polars as pl
+import pytest
+from scipy import stats
+from plannerarena.rankings import compute_rankings, planner_statistics
+from plannerarena.stats import benjamini_hochberg, mann_whitney, pairwise_mann_whitney
+
+
+def cliffs_delta(x: np.ndarray, y: np.ndarray) -> float:
+    return float(np.sign(x[:, None] - y[None, :]).mean())
+
+
+@pytest.mark.parametrize(
+    "x, y",
+    [
+        (np.arange(10.0), np.arange(5.0, 15.0)),
+        # many ties, as for timed-out runs
+        (np.r_[np.full(30, 5.0), np.linspace(0, 4, 20)], np.full(40, 5.0)),
+        (np.array([1.0, 2.0, 2.0, 3.0]), np.array([2.0, 2.0, 2.0])),
+    ]
+    + [
+        (rng.exponential(1.0, n), rng.exponential(scale, m).round(1))
+        for rng in [np.random.default_rng(0)]
+        for n, m, scale in [(5, 8, 1.0), (50, 70, 1.5), (500, 300, 1.1)]
+    ],
+)
+def test_mann_whitney_matches_scipy(x, y):
+    u, delta, p = mann_whitney(x, y)
+    expected = stats.mannwhitneyu(
+        x, y, alternative="two-sided", use_continuity=True, method="asymptotic"
+    )
+    assert u == pytest.approx(expected.statistic)
+    assert p == pytest.approx(expected.pvalue)
+    assert delta == pytest.approx(cliffs_delta(x, y))
+
+
+def test_mann_whitney_degenerate_samples():
+    assert mann_whitney(np.full(5, 1.0), np.full(3, 1.0)) == (7.5, 0.0, 1.0)
+    assert all(np.isnan(mann_whitney(np.array([]), np.arange(3.0))))
+
+
+def test_pairwise_mann_whitney_matches_mann_whitney():
+    rng = np.random.default_rng(1)
+    samples = [
+        np.minimum(rng.exponential(scale, n).round(1), 3.0)
+        for scale, n in [(1.0, 40), (1.5, 25), (0.5, 60), (3.0, 1)]
+    ] + [np.full(10, 3.0)]
+    u, delta, p = pairwise_mann_whitney(samples)
+    for i, x in enumerate(samples):
+        for j, y in enumerate(samples):
+            if i != j:
+                assert (u[i, j], delta[i, j], p[i, j]) == pytest.approx(
+                    mann_whitney(x, y)
+                )
+
+
+def test_planners_are_ranked_per_parameter_setting(data):
+    runs = data["runs"].filter(pl.col("version") == "1.10.0")
+    parameters = data["parameters"]
+    statistics = planner_statistics(runs, "time", False, parameters)
+    # 2 problems with 2 x 2 parameter settings and 3 planners each
+    assert statistics.height == 2 * 4 * 3
+    for (_, dof, clearance), group in statistics.group_by("experiment", *parameters):
+        selected = runs.filter(
+            (pl.col("robot dof") == dof) & (pl.col("clearance") == clearance)
+        )
+        for row in group.iter_rows(named=True):
+            times = selected.filter(
+                (pl.col("experiment") == row["experiment"])
+                & (pl.col("planner") == row["planner"])
+            )["time"]
+            assert row["runs"] == len(times)
+            assert row["median"] == pytest.approx(times.median())
+        assert sorted(group["rank"]) == [1, 2, 3]
+
+
+def test_rankings_compare_planners_per_parameter_setting(data):
+    rankings = compute_rankings(
+        data["runs"], "time", "1.10.0", parameters=data["parameters"]
+    )
+    pairs = rankings["pairs"]
+    # each of the 3 pairs of planners appears twice per problem and parameter setting
+    assert pairs.height == 2 * 4 * 3 * 2
+    assert pairs.columns[:3] == ["experiment", *data["parameters"]]
+    leaderboard = rankings["leaderboard"]
+    assert leaderboard["experiments"].to_list() == [8, 8, 8]
+    comparisons = leaderboard["wins"] + leaderboard["losses"] + leaderboard["ties"]
+    assert comparisons.to_list() == [16, 16, 16]
+    assert leaderboard["wins"].sum() == leaderboard["losses"].sum()
+
+
+def test_rankings_control_the_false_discovery_rate_per_experiment(data):
+    alpha = 0.05
+    pairs = compute_rankings(
+        data["runs"], "time", "1.10.0", alpha=alpha, parameters=data["parameters"]
+    )["pairs"]
+    for _, group in pairs.group_by("experiment", *data["parameters"]):
+        # each test appears once from the point of view of each planner
+        tests = group.filter(pl.col("planner") < pl.col("opponent"))
+        assert tests["q-value"].to_numpy() == pytest.approx(
+            benjamini_hochberg(tests["p-value"].to_numpy())
+        )
+    significant = pairs.filter(pl.col("outcome") != "tie")
+    expected = pairs.filter((pl.col("q-value") < alpha) & (pl.col("effect size") != 0))
+    assert 0 < significant.height == expected.height
@@ -0,0 +1,55 @@
+import asyncio
+from shiny import reactive
+from plannerarena.reactivity import debounce
+
+DELAY = 0.1
+
+
+async def settle(delay: float = 3 * DELAY):
+    """Run the reactive graph until all debounce timers have expired"""
+    for _ in range(round(delay / (DELAY / 5))):
+        await asyncio.sleep(DELAY / 5)
+        await reactive.flush()
+
+
+def run_debounced(changes: list[list[int]]) -> list[list[int]]:
+    """Set a debounced input to each burst of values in `changes` and return the values seen
+    by a dependent after the session started and after each burst"""
+
+    async def main():
+        x = reactive.Value(0)
+
+        @debounce(DELAY)
+        def debounced():
+            return x()
+
+        seen = []
+
+        @reactive.effect
+        def _():
+            seen.append(debounced())
+
+        await settle()
+        updates = [list(seen)]
+        for burst in changes:
+            seen.clear()
+            for value in burst:
+                x.set(value)
+                await reactive.flush()
+            await settle()
+            updates.append(list(seen))
+        return updates
+
+    return asyncio.run(main())
+
+
+def test_debounce_does_not_update_after_session_start():
+    assert run_debounced([]) == [[0]]
+
+
+def test_debounce_updates_once_per_burst():
+    assert run_debounced([[1, 2, 3], [4]]) == [[0], [3], [4]]
+
+
+def test_debounce_skips_bursts_that_end_with_the_same_value():
+    assert run_debounced([[1, 0], [5], [6, 5]]) == [[0], [], [5], []]
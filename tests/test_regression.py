@@ -0,0 +1,83 @@
+import numpy as np
+import polars as pl
+import pytest
+from scipy import stats
+from plannerarena.regression import detect_regressions, flagged_regressions
+from plannerarena.stats import benjamini_hochberg, mann_whitney
+
+
+def test_benjamini_hochberg_matches_scipy():
+    p = np.random.default_rng(0).uniform(0, 0.2, 500) ** 2
+    assert np.allclose(benjamini_hochberg(p), stats.false_discovery_control(p))
+    q = benjamini_hochberg(np.array([0.01, np.nan, 0.04, 0.03]))
+    assert np.isnan(q[1])
+    assert np.allclose(q[[0, 2, 3]], [0.03, 0.04, 0.04])
+
+
+def test_versions_are_compared_per_parameter_setting(data):
+    regressions = detect_regressions(data, ["time"], max_workers=1)
+    assert regressions.columns[:4] == ["experiment", *data["parameters"], "planner"]
+    # 2 problems with 2 x 2 parameter settings, 3 planners, and 3 versions
+    assert regressions.height == 2 * 4 * 3 * 2
+    assert regressions["runs before"].unique().to_list() == [20]
+    assert regressions["runs after"].unique().to_list() == [20]
+
+    row = regressions.row(0, named=True)
+    runs = data["runs"].filter(
+        (pl.col("experiment") == row["experiment"])
+        & (pl.col("robot dof") == row["robot dof"])
+        & (pl.col("clearance") == row["clearance"])
+        & (pl.col("planner") == row["planner"])
+    )
+    before = runs.filter(pl.col("version") == row["from version"])["time"].to_numpy()
+    after = runs.filter(pl.col("version") == row["to version"])["time"].to_numpy()
+    _, delta, p = mann_whitney(after, before)
+    assert row["median before"] == pytest.approx(np.median(before))
+    assert row["median after"] == pytest.approx(np.median(after))
+    assert row["effect size"] == pytest.approx(delta)
+    assert row["p-value"] == pytest.approx(p)
+    assert regressions["q-value"].to_list() == pytest.approx(
+        benjamini_hochberg(regressions["p-value"].to_numpy())
+    )
+    assert regressions["q-value"].is_sorted()
+
+
+def test_versions_from_the_same_distribution_are_not_flagged(data):
+    # the runs of all versions are drawn from the same distributions, so some of the raw
+    # p-values are small by chance
+    regressions = detect_regressions(data, ["time"], max_workers=1)
+    assert (regressions["p-value"] < 0.05).any()
+    assert flagged_regressions(regressions).is_empty()
+
+
+def test_slower_version_is_a_regression(data):
+    runs = data["runs"].with_columns(
+        pl.when(
+            (pl.col("version") == "1.10.0")
+            & (pl.col("planner") == "RRT")
+            & (pl.col("experiment") == "problem0")
+        )
+        .then(pl.col("time") + 10)
+        .otherwise(pl.col("time"))
+        .alias("time")
+    )
+    regressions = detect_regressions(data | {"runs": runs}, ["time"], max_workers=1)
+    flagged = flagged_regressions(regressions)
+    assert flagged.height == 4
+    assert (flagged["q-value"] < 0.05).all()
+    assert (flagged["effect size"] > 0).all()
+    assert flagged["experiment"].unique().to_list() == ["problem0"]
+    assert flagged["planner"].unique().to_list() == ["RRT"]
+    assert flagged["to version"].unique().to_list() == ["1.10.0"]
+
+
+def test_minimum_effect_size(data):
+    # with a false discovery rate of 1, every deterioration is significant
+    regressions = detect_regressions(
+        data, ["time"], alpha=1.0, max_workers=1, min_effect_size=0.2
+    )
+    worse = regressions.filter(pl.col("effect size") > 0)
+    assert not worse.is_empty()
+    assert regressions["regression"].to_list() == (
+        (regressions["effect size"] >= 0.2).to_list()
+    )
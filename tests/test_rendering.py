@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from shiny.module import ResolvedId
+from shiny.session import session_context
+from shiny.types import SilentCancelOutputException
+from plannerarena import rendering
+from plannerarena.scheduler import ComputeScheduler
+
+
+def test_superseded_render_leaves_the_queue(monkeypatch):
+    scheduler = ComputeScheduler(1, 1)
+    monkeypatch.setattr(rendering, "SCHEDULER", scheduler)
+    session = SimpleNamespace(
+        id="session",
+        ns=ResolvedId(""),
+        clientdata=SimpleNamespace(
+            output_width=lambda: 400, output_height=lambda: 300, pixelratio=lambda: 1
+        ),
+        on_ended=lambda callback: None,
+    )
+    plot = rendering.viewport_plot(name="test")
+    rendered = []
+
+    def render(value, width, height, dpi, context):
+        rendered.append(value)
+        return value.encode()
+
+    plot._render = render
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.acquire("holder"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with session_context(session):
+            first = asyncio.create_task(plot.transform("first"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(plot.transform("second"))
+            await asyncio.sleep(0.01)
+        # the first render was cancelled while it waited for a slot
+        with pytest.raises(SilentCancelOutputException):
+            await first
+        assert scheduler.status()["queued"]["interactive"] == 1
+        release.set()
+        await holder
+        return await second
+
+    image = asyncio.run(main())
+    assert rendered == ["second"]
+    assert image["src"].endswith("c2Vjb25k")
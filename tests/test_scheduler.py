@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from plannerarena.scheduler import (
+    BACKGROUND,
+    DOWNLOAD,
+    INTERACTIVE,
+    ComputeScheduler,
+)
+
+
+async def hold(scheduler: ComputeScheduler, release: asyncio.Event):
+    """Hold a slot until `release` is set (in a task of its own, because tasks started while
+    holding a slot share it)"""
+    async with scheduler.acquire("holder"):
+        await release.wait()
+
+
+def admission_order(waiting: list[tuple[str, int]]) -> list[str]:
+    """Queue a computation for each (key, priority) in `waiting` while the only slot is held
+    and return the keys in the order in which they were admitted"""
+
+    async def main():
+        scheduler = ComputeScheduler(1, 1)
+        admitted = []
+
+        async def job(key, priority):
+            async with scheduler.acquire(key, priority):
+                admitted.append(key)
+                await asyncio.sleep(0)
+
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release))
+        await asyncio.sleep(0)
+        jobs = [asyncio.create_task(job(*waiter)) for waiter in waiting]
+        await asyncio.sleep(0.01)
+        assert admitted == []
+        assert scheduler.status()["queued keys"] == len(set(waiting))
+        release.set()
+        await asyncio.gather(holder, *jobs)
+        assert scheduler.status()["running"] == 0
+        return admitted
+
+    return asyncio.run(main())
+
+
+def test_higher_priorities_are_admitted_first():
+    waiting = [("api", BACKGROUND), ("pdf", DOWNLOAD), ("plot", INTERACTIVE)]
+    assert admission_order(waiting) == ["plot", "pdf", "api"]
+
+
+def test_keys_of_a_priority_take_turns():
+    waiting = [("a", BACKGROUND)] * 3 + [("b", BACKGROUND)] * 2 + [("c", BACKGROUND)]
+    assert admission_order(waiting) == ["a", "b", "c", "a", "b", "a"]
+
+
+def test_cancelled_computations_leave_the_queue():
+    async def main():
+        scheduler = ComputeScheduler(1, 1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.run_in_thread("a", BACKGROUND, int))
+        await asyncio.sleep(0.01)
+        assert scheduler.status()["queued"]["background"] == 1
+        waiting.cancel()
+        await asyncio.sleep(0.01)
+        assert scheduler.status()["queued"]["background"] == 0
+        release.set()
+        await holder
+        return await scheduler.run_in_thread("b", INTERACTIVE, int, "1")
+
+    assert asyncio.run(main()) == 1
+
+
+def test_worker_thread_holds_the_slot():
+    async def main():
+        scheduler = ComputeScheduler(1, 1)
+        started = threading.Event()
+        finish = threading.Event()
+        admitted = []
+
+        def work():
+            started.set()
+            # nested computations share the slot instead of waiting for it
+            with scheduler.slot("worker", BACKGROUND):
+                finish.wait(1)
+            return scheduler.status()["running"]
+
+        async def other():
+            async with scheduler.acquire("other"):
+                admitted.append(finished.done())
+
+        finished = asyncio.create_task(
+            scheduler.run_in_thread("worker", BACKGROUND, work)
+        )
+        await asyncio.to_thread(started.wait, 1)
+        waiting = asyncio.create_task(other())
+        await asyncio.sleep(0.01)
+        assert scheduler.status()["queued"]["interactive"] == 1
+        finish.set()
+        running = await finished
+        await waiting
+        return running, admitted
+
+    assert asyncio.run(main()) == (1, [True])
+
+
+def test_cancelled_worker_thread_keeps_the_slot_until_it_is_done():
+    async def main():
+        scheduler = ComputeScheduler(1, 1)
+        started = threading.Event()
+        finish = threading.Event()
+
+        def work():
+            started.set()
+            finish.wait(1)
+
+        running = asyncio.create_task(scheduler.run_in_thread("a", INTERACTIVE, work))
+        await asyncio.to_thread(started.wait, 1)
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        # the caller returns right away, but the thread cannot be interrupted
+        assert running.cancelled()
+        assert scheduler.status()["running"] == 1
+        waiting = asyncio.create_task(scheduler.run_in_thread("b", INTERACTIVE, int))
+        await asyncio.sleep(0.01)
+        assert scheduler.status()["queued"]["interactive"] == 1
+        finish.set()
+        await waiting
+        return scheduler.status()["running"]
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,144 @@
+import numpy as np
+import polars as pl
+import pytest
+from plannerarena.database import load_database
+from plannerarena.sketch import (
+    RELATIVE_ACCURACY,
+    merge_sketches,
+    sketch_quantiles,
+    sketch_runs,
+    sketch_stats,
+)
+
+QUANTILES = {"q05": 0.05, "q1": 0.25, "median": 0.5, "q3": 0.75, "q95": 0.95}
+
+
+@pytest.fixture(scope="module")
+def runs():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    return (
+        pl.DataFrame(
+            {
+                "experimentid": rng.integers(1, 4, n),
+                "plannerid": rng.integers(1, 3, n),
+                # positive values over several orders of magnitude, and values with signs
+                "time": rng.lognormal(0.0, 2.0, n),
+                "cost": rng.normal(0.0, 50.0, n),
+                "missing": rng.random(n) < 0.1,
+            }
+        )
+        .with_columns(
+            pl.when(~pl.col("missing")).then(pl.col("cost")).alias("cost"),
+            pl.format("problem{}", "experimentid").alias("experiment"),
+            pl.format("planner{}", "plannerid").alias("planner"),
+        )
+        .drop("missing")
+    )
+
+
+def groups_of(runs: pl.DataFrame) -> pl.DataFrame:
+    # like the "runs" table of a summarized database
+    return runs.select("experimentid", "plannerid", "experiment", "planner").unique()
+
+
+@pytest.mark.parametrize("attr", ["time", "cost"])
+@pytest.mark.parametrize("by", [["experiment", "planner"], ["planner"]])
+def test_sketch_quantiles_are_within_relative_accuracy(runs, attr, by):
+    sketches = sketch_runs(runs, ["time", "cost"])
+    estimated = sketch_quantiles(sketches, groups_of(runs), attr, by, QUANTILES)
+    exact = (
+        runs.group_by(by)
+        .agg(
+            pl.col(attr).quantile(q, "linear").alias(name)
+            for name, q in QUANTILES.items()
+        )
+        .sort(by)
+    )
+    assert estimated.select(by).equals(exact.select(by))
+    for name in QUANTILES:
+        assert np.allclose(
+            estimated[name].to_numpy(),
+            exact[name].to_numpy(),
+            rtol=RELATIVE_ACCURACY,
+            atol=0,
+        ), name
+
+
+def test_merged_sketches_equal_sketch_of_all_runs(runs):
+    by = ["planner"]
+    attributes = ["time", "cost"]
+    whole = sketch_runs(runs, attributes)
+    merged = None
+    for chunk in runs.iter_slices(3_000):
+        sketch = sketch_runs(chunk, attributes)
+        merged = sketch if merged is None else merge_sketches(merged, sketch)
+    groups = groups_of(runs)
+    for attr in attributes:
+        assert sketch_quantiles(merged, groups, attr, by, QUANTILES).equals(
+            sketch_quantiles(whole, groups, attr, by, QUANTILES)
+        )
+        merged_stats = sketch_stats(merged, groups, attr, by)
+        exact = (
+            runs.group_by(by)
+            .agg(
+                pl.col(attr).count().alias("count"),
+                pl.col(attr).null_count().alias("nulls"),
+                pl.col(attr).mean().alias("mean"),
+                pl.col(attr).std().alias("std"),
+                pl.col(attr).min().alias("min"),
+                pl.col(attr).max().alias("max"),
+            )
+            .sort(by)
+        )
+        assert merged_stats["count"].to_list() == exact["count"].to_list()
+        assert merged_stats["nulls"].to_list() == exact["nulls"].to_list()
+        for column in ["mean", "std", "min", "max"]:
+            assert np.allclose(merged_stats[column], exact[column], rtol=1e-9), column
+
+
+def test_summarized_database(database, data):
+    summarized = load_database(database, sketch=True)
+    sketches = summarized["sketches"]
+    assert summarized["progress"].is_empty()
+    # one row per experiment and planner
+    assert (
+        summarized["runs"].height
+        == data["runs"].select("experimentid", "plannerid").n_unique()
+    )
+    by = ["experiment", "planner"]
+    stats = sketch_stats(sketches, summarized["runs"], "time", by)
+    exact = (
+        data["runs"]
+        .group_by(by)
+        .agg(pl.len().alias("count"), pl.col("time").mean().alias("mean"))
+        .sort(by)
+    )
+    assert stats["count"].to_list() == exact["count"].to_list()
+    assert np.allclose(stats["mean"], exact["mean"])
+
+
+def test_merging_groups_without_values():
+    def chunk(experiments: list[int], times: list[float | None]) -> dict:
+        runs = pl.DataFrame(
+            {"experimentid": experiments, "plannerid": 1, "time": times},
+            schema_overrides={"time": pl.Float64},
+        )
+        return sketch_runs(runs, ["time"])
+
+    # all values of experiment 1 are missing in the first chunk
+    merged = merge_sketches(chunk([1], [None]), chunk([2], [5.0]))
+    merged = merge_sketches(merged, chunk([1, 1], [1.0, 3.0]))
+    groups = pl.DataFrame(
+        {"experimentid": [1, 2], "plannerid": 1, "experiment": ["a", "b"]}
+    )
+    stats = sketch_stats(merged, groups, "time", ["experiment"])
+    assert stats["count"].to_list() == [2, 1]
+    assert stats["nulls"].to_list() == [1, 0]
+    assert stats["mean"].to_list() == [2.0, 5.0]
+    assert stats["std"][0] == pytest.approx(np.sqrt(2.0))
+
+    empty = sketch_stats(
+        chunk([1], [None]), groups.head(1), "time", ["experiment"]
+    ).row(0, named=True)
+    assert (empty["count"], empty["nulls"], empty["mean"]) == (0, 1, None)